@@ -2,16 +2,50 @@
 Aplicação Flask para gestão de locadora de veículos.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, flash, jsonify,
+    stream_with_context
+)
 from datetime import datetime, date, timedelta
-from models import db, Carro, Cliente, Locacao, Gasto
+from models import db, Carro, Cliente, Locacao, LocacaoArquivada, Gasto, RegraPreco
+from frota import status_frota, contar_status, STATUS_DISPONIVEL
+from resumo_mensal import resumo_financeiro, reconstruir_resumo
+from cache_dashboard import CacheContexto, versao_dados, caminho_padrao
+import inicializacao
+import migracoes
+from disponibilidade import indice_disponibilidade
+from tarifas import tabela_tarifas, MAXIMO_ITENS_COTACAO, MAXIMO_DIAS_PERIODO
+import historico as historico_locacoes
+import exportacao
+import exportacao_colunar
+import importacao
+import precificacao
+import reservas
+import configuracao_banco
+from clientes import formatar_telefone, resolver_cliente, deduplicar_clientes, CLIENTES_POR_LOTE
+import encerramento
+import arquivamento
+import dados_sinteticos
+import benchmark_rotas
+import carga
+import instrumentacao
+from metricas import metricas, registrar as registrar_metricas
+from consultas import (
+    consulta_conflitos, consulta_carros_livres, consulta_proximas_devolucoes, consulta_proximas_retiradas,
+    eager_carro_cliente
+)
+from orcamento_consultas import (
+    orcamento_consultas, registrar as registrar_orcamento_consultas, OrcamentoConsultasExcedido
+)
+
 import os
-import csv
-import io
-import json as json_lib
 import re
+import json
+import time
+import click
 from urllib.parse import quote
 from dotenv import load_dotenv
+from sqlalchemy.exc import DBAPIError
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -22,6 +56,8 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///locadora.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool e perfil SQLite (SQLITE_PERFIL=producao: WAL, busy_timeout, cache...)
+configuracao_banco.configurar(app)
 
 # Validar SECRET_KEY em produção
 if not os.getenv('FLASK_DEBUG', 'True') == 'True' and app.config['SECRET_KEY'] == 'dev-key-change-in-production':
@@ -32,12 +68,31 @@ if not os.getenv('FLASK_DEBUG', 'True') == 'True' and app.config['SECRET_KEY'] =
 
 # Inicializar banco de dados
 db.init_app(app)
+configuracao_banco.registrar(app)
+registrar_orcamento_consultas(app)
+# Server-Timing, log estruturado por requisição e log de consultas lentas
+instrumentacao.registrar(app)
+
+# Cache do dashboard: versão dos dados compartilhada entre workers + TTL de segurança
+versao_dados.configurar(os.getenv('CACHE_VERSAO_ARQUIVO') or caminho_padrao(app.instance_path))
+cache_dashboard = CacheContexto(ttl=int(os.getenv('CACHE_DASHBOARD_TTL', '60')))
+
+# Métricas Prometheus em /metrics, somadas entre os workers (METRICAS=False desliga)
+with app.app_context():
+    registrar_metricas(app, db.engine)
+metricas.monitorar_cache('dashboard', lambda: (cache_dashboard.acertos, cache_dashboard.falhas))
+metricas.monitorar_cache('disponibilidade', lambda: (
+    indice_disponibilidade.consultas - indice_disponibilidade.recargas, indice_disponibilidade.recargas
+))
+metricas.monitorar_cache('tarifas', lambda: (
+    tabela_tarifas.consultas - tabela_tarifas.recargas, tabela_tarifas.recargas
+))
 
 
 def seed_database():
     """
     Popula o banco de dados com frota realista e gastos de exemplo.
-    Executado automaticamente na primeira inicialização.
+    Executado no bootstrap do processo (SEED_DATABASE=True) ou pelo comando init-db.
     """
     # Verificar se já existem carros cadastrados
     if Carro.query.count() > 0:
@@ -165,6 +220,14 @@ def verificar_disponibilidade(carro_id, data_retirada, data_devolucao, locacao_i
     """
     Verifica se um carro está disponível no período especificado.
     
+    Consulta primeiro o índice em memória (manutenção, datas e sobreposição),
+    que rejeita a maioria dos conflitos sem acessar o banco. Se o índice aprovar,
+    o banco é consultado como autoridade final, já que outro worker pode ter
+    gravado uma locação ainda não vista por este processo.
+    
+    Para gravar uma locação use `reservas.reservar()`, que repete a checagem
+    no banco dentro da transação travada do INSERT.
+    
     Args:
         carro_id: ID do carro
         data_retirada: Data de retirada
@@ -174,87 +237,25 @@ def verificar_disponibilidade(carro_id, data_retirada, data_devolucao, locacao_i
     Returns:
         (bool, str): (disponivel, mensagem_erro)
     """
-    # Verificar se o carro está em manutenção
-    carro = Carro.query.get(carro_id)
-    if carro and carro.em_manutencao:
-        return False, f"O carro {carro.modelo} - {carro.placa} está em manutenção e não pode ser alugado."
+    disponivel, mensagem = indice_disponibilidade.verificar(
+        carro_id, data_retirada, data_devolucao, locacao_id
+    )
+    if not disponivel:
+        return False, mensagem
     
-    # Validar datas
-    if data_devolucao < data_retirada:
-        return False, "A data de devolução não pode ser anterior à data de retirada."
-    
-    # Buscar locações ativas do carro no período
-    locacoes_conflito = Locacao.query.filter(
-        Locacao.carro_id == carro_id,
-        Locacao.status == 'ativa',
-        Locacao.id != locacao_id if locacao_id else True
-    ).filter(
-        # Verificar sobreposição de datas
-        db.or_(
-            # Caso 1: Nova locação começa durante uma locação existente
-            db.and_(
-                Locacao.data_retirada <= data_retirada,
-                Locacao.data_devolucao >= data_retirada
-            ),
-            # Caso 2: Nova locação termina durante uma locação existente
-            db.and_(
-                Locacao.data_retirada <= data_devolucao,
-                Locacao.data_devolucao >= data_devolucao
-            ),
-            # Caso 3: Nova locação engloba uma locação existente
-            db.and_(
-                Locacao.data_retirada >= data_retirada,
-                Locacao.data_devolucao <= data_devolucao
-            )
-        )
-    ).first()
+    # Buscar locações ativas do carro que se sobrepõem ao período
+    locacoes_conflito = consulta_conflitos(carro_id, data_retirada, data_devolucao, locacao_id).first()
     
     if locacoes_conflito:
-        return False, f"O carro {carro.modelo} - {carro.placa} já está alugado neste período."
+        carro = indice_disponibilidade.carro(carro_id)
+        return False, f"O carro {carro['modelo']} - {carro['placa']} já está alugado neste período."
     
     return True, ""
 
 
-def formatar_telefone(whatsapp):
-    """
-    Formata o número de telefone adicionando o prefixo +55 se necessário.
-    Remove caracteres não numéricos e adiciona +55 no início.
-    
-    Args:
-        whatsapp: String com o número de telefone
-    
-    Returns:
-        str: Número formatado com +55 ou string vazia se inválido
-    """
-    if not whatsapp or not whatsapp.strip():
-        return ""
-    
-    # Se já começar com +55, retornar como está (após limpar)
-    if whatsapp.strip().startswith('+55'):
-        numeros = re.sub(r'\D', '', whatsapp)
-        return f"+{numeros}" if numeros.startswith('55') else f"+55{numeros[2:]}" if len(numeros) > 2 else ""
-    
-    # Remover todos os caracteres não numéricos
-    numeros = re.sub(r'\D', '', whatsapp)
-    
-    # Se já começar com 55 (sem +), adicionar +
-    if numeros.startswith('55'):
-        return f"+{numeros}"
-    
-    # Se começar com 0, remover o 0 e adicionar 55
-    if numeros.startswith('0'):
-        numeros = numeros[1:]
-    
-    # Adicionar +55 no início
-    if len(numeros) >= 10:  # Validar que tem pelo menos 10 dígitos (DDD + número)
-        return f"+55{numeros}"
-    
-    return ""
-
-
 def calcular_valor_total(carro_id, data_retirada, data_devolucao):
     """
-    Calcula o valor total da locação.
+    Calcula o valor total da locação com as regras de preço vigentes.
     
     Args:
         carro_id: ID do carro
@@ -264,42 +265,35 @@ def calcular_valor_total(carro_id, data_retirada, data_devolucao):
     Returns:
         float: Valor total calculado
     """
-    carro = Carro.query.get(carro_id)
-    if not carro:
-        return 0.0
-    
-    dias = (data_devolucao - data_retirada).days + 1
-    return dias * carro.valor_diaria
+    cotacao = tabela_tarifas.cotar(carro_id, data_retirada, data_devolucao)
+    return cotacao.get('valor_total', 0.0)
 
 
-def get_status_carro_hoje(carro_id):
+def get_status_carro_hoje(carro_id, data_referencia=None):
     """
-    Retorna o status de um carro hoje (Disponível ou Alugado).
+    Retorna o status de um carro hoje (Disponível, Alugado ou Em manutenção).
+    
+    Para vários carros, prefira `status_frota()`, que resolve a frota inteira
+    em uma única consulta.
     
     Args:
         carro_id: ID do carro
+        data_referencia: Data usada para o status (padrão: hoje)
     
     Returns:
-        dict: {'status': 'disponivel'|'alugado', 'locacao': Locacao ou None}
+        dict: {'status': 'disponivel'|'alugado'|'manutencao', 'locacao': Locacao ou None}
     """
-    hoje = date.today()
+    item = status_frota(data_referencia, carro_ids=[carro_id]).get(carro_id)
     
-    locacao_ativa = Locacao.query.filter(
-        Locacao.carro_id == carro_id,
-        Locacao.status == 'ativa',
-        Locacao.data_retirada <= hoje,
-        Locacao.data_devolucao >= hoje
-    ).first()
-    
-    if locacao_ativa:
+    if item is None:
         return {
-            'status': 'alugado',
-            'locacao': locacao_ativa
+            'status': STATUS_DISPONIVEL,
+            'locacao': None
         }
     
     return {
-        'status': 'disponivel',
-        'locacao': None
+        'status': item['status'],
+        'locacao': item['locacao']
     }
 
 
@@ -307,112 +301,105 @@ def get_status_carro_hoje(carro_id):
 # ROTAS
 # ============================================================================
 
-@app.route('/')
-def index():
-    """Dashboard principal com KPIs financeiros e gráficos interativos."""
-    # Garantir que o banco está inicializado
-    with app.app_context():
-        if Carro.query.count() == 0:
-            seed_database()
-    
-    # Buscar todos os carros
-    carros = Carro.query.filter_by(ativo=True).order_by(Carro.categoria, Carro.modelo).all()
-    
-    # Status de cada carro hoje
-    status_carros = []
-    for carro in carros:
-        status = get_status_carro_hoje(carro.id)
-        status_carros.append({
-            'carro': carro,
-            'status': status['status'],
-            'locacao': status['locacao']
-        })
+def _locacao_para_dashboard(locacao):
+    """Converte uma locação nos dados simples exibidos no dashboard (cacheáveis)."""
+    if locacao is None:
+        return None
+    return {
+        'id': locacao.id,
+        'data_retirada': locacao.data_retirada,
+        'data_devolucao': locacao.data_devolucao,
+        'carro': {'modelo': locacao.carro.modelo, 'placa': locacao.carro.placa},
+        'cliente': {'nome': locacao.cliente.nome, 'whatsapp': locacao.cliente.whatsapp}
+    }
+
+
+def montar_contexto_dashboard(hoje):
+    """
+    Calcula todos os dados do dashboard para uma data de referência.
+    
+    Retorna apenas dados simples (dicts, listas, datas), para que o resultado
+    possa ser guardado no cache entre requisições.
+    
+    Args:
+        hoje: Data de referência
+    
+    Returns:
+        dict: Contexto do template dashboard.html
+    """
+    # Status de toda a frota na data de referência (uma única consulta)
+    snapshot_frota = status_frota(hoje)
+    status_carros = [
+        {
+            'carro': item['carro'].to_dict(),
+            'status': item['status'],
+            'locacao': _locacao_para_dashboard(item['locacao'])
+        }
+        for item in snapshot_frota.values()
+    ]
     
     # Próximas devoluções (hoje e próximos 7 dias)
-    hoje = date.today()
     proxima_semana = hoje + timedelta(days=7)
     
-    proximas_devolucoes = Locacao.query.filter(
-        Locacao.status == 'ativa',
-        Locacao.data_devolucao >= hoje,
-        Locacao.data_devolucao <= proxima_semana
-    ).order_by(Locacao.data_devolucao).limit(10).all()
+    proximas_devolucoes = eager_carro_cliente(
+        consulta_proximas_devolucoes(hoje, proxima_semana)
+    ).limit(10).all()
     
     # Próximas retiradas (hoje e próximos 7 dias)
-    proximas_retiradas = Locacao.query.filter(
-        Locacao.status == 'ativa',
-        Locacao.data_retirada >= hoje,
-        Locacao.data_retirada <= proxima_semana
-    ).order_by(Locacao.data_retirada).limit(10).all()
+    proximas_retiradas = eager_carro_cliente(
+        consulta_proximas_retiradas(hoje, proxima_semana)
+    ).limit(10).all()
     
     # ========== DADOS FINANCEIROS ==========
     
-    # Calcular faturamento dos últimos 6 meses (para gráfico)
-    faturamento_mensal = []
-    labels_meses = []
-    
-    for i in range(5, -1, -1):  # 6 meses (do mais antigo ao mais recente)
-        mes_ref = hoje - timedelta(days=30 * i)
-        inicio_mes = mes_ref.replace(day=1)
-        
-        # Calcular fim do mês
-        if mes_ref.month == 12:
-            fim_mes = mes_ref.replace(day=31)
-        else:
-            proximo_mes = mes_ref.replace(month=mes_ref.month + 1, day=1)
-            fim_mes = proximo_mes - timedelta(days=1)
-        
-        # Somar locações finalizadas no mês
-        locacoes_mes = Locacao.query.filter(
-            Locacao.status.in_(['ativa', 'finalizada']),
-            Locacao.data_retirada >= inicio_mes,
-            Locacao.data_retirada <= fim_mes
-        ).all()
-        
-        faturamento = sum(loc.valor_total for loc in locacoes_mes)
-        faturamento_mensal.append(round(faturamento, 2))
-        
-        # Nome do mês em português
-        meses_pt = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-        labels_meses.append(meses_pt[mes_ref.month - 1])
-    
-    # Faturamento total (últimos 6 meses)
-    faturamento_total = sum(faturamento_mensal)
-    
-    # Despesas totais (últimos 6 meses)
-    inicio_periodo = hoje - timedelta(days=180)
-    gastos_periodo = Gasto.query.filter(Gasto.data_gasto >= inicio_periodo).all()
-    despesas_total = sum(gasto.valor for gasto in gastos_periodo)
-    
-    # Lucro líquido
-    lucro_liquido = faturamento_total - despesas_total
+    # Faturamento e despesas dos últimos 6 meses de calendário, lidos do
+    # resumo mensal mantido incrementalmente (custo independe do histórico)
+    financeiro = resumo_financeiro(hoje, quantidade_meses=6)
+    faturamento_total = financeiro['faturamento_total']
+    despesas_total = financeiro['despesas_total']
     
     # ========== STATUS DA FROTA (para gráfico de rosca) ==========
-    total_carros = len(carros)
-    carros_alugados = sum(1 for item in status_carros if item['status'] == 'alugado')
-    carros_disponiveis = sum(1 for item in status_carros if item['status'] == 'disponivel')
-    carros_manutencao = Carro.query.filter_by(ativo=True, em_manutencao=True).count()
+    contagem_status = contar_status(snapshot_frota)
     
-    return render_template(
-        'dashboard.html',
-        status_carros=status_carros,
-        proximas_devolucoes=proximas_devolucoes,
-        proximas_retiradas=proximas_retiradas,
+    return {
+        'status_carros': status_carros,
+        'proximas_devolucoes': [_locacao_para_dashboard(loc) for loc in proximas_devolucoes],
+        'proximas_retiradas': [_locacao_para_dashboard(loc) for loc in proximas_retiradas],
         # KPIs Financeiros
-        faturamento_total=faturamento_total,
-        despesas_total=despesas_total,
-        lucro_liquido=lucro_liquido,
+        'faturamento_total': faturamento_total,
+        'despesas_total': despesas_total,
+        'lucro_liquido': faturamento_total - despesas_total,
         # Dados para gráficos
-        faturamento_mensal=faturamento_mensal,
-        labels_meses=labels_meses,
-        carros_alugados=carros_alugados,
-        carros_disponiveis=carros_disponiveis,
-        carros_manutencao=carros_manutencao,
-        total_carros=total_carros
-    )
+        'faturamento_mensal': financeiro['faturamento_mensal'],
+        'labels_meses': financeiro['labels'],
+        'carros_alugados': contagem_status['alugado'],
+        'carros_disponiveis': contagem_status['disponivel'],
+        'carros_manutencao': contagem_status['manutencao'],
+        'total_carros': len(status_carros)
+    }
+
+
+@app.route('/')
+@orcamento_consultas(6)
+def index():
+    """Dashboard principal com KPIs financeiros e gráficos interativos."""
+    # Data de referência do dashboard (?data=AAAA-MM-DD, padrão: hoje)
+    hoje = date.today()
+    data_str = request.args.get('data')
+    if data_str:
+        try:
+            hoje = datetime.strptime(data_str, '%Y-%m-%d').date()
+        except ValueError:
+            flash('⚠️ Data de referência inválida, exibindo o dia de hoje.', 'warning')
+    
+    # KPIs só são recalculados quando os dados mudam (ou o TTL expira)
+    contexto = cache_dashboard.obter(hoje.isoformat(), lambda: montar_contexto_dashboard(hoje))
+    
+    return render_template('dashboard.html', **contexto)
 
 
 @app.route('/nova_locacao', methods=['GET', 'POST'])
+@orcamento_consultas(15)
 def nova_locacao():
     """Formulário para criar uma nova locação."""
     if request.method == 'POST':
@@ -443,93 +430,248 @@ def nova_locacao():
             flash('⚠️ Datas inválidas. Por favor, verifique.', 'danger')
             return redirect(url_for('nova_locacao'))
         
-        # Verificar disponibilidade
-        disponivel, mensagem = verificar_disponibilidade(carro_id, data_retirada, data_devolucao)
+        # Rejeição rápida pelo índice em memória; o banco confirma na transação da reserva
+        disponivel, mensagem = indice_disponibilidade.verificar(carro_id, data_retirada, data_devolucao)
         if not disponivel:
+            metricas.incrementar('locamil_reservas_recusadas_total', motivo='indisponivel')
             flash(f'❌ {mensagem}', 'danger')
             return redirect(url_for('nova_locacao'))
         
-        # Buscar ou criar cliente
-        cliente = Cliente.query.filter_by(nome=nome_cliente).first()
-        if not cliente:
-            # Formatar WhatsApp com +55
-            whatsapp_formatado = formatar_telefone(whatsapp) if whatsapp else ""
-            cliente = Cliente(nome=nome_cliente, whatsapp=whatsapp_formatado)
-            db.session.add(cliente)
-            db.session.flush()
-        else:
-            # Atualizar WhatsApp se fornecido e ainda não tiver +55 ou estiver vazio
-            if whatsapp:
-                whatsapp_formatado = formatar_telefone(whatsapp)
-                if whatsapp_formatado and (not cliente.whatsapp or not cliente.whatsapp.startswith('+55')):
-                    cliente.whatsapp = whatsapp_formatado
-        
         # Calcular valor total
         valor_total = calcular_valor_total(carro_id, data_retirada, data_devolucao)
         
-        # Criar locação
-        locacao = Locacao(
-            carro_id=carro_id,
-            cliente_id=cliente.id,
-            data_retirada=data_retirada,
-            data_devolucao=data_devolucao,
-            valor_total=valor_total,
-            status='ativa'
-        )
+        def criar_locacao():
+            # Buscar (nome normalizado + WhatsApp) ou criar cliente
+            cliente = resolver_cliente(nome_cliente, whatsapp)
+            
+            locacao = Locacao(
+                carro_id=carro_id,
+                cliente_id=cliente.id,
+                data_retirada=data_retirada,
+                data_devolucao=data_devolucao,
+                valor_total=valor_total,
+                status='ativa'
+            )
+            db.session.add(locacao)
+            return locacao
         
-        db.session.add(locacao)
-        db.session.commit()
+        # Checagem no banco e gravação na mesma transação travada (sem corrida entre workers)
+        try:
+            reservas.reservar(carro_id, data_retirada, data_devolucao, criar_locacao)
+        except reservas.CarroIndisponivel as erro:
+            metricas.incrementar('locamil_reservas_recusadas_total', motivo='indisponivel')
+            flash(f'❌ {erro}', 'danger')
+            return redirect(url_for('nova_locacao'))
+        except DBAPIError as erro:
+            if not reservas.erro_transitorio(erro):
+                raise
+            app.logger.warning("Reserva não concluída: banco ocupado (carro %s): %s", carro_id, erro.orig)
+            metricas.incrementar('locamil_reservas_recusadas_total', motivo='banco_ocupado')
+            flash('⚠️ Sistema ocupado com outras reservas. Tente novamente em instantes.', 'warning')
+            return redirect(url_for('nova_locacao'))
         
+        metricas.incrementar('locamil_reservas_criadas_total')
         flash(f'✅ Locação criada com sucesso! Total: R$ {valor_total:.2f}', 'success')
         return redirect(url_for('index'))
     
     # GET: Exibir formulário
-    # Garantir que o banco está inicializado
-    with app.app_context():
-        if Carro.query.count() == 0:
-            seed_database()
-    
     carros = Carro.query.filter_by(ativo=True).order_by(Carro.modelo, Carro.placa).all()
     hoje = date.today().strftime('%Y-%m-%d')
     return render_template('nova_locacao.html', carros=carros, hoje=hoje)
 
 
+class PeriodoLongo(ValueError):
+    """Período acima de MAXIMO_DIAS_PERIODO dias (mensagem pronta para o usuário)."""
+
+
+def _ler_periodo(dados):
+    """
+    (data_retirada, data_devolucao) de um dict com datas AAAA-MM-DD.
+
+    Raises:
+        ValueError: Datas inválidas
+        PeriodoLongo: Período com mais de MAXIMO_DIAS_PERIODO dias
+    """
+    try:
+        data_retirada = datetime.strptime(dados.get('data_retirada') or '', '%Y-%m-%d').date()
+        data_devolucao = datetime.strptime(dados.get('data_devolucao') or '', '%Y-%m-%d').date()
+    except TypeError:
+        raise ValueError('Datas inválidas')
+    if (data_devolucao - data_retirada).days + 1 > MAXIMO_DIAS_PERIODO:
+        raise PeriodoLongo(f'Período máximo de {MAXIMO_DIAS_PERIODO} dias.')
+    return data_retirada, data_devolucao
+
+
 @app.route('/calcular_valor', methods=['POST'])
+@orcamento_consultas(2)
 def calcular_valor():
-    """Endpoint AJAX para calcular valor em tempo real."""
-    data = request.get_json()
-    carro_id = data.get('carro_id', type=int)
-    data_retirada_str = data.get('data_retirada')
-    data_devolucao_str = data.get('data_devolucao')
+    """Endpoint AJAX para calcular valor em tempo real (um carro)."""
+    data = request.get_json(silent=True) or {}
+    try:
+        carro_id = int(data.get('carro_id'))
+        data_retirada, data_devolucao = _ler_periodo(data)
+    except PeriodoLongo as erro:
+        return jsonify({'erro': str(erro)}), 400
+    except (TypeError, ValueError):
+        return jsonify({'erro': 'Dados incompletos ou inválidos'}), 400
+    
+    cotacao = tabela_tarifas.cotar(carro_id, data_retirada, data_devolucao)
+    if 'erro' in cotacao:
+        return jsonify(cotacao), 400
+    return jsonify(cotacao)
+
+
+@app.route('/cotacoes', methods=['POST'])
+@orcamento_consultas(2)
+def cotacoes():
+    """
+    Cota vários carros e períodos em uma requisição, sem acessar o banco.
     
-    if not carro_id or not data_retirada_str or not data_devolucao_str:
-        return jsonify({'erro': 'Dados incompletos'}), 400
+    Corpo JSON, em uma das formas:
+        {"itens": [{"carro_id": 1, "data_retirada": "AAAA-MM-DD", "data_devolucao": "AAAA-MM-DD"}, ...]}
+        {"data_retirada": "...", "data_devolucao": "...", "carro_ids": [1, 2]}  (sem carro_ids: frota ativa)
+    """
+    data = request.get_json(silent=True) or {}
+    pedidos = []
+    try:
+        if 'itens' in data:
+            for item in data['itens']:
+                pedidos.append((int(item.get('carro_id')), *_ler_periodo(item)))
+        else:
+            periodo = _ler_periodo(data)
+            carro_ids = data.get('carro_ids') or tabela_tarifas.carros_ativos()
+            pedidos = [(int(carro_id), *periodo) for carro_id in carro_ids]
+    except PeriodoLongo as erro:
+        return jsonify({'erro': str(erro)}), 400
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'erro': 'Dados incompletos ou inválidos'}), 400
+    
+    if len(pedidos) > MAXIMO_ITENS_COTACAO:
+        return jsonify({'erro': f'Máximo de {MAXIMO_ITENS_COTACAO} itens por requisição.'}), 400
+    
+    return jsonify({'cotacoes': tabela_tarifas.cotar_lote(pedidos)})
+
+
+@app.route('/disponibilidade', methods=['POST'])
+@orcamento_consultas(4)
+def checar_disponibilidade():
+    """
+    Endpoint AJAX para validar o formulário de locação em tempo real.
     
+    Usa apenas o índice em memória; a checagem no banco acontece no POST da locação.
+    """
+    data = request.get_json(silent=True) or {}
     try:
-        data_retirada = datetime.strptime(data_retirada_str, '%Y-%m-%d').date()
-        data_devolucao = datetime.strptime(data_devolucao_str, '%Y-%m-%d').date()
+        carro_id = int(data.get('carro_id'))
+        data_retirada = datetime.strptime(data.get('data_retirada', ''), '%Y-%m-%d').date()
+        data_devolucao = datetime.strptime(data.get('data_devolucao', ''), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return jsonify({'erro': 'Dados incompletos ou inválidos'}), 400
+    
+    disponivel, mensagem = indice_disponibilidade.verificar(carro_id, data_retirada, data_devolucao)
+    return jsonify({
+        'disponivel': disponivel,
+        'mensagem': mensagem
+    })
+
+
+@app.route('/carros_disponiveis')
+@orcamento_consultas(4)
+def carros_disponiveis():
+    """
+    Lista os carros livres num período, com o valor total cotado.
+    
+    Parâmetros (query string): data_retirada, data_devolucao (AAAA-MM-DD) e
+    categoria (opcional).
+    """
+    try:
+        data_retirada, data_devolucao = _ler_periodo(request.args)
+    except PeriodoLongo as erro:
+        return jsonify({'erro': str(erro)}), 400
     except ValueError:
         return jsonify({'erro': 'Datas inválidas'}), 400
     
-    valor_total = calcular_valor_total(carro_id, data_retirada, data_devolucao)
+    if data_devolucao < data_retirada:
+        return jsonify({'erro': 'A data de devolução não pode ser anterior à data de retirada.'}), 400
+    
+    categoria = request.args.get('categoria') or None
+    dias = (data_devolucao - data_retirada).days + 1
+    carros = consulta_carros_livres(data_retirada, data_devolucao, categoria).all()
+    cotacoes = tabela_tarifas.cotar_lote([(carro.id, data_retirada, data_devolucao) for carro in carros])
+    
+    return jsonify({
+        'data_retirada': data_retirada.isoformat(),
+        'data_devolucao': data_devolucao.isoformat(),
+        'dias': dias,
+        'total': len(carros),
+        'carros': [
+            {**carro.to_dict(), 'valor_total': cotacao.get('valor_total')}
+            for carro, cotacao in zip(carros, cotacoes)
+        ]
+    })
+
+
+@app.route('/matriz_precos')
+@orcamento_consultas(2)
+def matriz_precos():
+    """
+    Diária de cada carro ativo em cada dia do período, com as regras de preço.
+    
+    Parâmetros (query string): data_retirada, data_devolucao (AAAA-MM-DD).
+    Linhas seguem `carro_ids`; colunas seguem `dias`.
+    """
+    try:
+        data_retirada, data_devolucao = _ler_periodo(request.args)
+    except PeriodoLongo as erro:
+        return jsonify({'erro': str(erro)}), 400
+    except ValueError:
+        return jsonify({'erro': 'Datas inválidas'}), 400
+    
+    if data_devolucao < data_retirada:
+        return jsonify({'erro': 'A data de devolução não pode ser anterior à data de retirada.'}), 400
     dias = (data_devolucao - data_retirada).days + 1
     
+    carro_ids, matriz = tabela_tarifas.matriz(data_retirada, data_devolucao)
     return jsonify({
-        'valor_total': valor_total,
-        'dias': dias
+        'dias': [(data_retirada + timedelta(days=n)).isoformat() for n in range(dias)],
+        'carro_ids': carro_ids,
+        'diarias': matriz.round(2).tolist()
     })
 
 
 @app.route('/historico')
+@orcamento_consultas(6)
 def historico():
-    """Página com histórico de todas as locações."""
-    # Buscar todas as locações ordenadas por data de retirada (mais recentes primeiro)
-    locacoes = Locacao.query.order_by(Locacao.data_retirada.desc(), Locacao.created_at.desc()).all()
+    """Histórico de locações com filtros e paginação por cursor."""
+    filtros = historico_locacoes.ler_filtros(request.args)
+    cursor = request.args.get('apos')
+    por_pagina = request.args.get('por_pagina', type=int)
+    
+    locacoes, proximo_cursor = historico_locacoes.pagina(filtros, cursor, por_pagina)
+    resumo = historico_locacoes.resumo(filtros)
+    carros = Carro.query.order_by(Carro.modelo, Carro.placa).all()
+    
+    # Filtros em formato de query string para os links de paginação
+    args_filtros = {
+        chave: valor.isoformat() if hasattr(valor, 'isoformat') else valor
+        for chave, valor in filtros.items()
+    }
+    if por_pagina:
+        args_filtros['por_pagina'] = por_pagina
     
-    return render_template('historico.html', locacoes=locacoes)
+    return render_template(
+        'historico.html',
+        locacoes=locacoes,
+        resumo=resumo,
+        filtros=args_filtros,
+        carros=carros,
+        proximo_cursor=proximo_cursor,
+        primeira_pagina=not cursor
+    )
 
 
 @app.route('/finalizar_locacao/<int:locacao_id>', methods=['POST'])
+@orcamento_consultas(8)
 def finalizar_locacao(locacao_id):
     """Finaliza uma locação (marca como finalizada)."""
     locacao = Locacao.query.get_or_404(locacao_id)
@@ -541,6 +683,7 @@ def finalizar_locacao(locacao_id):
 
 
 @app.route('/cancelar_locacao/<int:locacao_id>', methods=['POST'])
+@orcamento_consultas(8)
 def cancelar_locacao(locacao_id):
     """Cancela uma locação."""
     locacao = Locacao.query.get_or_404(locacao_id)
@@ -552,12 +695,18 @@ def cancelar_locacao(locacao_id):
 
 
 @app.route('/whatsapp/<int:locacao_id>')
+@orcamento_consultas(2)
 def enviar_comprovante_whatsapp(locacao_id):
     """
     Gera link do WhatsApp Web com mensagem pré-formatada do comprovante.
     Redireciona para o WhatsApp Web.
     """
-    locacao = Locacao.query.get_or_404(locacao_id)
+    locacao = eager_carro_cliente(Locacao.query).filter(Locacao.id == locacao_id).first()
+    if locacao is None:
+        # Locação antiga já arquivada
+        locacao = eager_carro_cliente(LocacaoArquivada.query, LocacaoArquivada).filter(
+            LocacaoArquivada.id == locacao_id
+        ).first_or_404()
     
     if not locacao.cliente.whatsapp:
         flash('⚠️ Cliente não possui WhatsApp cadastrado.', 'warning')
@@ -601,186 +750,728 @@ def exportar():
     return render_template('exportar.html')
 
 
+def _resposta_download(blocos, mimetype, filename):
+    """Resposta em streaming (chunked) com os blocos do arquivo exportado."""
+    return Response(
+        stream_with_context(blocos),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
 @app.route('/exportar/sql')
+@orcamento_consultas(len(exportacao.tabelas_dump()))  # uma consulta por tabela
 def exportar_sql():
-    """Exporta todos os dados em formato SQL (INSERT statements)."""
-    carros = Carro.query.all()
-    clientes = Cliente.query.all()
-    locacoes = Locacao.query.all()
-    
-    sql_content = []
-    sql_content.append("-- Exportação de dados da Locadora")
-    sql_content.append(f"-- Data: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    sql_content.append("-- Formato: SQL INSERT statements")
-    sql_content.append("")
-    sql_content.append("-- ============================================")
-    sql_content.append("-- TABELA: CARROS")
-    sql_content.append("-- ============================================")
-    sql_content.append("")
-    
-    for carro in carros:
-        modelo_escaped = carro.modelo.replace("'", "''") if carro.modelo else ""
-        placa_escaped = carro.placa.replace("'", "''") if carro.placa else ""
-        cor_escaped = (carro.cor or "").replace("'", "''")
-        sql_content.append(
-            f"INSERT INTO carros (id, modelo, placa, cor, valor_diaria, ativo, created_at) "
-            f"VALUES ({carro.id}, '{modelo_escaped}', '{placa_escaped}', "
-            f"'{cor_escaped}', {carro.valor_diaria}, {1 if carro.ativo else 0}, "
-            f"'{carro.created_at.strftime('%Y-%m-%d %H:%M:%S')}');"
-        )
-    
-    sql_content.append("")
-    sql_content.append("-- ============================================")
-    sql_content.append("-- TABELA: CLIENTES")
-    sql_content.append("-- ============================================")
-    sql_content.append("")
-    
-    for cliente in clientes:
-        nome_escaped = cliente.nome.replace("'", "''") if cliente.nome else ""
-        whatsapp_escaped = cliente.whatsapp.replace("'", "''") if cliente.whatsapp else ""
-        sql_content.append(
-            f"INSERT INTO clientes (id, nome, whatsapp, created_at) "
-            f"VALUES ({cliente.id}, '{nome_escaped}', "
-            f"'{whatsapp_escaped}', '{cliente.created_at.strftime('%Y-%m-%d %H:%M:%S')}');"
-        )
-    
-    sql_content.append("")
-    sql_content.append("-- ============================================")
-    sql_content.append("-- TABELA: LOCACOES")
-    sql_content.append("-- ============================================")
-    sql_content.append("")
-    
-    for locacao in locacoes:
-        observacoes_escaped = (locacao.observacoes or "").replace("'", "''")
-        status_escaped = locacao.status.replace("'", "''") if locacao.status else ""
-        sql_content.append(
-            f"INSERT INTO locacoes (id, carro_id, cliente_id, data_retirada, data_devolucao, "
-            f"valor_total, status, observacoes, created_at) "
-            f"VALUES ({locacao.id}, {locacao.carro_id}, {locacao.cliente_id}, "
-            f"'{locacao.data_retirada}', '{locacao.data_devolucao}', {locacao.valor_total}, "
-            f"'{status_escaped}', '{observacoes_escaped}', "
-            f"'{locacao.created_at.strftime('%Y-%m-%d %H:%M:%S')}');"
-        )
-    
-    sql_text = "\n".join(sql_content)
-    
-    # Criar arquivo em memória
-    output = io.BytesIO()
-    output.write(sql_text.encode('utf-8'))
-    output.seek(0)
+    """
+    Exporta o banco completo em SQL para restauração, em streaming.
     
-    filename = f"locadora_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.sql"
-    return send_file(
-        output,
-        mimetype='text/sql',
-        as_attachment=True,
-        download_name=filename
+    `?formato=insert` (padrão) gera INSERTs de várias linhas em transações;
+    `?formato=copy` gera `COPY ... FROM stdin` para PostgreSQL.
+    """
+    formato = request.args.get('formato', 'insert')
+    if formato not in exportacao.FORMATOS_SQL:
+        formato = 'insert'
+    sufixo = '_copy' if formato == 'copy' else ''
+    metricas.incrementar('locamil_exportacoes_total', formato=f'sql{sufixo}')
+    return _resposta_download(
+        exportacao.gerar_sql(formato), 'text/sql',
+        exportacao.nome_arquivo(f'locadora_export{sufixo}', 'sql')
     )
 
 
 @app.route('/exportar/csv')
+@orcamento_consultas(3)
 def exportar_csv():
-    """Exporta locações em formato CSV para análise."""
-    locacoes = Locacao.query.all()
-    
-    # Criar CSV em memória
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Cabeçalho
-    writer.writerow([
-        'ID', 'Carro', 'Placa', 'Cliente', 'WhatsApp', 
-        'Data Retirada', 'Data Devolução', 'Dias', 
-        'Valor Diária', 'Valor Total', 'Status', 'Data Criação'
-    ])
-    
-    # Dados
-    for locacao in locacoes:
-        dias = (locacao.data_devolucao - locacao.data_retirada).days + 1
-        writer.writerow([
-            locacao.id,
-            locacao.carro.modelo,
-            locacao.carro.placa,
-            locacao.cliente.nome,
-            locacao.cliente.whatsapp or '',
-            locacao.data_retirada.strftime('%d/%m/%Y'),
-            locacao.data_devolucao.strftime('%d/%m/%Y'),
-            dias,
-            locacao.carro.valor_diaria,
-            locacao.valor_total,
-            locacao.status,
-            locacao.created_at.strftime('%d/%m/%Y %H:%M:%S')
-        ])
-    
-    # Converter para bytes
-    output_bytes = io.BytesIO()
-    output_bytes.write(output.getvalue().encode('utf-8-sig'))  # BOM para Excel
-    output_bytes.seek(0)
-    
-    filename = f"locacoes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    return send_file(
-        output_bytes,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
+    """Exporta locações em formato CSV para análise, em streaming."""
+    metricas.incrementar('locamil_exportacoes_total', formato='csv')
+    return _resposta_download(
+        exportacao.gerar_csv(), 'text/csv', exportacao.nome_arquivo('locacoes_export', 'csv')
     )
 
 
 @app.route('/exportar/json')
+@orcamento_consultas(5)
 def exportar_json():
-    """Exporta todos os dados em formato JSON para análise."""
-    carros = [carro.to_dict() for carro in Carro.query.all()]
-    clientes = [cliente.to_dict() for cliente in Cliente.query.all()]
-    locacoes = []
-    
-    for locacao in Locacao.query.all():
-        loc_dict = locacao.to_dict()
-        loc_dict['data_retirada'] = locacao.data_retirada.isoformat()
-        loc_dict['data_devolucao'] = locacao.data_devolucao.isoformat()
-        loc_dict['created_at'] = locacao.created_at.isoformat()
-        locacoes.append(loc_dict)
-    
-    dados_export = {
-        'exportacao': {
-            'data': datetime.now().isoformat(),
-            'versao': '1.0'
-        },
-        'carros': carros,
-        'clientes': clientes,
-        'locacoes': locacoes
-    }
+    """Exporta todos os dados em formato JSON para análise, em streaming."""
+    metricas.incrementar('locamil_exportacoes_total', formato='json')
+    return _resposta_download(
+        exportacao.gerar_json(), 'application/json', exportacao.nome_arquivo('locadora_export', 'json')
+    )
+
+
+@app.route('/exportar/alteracoes')
+@orcamento_consultas(5)
+def exportar_alteracoes():
+    """
+    Exportação incremental em JSON: carros, clientes, locações e gastos criados
+    ou alterados depois de `?desde=` (a `proxima_marca` da exportação anterior).
+    Sem `desde`, exporta todas as linhas.
+    """
+    try:
+        desde = exportacao.ler_marca(request.args.get('desde'))
+    except ValueError:
+        return jsonify({'erro': 'Marca inválida. Use a proxima_marca da exportação anterior (ISO 8601).'}), 400
+
+    blocos, proxima_marca = exportacao.gerar_alteracoes(desde)
+    metricas.incrementar('locamil_exportacoes_total', formato='alteracoes')
+    resposta = _resposta_download(
+        blocos, 'application/json', exportacao.nome_arquivo('locadora_alteracoes', 'json')
+    )
+    resposta.headers['X-Proxima-Marca'] = proxima_marca.isoformat()
+    return resposta
+
+
+@app.route('/exportar/colunar/<conjunto>')
+@orcamento_consultas(2)
+def exportar_colunar(conjunto):
+    """
+    Exporta locações (com carro e cliente) ou gastos em Parquet/Arrow, em streaming.
     
-    json_text = json_lib.dumps(dados_export, ensure_ascii=False, indent=2)
+    `?formato=parquet` (padrão) ou `?formato=arrow` (Arrow IPC, mapeável em memória).
+    """
+    if conjunto not in exportacao_colunar.CONJUNTOS:
+        return jsonify({'erro': f'Conjunto inválido: {conjunto}'}), 404
+    if not exportacao_colunar.disponivel():
+        flash('⚠️ A exportação Parquet/Arrow requer o pacote pyarrow (pip install pyarrow).', 'warning')
+        return redirect(url_for('exportar'))
+    
+    formato = request.args.get('formato', 'parquet')
+    if formato not in exportacao_colunar.FORMATOS:
+        formato = 'parquet'
+    metricas.incrementar('locamil_exportacoes_total', formato=formato)
+    return _resposta_download(
+        exportacao_colunar.gerar(conjunto, formato),
+        exportacao_colunar.MIMETYPES[formato],
+        exportacao.nome_arquivo(f'{conjunto}_export', exportacao_colunar.EXTENSOES[formato])
+    )
+
+
+def _formato_importacao(nome_arquivo):
+    """'json' ou 'csv' conforme a extensão do arquivo (None se não suportado)."""
+    extensao = os.path.splitext(nome_arquivo or '')[1].lower().lstrip('.')
+    return extensao if extensao in ('json', 'csv') else None
+
+
+@app.route('/importar', methods=['POST'])
+def importar():
+    """Importa um arquivo JSON/CSV no formato das exportações."""
+    arquivo = request.files.get('arquivo')
+    formato = _formato_importacao(arquivo.filename if arquivo else None)
+    if not formato:
+        flash('⚠️ Selecione um arquivo .json ou .csv exportado pelo sistema.', 'danger')
+        return redirect(url_for('exportar'))
     
-    # Criar arquivo em memória
-    output = io.BytesIO()
-    output.write(json_text.encode('utf-8'))
-    output.seek(0)
+    try:
+        relatorio = importacao.importar(
+            importacao.ler_arquivo(arquivo.stream, formato), formatar_telefone
+        )
+    except (ValueError, UnicodeDecodeError) as erro:
+        flash(f'❌ Arquivo inválido: {erro}', 'danger')
+        return redirect(url_for('exportar'))
+    
+    flash(
+        f'✅ Importação concluída: {relatorio.locacoes} locações, {relatorio.atualizadas} atualizadas, '
+        f'{relatorio.gastos} gastos, '
+        f'{relatorio.clientes_criados} clientes e {relatorio.carros_criados} carros novos '
+        f'({relatorio.linhas_por_segundo:.0f} linhas/s).', 'success'
+    )
+    rejeitadas = relatorio.invalidas + relatorio.conflitos
+    if rejeitadas or relatorio.duplicadas:
+        detalhes = '; '.join(f"linha {erro['linha']}: {erro['motivo']}" for erro in relatorio.erros[:5])
+        flash(
+            f'⚠️ {rejeitadas} linha(s) rejeitada(s) e {relatorio.duplicadas} já existente(s) ignorada(s). {detalhes}',
+            'warning'
+        )
+    return redirect(url_for('exportar'))
+
+
+# ============================================================================
+# COMANDOS CLI
+# ============================================================================
+
+@app.cli.command('reconstruir-resumo')
+def reconstruir_resumo_comando():
+    """Recalcula o resumo mensal de receitas e despesas (backfill)."""
+    linhas = reconstruir_resumo()
+    print(f"✅ Resumo mensal reconstruído: {linhas} linha(s).")
+
+
+@app.cli.command('verificar-orcamentos')
+def verificar_orcamentos_comando():
+    """
+    Executa as rotas principais e falha se alguma passar do orçamento de consultas.
     
-    filename = f"locadora_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    return send_file(
-        output,
-        mimetype='application/json',
-        as_attachment=True,
-        download_name=filename
+    Rode contra um banco com volume realista (várias locações por carro) para
+    que regressões N+1 apareçam.
+    """
+    app.config['ORCAMENTO_CONSULTAS_ESTRITO'] = True
+    app.testing = True
+    hoje = date.today()
+    semana = hoje + timedelta(days=7)
+    
+    with app.app_context():
+        locacao = Locacao.query.order_by(Locacao.id).first()
+        carro = Carro.query.filter_by(ativo=True).order_by(Carro.id).first()
+    
+    periodo = {'data_retirada': hoje.isoformat(), 'data_devolucao': semana.isoformat()}
+    requisicoes = [
+        ('GET', '/', None),
+        ('GET', '/nova_locacao', None),
+        ('GET', '/historico', None),
+        ('GET', f"/carros_disponiveis?data_retirada={hoje}&data_devolucao={semana}", None),
+        ('GET', f"/matriz_precos?data_retirada={hoje}&data_devolucao={semana}", None),
+        ('GET', '/exportar/sql', None),
+        ('GET', '/exportar/sql?formato=copy', None),
+        ('GET', '/exportar/csv', None),
+        ('GET', '/exportar/json', None),
+        ('GET', '/exportar/colunar/locacoes', None),
+        ('GET', '/exportar/colunar/gastos?formato=arrow', None),
+        ('GET', f"/exportar/alteracoes?desde={datetime.utcnow() - timedelta(days=1):%Y-%m-%dT%H:%M:%S}", None),
+    ]
+    requisicoes.append(('POST', '/cotacoes', periodo))
+    if carro:
+        requisicoes.append(('POST', '/disponibilidade', {'carro_id': carro.id, **periodo}))
+        requisicoes.append(('POST', '/calcular_valor', {'carro_id': carro.id, **periodo}))
+    if locacao:
+        requisicoes.append(('GET', f'/whatsapp/{locacao.id}', None))
+    
+    cliente = app.test_client()
+    falhas = 0
+    for metodo, url, corpo in requisicoes:
+        # O dashboard é medido sem cache, no pior caso
+        cache_dashboard.limpar()
+        try:
+            resposta = cliente.open(url, method=metodo, json=corpo)
+            # Exportações são enviadas em streaming: consome o corpo para contar tudo
+            resposta.get_data()
+            print(f"✅ {metodo} {url} ({resposta.status_code})")
+        except OrcamentoConsultasExcedido as erro:
+            falhas += 1
+            print(f"❌ {metodo} {url}: {erro}")
+    
+    if falhas:
+        raise click.ClickException(f"{falhas} rota(s) acima do orçamento de consultas.")
+
+
+@app.cli.command('migrar')
+@click.option('--status', 'somente_status', is_flag=True, help='Apenas lista as migrações aplicadas e pendentes.')
+def migrar_comando(somente_status):
+    """Aplica as migrações de schema pendentes (índices, colunas novas)."""
+    if somente_status:
+        for versao, descricao, aplicada in migracoes.status_migracoes():
+            print(f"{'✅' if aplicada else '⏳'} {versao:03d} - {descricao}")
+        return
+    
+    executadas = migracoes.aplicar_migracoes()
+    for item in executadas:
+        print(f"✅ Migração {item.versao:03d} aplicada: {item.descricao}")
+    if not executadas:
+        print("✅ Schema já está na versão mais recente.")
+
+
+@app.cli.command('verificar-indices')
+@click.option('--planos', is_flag=True, help='Exibe o plano de execução completo de cada consulta.')
+def verificar_indices_comando(planos):
+    """Confere via EXPLAIN se as consultas quentes usam os índices compostos."""
+    ausentes = migracoes.indices_ausentes()
+    if ausentes:
+        raise click.ClickException(
+            f"Índices ausentes: {', '.join(ausentes)}. Execute `flask --app app migrar`."
+        )
+    
+    falhas = 0
+    for resultado in migracoes.verificar_planos():
+        marcador = '✅' if resultado['usa_indice'] else '❌'
+        print(f"{marcador} {resultado['consulta']}: {resultado['indice']}")
+        if planos or not resultado['usa_indice']:
+            for linha in resultado['plano'].splitlines():
+                print(f"      {linha}")
+        falhas += 0 if resultado['usa_indice'] else 1
+    
+    if falhas:
+        raise click.ClickException(f"{falhas} consulta(s) não usam o índice esperado.")
+
+
+@app.cli.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['json', 'csv']), help='Padrão: pela extensão do arquivo.')
+@click.option('--lote', default=importacao.TAMANHO_LOTE, show_default=True, help='Linhas gravadas por transação.')
+@click.option('--simular', is_flag=True, help='Apenas valida o arquivo, sem gravar.')
+def importar_comando(arquivo, formato, lote, simular):
+    """Importa em massa um JSON/CSV no formato das exportações."""
+    formato = formato or _formato_importacao(arquivo)
+    if not formato:
+        raise click.ClickException("Informe --formato (json ou csv).")
+    
+    def progresso(relatorio):
+        print(
+            f"⏳ {relatorio.lidas:,} linhas lidas • {relatorio.locacoes:,} locações gravadas • "
+            f"{relatorio.linhas_por_segundo:,.0f} linhas/s • {relatorio.segundos:.1f}s"
+        )
+    
+    with open(arquivo, 'rb') as entrada:
+        relatorio = importacao.importar(
+            importacao.ler_arquivo(entrada, formato), formatar_telefone,
+            tamanho_lote=lote, simular=simular, progresso=progresso
+        )
+    
+    for erro in relatorio.erros:
+        print(f"❌ Linha {erro['linha']}: {erro['motivo']}")
+    resumo = relatorio.to_dict()
+    resumo.pop('erros')
+    print(f"{'🔎 Simulação' if simular else '✅ Importação'} concluída: {resumo}")
+
+
+@app.cli.command('exportar-colunar')
+@click.argument('destino', type=click.Path(file_okay=False))
+@click.option('--formato', type=click.Choice(exportacao_colunar.FORMATOS), default='parquet', show_default=True)
+@click.option('--grupo', default=exportacao_colunar.LINHAS_POR_GRUPO, show_default=True,
+              help='Linhas por row group / record batch.')
+def exportar_colunar_comando(destino, formato, grupo):
+    """Grava locacoes e gastos em Parquet/Arrow na pasta DESTINO."""
+    if not exportacao_colunar.disponivel():
+        raise click.ClickException("Instale o pacote opcional pyarrow (pip install pyarrow).")
+    
+    os.makedirs(destino, exist_ok=True)
+    for conjunto in exportacao_colunar.CONJUNTOS:
+        caminho = os.path.join(destino, f"{conjunto}.{exportacao_colunar.EXTENSOES[formato]}")
+        inicio = time.perf_counter()
+        total = exportacao_colunar.gravar(conjunto, caminho, formato, grupo)
+        print(f"✅ {caminho}: {total:,} linhas em {time.perf_counter() - inicio:.2f}s")
+
+
+def _descrever_regra(regra):
+    condicoes = []
+    if regra.categoria:
+        condicoes.append(f"categoria {regra.categoria}")
+    dias_semana = precificacao.ler_dias_semana(regra.dias_semana)
+    if dias_semana:
+        condicoes.append('/'.join(precificacao.NOMES_DIAS_SEMANA[dia] for dia in dias_semana))
+    if regra.data_inicio or regra.data_fim:
+        inicio = regra.data_inicio.strftime('%d/%m/%Y') if regra.data_inicio else '…'
+        fim = regra.data_fim.strftime('%d/%m/%Y') if regra.data_fim else '…'
+        condicoes.append(f"{inicio} a {fim}")
+    if regra.dias_minimos:
+        condicoes.append(f"a partir de {regra.dias_minimos} dias")
+    return f"{regra.nome}: x{regra.multiplicador:g} ({', '.join(condicoes) or 'sempre'})"
+
+
+@app.cli.command('regras-preco')
+def regras_preco_comando():
+    """Lista as regras de preço cadastradas."""
+    regras = RegraPreco.query.order_by(RegraPreco.id).all()
+    for regra in regras:
+        print(f"{'✅' if regra.ativo else '⏸️'} {regra.id:3d} - {_descrever_regra(regra)}")
+    if not regras:
+        print("ℹ️ Nenhuma regra de preço: vale a diária de cada carro.")
+
+
+@app.cli.command('adicionar-regra-preco')
+@click.argument('nome')
+@click.argument('multiplicador', type=float)
+@click.option('--categoria', help='Vale só para carros desta categoria.')
+@click.option('--dias-semana', help='Dias da semana, ex.: 5,6 (0 = segunda ... 6 = domingo).')
+@click.option('--inicio', type=click.DateTime(['%Y-%m-%d']), help='Início da temporada (AAAA-MM-DD).')
+@click.option('--fim', type=click.DateTime(['%Y-%m-%d']), help='Fim da temporada (AAAA-MM-DD).')
+@click.option('--dias-minimos', type=int, help='Desconto por duração: locações com pelo menos N dias.')
+def adicionar_regra_preco_comando(nome, multiplicador, categoria, dias_semana, inicio, fim, dias_minimos):
+    """Cadastra uma regra de preço (MULTIPLICADOR 1.2 = +20%, 0.9 = -10%)."""
+    regra = RegraPreco(
+        nome=nome,
+        multiplicador=multiplicador,
+        categoria=categoria or None,
+        dias_semana=dias_semana or None,
+        data_inicio=inicio.date() if inicio else None,
+        data_fim=fim.date() if fim else None,
+        dias_minimos=dias_minimos
+    )
+    try:
+        precificacao.validar_regra(regra)
+    except ValueError as erro:
+        raise click.ClickException(str(erro))
+    
+    db.session.add(regra)
+    db.session.commit()
+    print(f"✅ Regra {regra.id} cadastrada - {_descrever_regra(regra)}")
+
+
+@app.cli.command('remover-regra-preco')
+@click.argument('regra_id', type=int)
+def remover_regra_preco_comando(regra_id):
+    """Remove uma regra de preço."""
+    regra = db.session.get(RegraPreco, regra_id)
+    if regra is None:
+        raise click.ClickException(f"Regra {regra_id} não encontrada.")
+    db.session.delete(regra)
+    db.session.commit()
+    print(f"✅ Regra {regra_id} removida.")
+
+
+@app.cli.command('benchmark-precos')
+@click.option('--carros', default=1000, show_default=True)
+@click.option('--dias', default=30, show_default=True)
+@click.option('--repeticoes', default=50, show_default=True)
+def benchmark_precos_comando(carros, dias, repeticoes):
+    """Mede a latência da matriz de preços carros × dias (frota e regras sintéticas)."""
+    resultado = precificacao.benchmark(carros, dias, repeticoes)
+    print(
+        f"✅ Matriz {resultado['carros']:,} carros × {resultado['dias']} dias, "
+        f"{resultado['regras']} regras ({resultado['repeticoes']} repetições)"
+    )
+    print(f"   compilação: {resultado['compilacao_ms']:.2f} ms")
+    print(
+        f"   vetorizado: p50 {resultado['p50_ms']:.2f} ms • p95 {resultado['p95_ms']:.2f} ms • "
+        f"máx {resultado['max_ms']:.2f} ms"
     )
+    print(
+        f"   referência (laços Python): {resultado['referencia_ms']:.1f} ms • "
+        f"{resultado['aceleracao']}x mais rápido • diferença máxima {resultado['diferenca_maxima']:.2e}"
+    )
+
+
+@app.cli.command('estresse-reservas')
+@click.option('--processos', default=8, show_default=True, help='Processos escrevendo ao mesmo tempo.')
+@click.option('--reservas', 'reservas_por_processo', default=50, show_default=True, help='Tentativas de reserva por processo.')
+@click.option('--carros', default=2, show_default=True, help='Carros disputados (poucos = mais concorrência por carro).')
+@click.option('--janela', default=30, show_default=True, help='Dias em que as retiradas são sorteadas.')
+@click.option('--banco', help='URI de um banco descartável (padrão: SQLite temporário).')
+@click.option('--sem-trava', is_flag=True, help='Checagem e INSERT sem trava (comportamento antigo), para comparação.')
+def estresse_reservas_comando(processos, reservas_por_processo, carros, janela, banco, sem_trava):
+    """Reservas concorrentes de vários processos nos mesmos carros; falha se houver reserva dupla."""
+    resultado = reservas.estresse(
+        processos, reservas_por_processo, carros, janela, travar=not sem_trava, banco=banco
+    )
+    print(
+        f"{'🔓 Sem trava' if sem_trava else '🔒 Com trava'}: {resultado['processos']} processos × "
+        f"{reservas_por_processo} reservas em {resultado['carros']} carro(s) ({resultado['banco']})"
+    )
+    print(
+        f"   {resultado['criadas']} criadas • {resultado['recusadas']} recusadas • "
+        f"{resultado['repeticoes']} repetições • {resultado['erros']} erros"
+    )
+    print(
+        f"   {resultado['reservas_por_segundo']} reservas/s • "
+        f"p50 {resultado['p50_ms']} ms • p99 {resultado['p99_ms']} ms"
+    )
+    if resultado['sobreposicoes']:
+        raise click.ClickException(f"{resultado['sobreposicoes']} par(es) de locações sobrepostas (reserva dupla).")
+    print("✅ Nenhuma reserva dupla.")
+
+
+@app.cli.command('benchmark-sqlite')
+@click.option('--perfil', 'perfis', multiple=True, type=click.Choice(configuracao_banco.PERFIS),
+              help='Perfis comparados (padrão: todos).')
+@click.option('--processos', default=8, show_default=True)
+@click.option('--segundos', default=5.0, show_default=True)
+@click.option('--escritas', default=0.2, show_default=True, help='Fração das operações que são escritas.')
+def benchmark_sqlite_comando(perfis, processos, segundos, escritas):
+    """Leituras e escritas simultâneas de vários processos num SQLite, por perfil."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if configuracao_banco.eh_sqlite_arquivo(uri):
+        with db.engine.connect() as conexao:
+            print(f"ℹ️ Pragmas do app ({uri}): {configuracao_banco.pragmas_atuais(conexao)}")
+    
+    for resultado in configuracao_banco.benchmark(perfis or configuracao_banco.PERFIS, processos, segundos, escritas):
+        marcador = '✅' if not resultado['erros'] else '⚠️'
+        print(
+            f"{marcador} {resultado['perfil']}: {resultado['leituras_por_segundo']:,.0f} leituras/s "
+            f"(p50 {resultado['leitura_p50_ms']} ms, p99 {resultado['leitura_p99_ms']} ms) • "
+            f"{resultado['escritas_por_segundo']:,.0f} escritas/s "
+            f"(p50 {resultado['escrita_p50_ms']} ms, p99 {resultado['escrita_p99_ms']} ms) • "
+            f"{resultado['erros']} erros"
+        )
+
+
+@app.cli.command('deduplicar-clientes')
+@click.option('--lote', default=CLIENTES_POR_LOTE, show_default=True, help='Duplicados unidos por transação.')
+@click.option('--simular', is_flag=True, help='Apenas conta os duplicados, sem gravar.')
+def deduplicar_clientes_comando(lote, simular):
+    """Une clientes duplicados (nome normalizado + WhatsApp) e reaponta suas locações."""
+    relatorio = deduplicar_clientes(lote, simular)
+    print(
+        f"{'🔎 Simulação' if simular else '✅ Deduplicação'}: {relatorio['grupos']:,} grupo(s), "
+        f"{relatorio['clientes_removidos']:,} cliente(s) unido(s), "
+        f"{relatorio['locacoes_reapontadas']:,} locação(ões) reapontada(s) em {relatorio['segundos']:.2f}s"
+    )
+
+
+@app.cli.command('encerrar-vencidas')
+@click.option('--tolerancia', default=encerramento.TOLERANCIA_DIAS, show_default=True,
+              help='Dias de atraso tolerados após a devolução.')
+@click.option('--data', 'data_referencia', default=None, help='Data de referência AAAA-MM-DD (padrão: hoje).')
+@click.option('--simular', is_flag=True, help='Apenas conta as locações vencidas, sem gravar.')
+def encerrar_vencidas_comando(tolerancia, data_referencia, simular):
+    """Finaliza as locações ativas com devolução vencida (para uso no cron)."""
+    if data_referencia:
+        data_referencia = datetime.strptime(data_referencia, '%Y-%m-%d').date()
+    relatorio = encerramento.encerrar_vencidas(data_referencia, tolerancia, simular)
+    print(
+        f"{'🔎 Simulação' if simular else '✅ Encerramento'}: {relatorio['encerradas']:,} locação(ões) "
+        f"com devolução antes de {relatorio['data_limite'].strftime('%d/%m/%Y')} "
+        f"em {relatorio['segundos']:.2f}s"
+    )
+
+
+@app.cli.command('encerramentos')
+@click.option('--limite', default=10, show_default=True, help='Quantidade de execuções listadas.')
+def encerramentos_comando(limite):
+    """Lista as últimas execuções do encerramento automático e as locações encerradas."""
+    execucoes = encerramento.ultimas_execucoes(limite)
+    if not execucoes:
+        print("ℹ️ Nenhuma locação encerrada automaticamente.")
+        return
+    for execucao in execucoes:
+        ids = execucao.locacao_ids.split(',')
+        amostra = ', '.join(ids[:10]) + (f" … (+{len(ids) - 10})" if len(ids) > 10 else '')
+        print(
+            f"#{execucao.id} {execucao.executado_em.strftime('%d/%m/%Y %H:%M')} ({execucao.origem}) • "
+            f"{execucao.quantidade:,} locação(ões) antes de {execucao.data_limite.strftime('%d/%m/%Y')}: {amostra}"
+        )
+
+
+@app.cli.command('arquivar-locacoes')
+@click.option('--horizonte', default=arquivamento.HORIZONTE_DIAS, show_default=True,
+              help='Arquiva encerradas devolvidas há mais que estes dias.')
+@click.option('--lote', default=arquivamento.LOCACOES_POR_LOTE, show_default=True, help='Locações movidas por transação.')
+@click.option('--simular', is_flag=True, help='Apenas conta as locações arquiváveis, sem mover.')
+def arquivar_locacoes_comando(horizonte, lote, simular):
+    """Move locações finalizadas/canceladas antigas para o arquivo (locacoes_arquivo)."""
+    relatorio = arquivamento.arquivar(horizonte, lote, simular=simular)
+    print(
+        f"{'🔎 Simulação' if simular else '✅ Arquivamento'}: {relatorio['arquivadas']:,} locação(ões) "
+        f"devolvida(s) antes de {relatorio['data_limite'].strftime('%d/%m/%Y')} em {relatorio['segundos']:.2f}s"
+        + (f" ({relatorio['lotes']} lote(s), {relatorio['linhas_por_segundo']:,} linhas/s)"
+           if relatorio['lotes'] else "")
+    )
+    contagens = arquivamento.contagens()
+    print(
+        f"   tabela principal: {contagens['locacoes']:,} ({contagens['ativas']:,} ativas) • "
+        f"arquivo: {contagens['arquivo']:,}"
+    )
+
+
+@app.cli.command('benchmark-arquivamento')
+@click.option('--locacoes', default=2_000_000, show_default=True)
+@click.option('--carros', default=2000, show_default=True)
+@click.option('--anos', default=5, show_default=True, help='Anos de histórico sintético.')
+@click.option('--horizonte', default=arquivamento.HORIZONTE_DIAS, show_default=True)
+@click.option('--repeticoes', default=20, show_default=True)
+@click.option('--banco', help='URI de um banco descartável (padrão: SQLite temporário).')
+def benchmark_arquivamento_comando(locacoes, carros, anos, horizonte, repeticoes, banco):
+    """Tempos das consultas quentes num histórico grande, antes e depois de arquivar."""
+    resultado = arquivamento.benchmark(
+        locacoes, carros, anos=anos, horizonte_dias=horizonte, repeticoes=repeticoes, banco=banco
+    )
+    antes, depois, relatorio = resultado['antes'], resultado['depois'], resultado['arquivamento']
+    print(f"✅ {locacoes:,} locações sintéticas em {resultado['segundos_carga']}s ({resultado['banco']})")
+    print(
+        f"   arquivadas {relatorio['arquivadas']:,} em {relatorio['segundos']:.1f}s "
+        f"({relatorio['linhas_por_segundo']:,} linhas/s) • tabela principal "
+        f"{antes['locacoes']:,} → {depois['locacoes']:,} ({depois['ativas']:,} ativas)"
+    )
+    if antes['tamanho_mb'] and depois['tamanho_mb']:
+        print(
+            f"   tamanho (dados + índices): principal {antes['tamanho_mb']['locacoes']:,} MB → "
+            f"{depois['tamanho_mb']['locacoes']:,} MB • arquivo {depois['tamanho_mb']['arquivo']:,} MB"
+        )
+    for item in resultado['consultas']:
+        ganho = item['antes_ms'] / item['depois_ms'] if item['depois_ms'] else 0
+        print(
+            f"   {item['consulta']:<24} {item['antes_ms']:>10.3f} ms → {item['depois_ms']:>10.3f} ms "
+            f"({ganho:.1f}x)"
+        )
+
+
+@app.cli.command('gerar-dados')
+@click.option('--carros', default=1000, show_default=True)
+@click.option('--clientes', default=20000, show_default=True)
+@click.option('--locacoes', default=100000, show_default=True)
+@click.option('--gastos', default=20000, show_default=True)
+@click.option('--anos', default=3, show_default=True, help='Anos de histórico.')
+@click.option('--semente', default=0, show_default=True, help='Mesma semente = mesmos dados.')
+@click.option('--lote', default=dados_sinteticos.LINHAS_POR_LOTE, show_default=True, help='Linhas por transação.')
+def gerar_dados_comando(carros, clientes, locacoes, gastos, anos, semente, lote):
+    """Popula o banco com frota, clientes, locações e gastos sintéticos (use um banco de testes)."""
+    total = carros + clientes + locacoes + gastos
+
+    def progresso(gravadas):
+        print(f"   {gravadas:,} de ~{total:,} linhas gravadas", end='\r', flush=True)
+
+    try:
+        relatorio = dados_sinteticos.gerar(
+            carros, clientes, locacoes, gastos, anos=anos, semente=semente, tamanho_lote=lote, progresso=progresso
+        )
+    except ValueError as erro:
+        raise click.ClickException(str(erro))
+    print()
+    print(
+        f"✅ {relatorio['carros']:,} carros, {relatorio['clientes']:,} clientes, "
+        f"{relatorio['locacoes']:,} locações e {relatorio['gastos']:,} gastos em {relatorio['segundos']}s "
+        f"({relatorio['linhas_por_segundo']:,} linhas/s)"
+    )
+
+
+@app.cli.command('benchmark-rotas')
+@click.option('--saida', type=click.Path(dir_okay=False), help='Grava o relatório JSON neste arquivo.')
+@click.option('--comparar', 'anterior', type=click.File('r'), help='Relatório anterior para comparar.')
+@click.option('--repeticoes', default=10, show_default=True)
+@click.option('--repeticoes-exportacao', default=3, show_default=True)
+@click.option('--rota', 'rotas', multiple=True, help='Mede só esta rota (pode repetir).')
+@click.option('--tolerancia', default=benchmark_rotas.TOLERANCIA_REGRESSAO, show_default=True,
+              help='Aumento do p50 aceito antes de apontar regressão (0.2 = 20%).')
+@click.option('--estrito', is_flag=True, help='Falha se a comparação apontar regressão.')
+def benchmark_rotas_comando(saida, anterior, repeticoes, repeticoes_exportacao, rotas, tolerancia, estrito):
+    """Tempo e consultas SQL das rotas principais pelo test client, com relatório JSON."""
+    def progresso(nome, resultado):
+        marca = '❌' if resultado['erros'] else '✅'
+        print(
+            f"{marca} {nome:<28} p50 {resultado['p50_ms']:>10.2f} ms • p95 {resultado['p95_ms']:>10.2f} ms • "
+            f"{resultado['consultas_sql']:>3} SQL • {resultado['bytes']:,} bytes"
+        )
+
+    try:
+        relatorio = benchmark_rotas.executar(
+            app, cache_dashboard, repeticoes, repeticoes_exportacao, rotas=set(rotas), progresso=progresso
+        )
+    except ValueError as erro:
+        raise click.ClickException(str(erro))
+
+    volume = relatorio['volume']
+    print(
+        f"📊 commit {relatorio['commit'] or '?'} • {volume['carros']:,} carros • "
+        f"{volume['locacoes'] + volume['locacoes_arquivo']:,} locações • {volume['gastos']:,} gastos"
+    )
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        print(f"💾 Relatório gravado em {saida}")
+
+    if anterior:
+        relatorio_anterior = json.load(anterior)
+        if relatorio_anterior.get('volume') != relatorio['volume']:
+            print("⚠️ Os relatórios foram gerados com volumes de dados diferentes.")
+        regressoes = 0
+        for item in benchmark_rotas.comparar(relatorio, relatorio_anterior, tolerancia):
+            regressoes += item['regressao']
+            print(
+                f"{'⚠️' if item['regressao'] else '  '} {item['rota']:<28} {item['p50_antes']:>10.2f} → "
+                f"{item['p50_depois']:>10.2f} ms ({item['variacao']:+.0%}) • "
+                f"SQL {item['consultas_antes']} → {item['consultas_depois']}"
+            )
+        if regressoes and estrito:
+            raise click.ClickException(f"{regressoes} rota(s) com regressão em relação a {anterior.name}.")
+
+
+@app.cli.command('teste-carga')
+@click.option('--workers', default=4, show_default=True, help='Processos servidores (workers do gunicorn).')
+@click.option('--threads', default=1, show_default=True, help='Threads por worker.')
+@click.option('--clientes', default=16, show_default=True, help='Atendentes simultâneos.')
+@click.option('--segundos', default=30.0, show_default=True)
+@click.option('--servidor', type=click.Choice(carga.SERVIDORES), help='Padrão: gunicorn se instalado.')
+@click.option('--mix', help='Pesos das rotas, ex.: dashboard=50,reserva=30 (demais ficam com o padrão; 0 desliga).')
+@click.option('--locacoes', default=20000, show_default=True, help='Locações sintéticas se o banco estiver vazio.')
+@click.option('--carros-disputados', default=5, show_default=True, help='Carros que recebem todas as reservas.')
+@click.option('--sqlite-perfil', type=click.Choice(configuracao_banco.PERFIS))
+@click.option('--banco', help='URI de um banco descartável (padrão: SQLite temporário).')
+@click.option('--saida', type=click.Path(dir_okay=False), help='Grava o relatório JSON neste arquivo.')
+def teste_carga_comando(workers, threads, clientes, segundos, servidor, mix, locacoes, carros_disputados,
+                        sqlite_perfil, banco, saida):
+    """Tráfego misto de muitos atendentes contra workers locais do app (offline)."""
+    pesos = dict(carga.MIX_PADRAO)
+    for item in filter(None, (mix or '').split(',')):
+        rota, _, peso = item.partition('=')
+        if rota.strip() not in pesos or not peso.strip().isdigit():
+            raise click.BadParameter(f"use rota=peso com rotas de {', '.join(pesos)}", param_hint='--mix')
+        pesos[rota.strip()] = int(peso)
+
+    print(f"⏳ Subindo {workers} worker(s) e {clientes} atendente(s) por {segundos:g}s...")
+    try:
+        relatorio = carga.executar(
+            workers, threads, clientes, segundos, servidor, pesos, locacoes=locacoes,
+            carros_disputados=carros_disputados, banco=banco, sqlite_perfil=sqlite_perfil
+        )
+    except (ValueError, RuntimeError) as erro:
+        raise click.ClickException(str(erro))
+
+    print(
+        f"{'✅' if not relatorio['erros'] else '⚠️'} {relatorio['servidor']} • {relatorio['workers']} worker(s) × "
+        f"{relatorio['threads']} thread(s) • SQLite {relatorio['sqlite_perfil']} • "
+        f"{relatorio['requisicoes_por_segundo']:,} req/s • erros {relatorio['taxa_erros'] or 0:.2%}"
+    )
+    for rota, dados in relatorio['rotas'].items():
+        if not dados['requisicoes']:
+            continue
+        print(
+            f"   {rota:<20} {dados['por_segundo']:>8.1f} req/s • p50 {dados['p50_ms']:>9.1f} • "
+            f"p95 {dados['p95_ms']:>9.1f} • p99 {dados['p99_ms']:>9.1f} ms • erros {dados['taxa_erros']:.2%}"
+        )
+    print(
+        f"   reservas: {relatorio['reservas']['criadas']:,} criadas, {relatorio['reservas']['recusadas']:,} "
+        f"recusadas ({relatorio['reservas_banco_ocupado']:,} por banco ocupado) • "
+        f"travas do SQLite no log: {relatorio['travas_sqlite']:,}"
+    )
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        print(f"💾 Relatório gravado em {saida}")
+    if relatorio['sobreposicoes']:
+        raise click.ClickException(f"{relatorio['sobreposicoes']} reserva(s) sobreposta(s) nos carros disputados!")
 
 
 # ============================================================================
 # INICIALIZAÇÃO
 # ============================================================================
 
-def init_db():
+@app.route('/healthz')
+def healthz():
+    """Endpoint de prontidão: 200 quando o bootstrap terminou, 503 caso contrário."""
+    estado = inicializacao.estado
+    return jsonify(estado.to_dict()), 200 if estado.pronto else 503
+
+
+@app.route('/metrics')
+def metricas_prometheus():
+    """Métricas de todos os workers no formato texto do Prometheus."""
+    return Response(metricas.texto(), mimetype='text/plain; version=0.0.4')
+
+
+@app.cli.command('init-db')
+@click.option('--seed/--no-seed', default=True, help='Popula a frota de exemplo se o banco estiver vazio.')
+def init_db_comando(seed):
+    """Cria as tabelas (e opcionalmente a frota de exemplo) uma vez por deploy."""
+    estado = init_db(semear=seed, forcar=True)
+    if not estado.pronto:
+        raise click.ClickException(f"Inicialização falhou: {estado.erro}")
+    print(f"✅ Banco inicializado ({', '.join(estado.etapas)}).")
+
+
+def init_db(semear=True, forcar=False):
     """Cria as tabelas e popula o banco na primeira execução."""
-    with app.app_context():
-        db.create_all()
-        seed_database()
+    return inicializacao.inicializar(
+        app, criar_schema=True, semear=semear, seed=seed_database, forcar=forcar
+    )
+
+
+# Bootstrap uma vez por processo (desative com BOOTSTRAP_AUTOMATICO=False quando
+# o deploy já executa `flask --app app init-db`)
+if os.getenv('BOOTSTRAP_AUTOMATICO', 'True') == 'True':
+    init_db(semear=os.getenv('SEED_DATABASE', 'True') == 'True')
+
+# Encerramento automático de locações vencidas numa thread de cada worker
+# (0 = desligado; alternativa: `flask --app app encerrar-vencidas` no cron).
+# Iniciado na primeira requisição, e não na importação, para não rodar em
+# comandos da CLI nem se perder no fork do `gunicorn --preload`
+ENCERRAMENTO_AUTOMATICO_MINUTOS = int(os.getenv('ENCERRAMENTO_AUTOMATICO_MINUTOS', '0'))
+if ENCERRAMENTO_AUTOMATICO_MINUTOS > 0:
+    @app.before_request
+    def iniciar_encerramento_automatico():
+        encerramento.agendador.iniciar(
+            app, ENCERRAMENTO_AUTOMATICO_MINUTOS,
+            int(os.getenv('ENCERRAMENTO_TOLERANCIA_DIAS', str(encerramento.TOLERANCIA_DIAS)))
+        )
 
 
 if __name__ == '__main__':
-    # Garantir que as tabelas existam
-    init_db()
-    
     # Configurações do servidor a partir de variáveis de ambiente
     debug_mode = os.getenv('FLASK_DEBUG', 'True') == 'True'
     host = os.getenv('FLASK_HOST', '0.0.0.0')
@@ -0,0 +1,274 @@
+"""
+Arquivamento de locações encerradas antigas (camada fria do histórico).
+
+Locações finalizadas ou canceladas com devolução anterior ao horizonte
+(padrão: 365 dias) saem de `locacoes` e vão para `locacoes_arquivo`, com os
+mesmos ids e colunas, em lotes de LOCACOES_POR_LOTE (INSERT ... SELECT e
+DELETE na mesma transação). A tabela principal fica só com as ativas e as
+encerradas recentes, que são o que disponibilidade, dashboard, status da
+frota e encerramento automático consultam.
+
+Quem precisa do histórico completo lê as duas tabelas: histórico paginado e
+totais (historico.py), exportações SQL/CSV/JSON/incremental/colunar,
+reconstrução do resumo mensal, importação e deduplicação de clientes. O resumo
+mensal não muda ao arquivar: as locações continuam contadas nele.
+
+Uso:
+    flask --app app arquivar-locacoes --simular
+    flask --app app arquivar-locacoes --horizonte 365     # cron, ex.: semanal
+    flask --app app benchmark-arquivamento --locacoes 2000000
+"""
+
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, delete, func, insert, literal, select, text
+from sqlalchemy.exc import DBAPIError
+from models import db, Carro, Cliente, Locacao, LocacaoArquivada
+from migracoes import atualizar_estatisticas
+
+
+HORIZONTE_DIAS = 365
+LOCACOES_POR_LOTE = 10000
+STATUS_ENCERRADOS = ('finalizada', 'cancelada')
+
+
+def _arquivaveis(limite):
+    """Predicado das locações que podem ir para o arquivo."""
+    locacoes = Locacao.__table__
+    return (
+        locacoes.c.status.in_(STATUS_ENCERRADOS),
+        locacoes.c.data_devolucao < limite,
+        # A locação de maior id fica na tabela principal: o SQLite (sem
+        # AUTOINCREMENT) reaproveitaria o id dela para a próxima locação
+        locacoes.c.id < select(func.max(locacoes.c.id)).scalar_subquery(),
+    )
+
+
+def _mover_lote(conexao, ids, agora):
+    """Copia as locações para o arquivo e as remove da tabela principal."""
+    locacoes, arquivo = Locacao.__table__, LocacaoArquivada.__table__
+    colunas = [coluna.name for coluna in locacoes.columns]
+    origem = select(*locacoes.columns, literal(agora, db.DateTime).label('arquivada_em')) \
+        .where(locacoes.c.id.in_(ids))
+    conexao.execute(insert(arquivo).from_select([*colunas, 'arquivada_em'], origem))
+    conexao.execute(delete(locacoes).where(locacoes.c.id.in_(ids)))
+
+
+def arquivar(horizonte_dias=HORIZONTE_DIAS, tamanho_lote=LOCACOES_POR_LOTE, data_referencia=None,
+             simular=False, engine=None):
+    """
+    Move as locações encerradas com devolução anterior ao horizonte para o arquivo.
+
+    Cada lote é uma transação; interromper no meio deixa os lotes já movidos
+    no arquivo e o restante na tabela principal, e basta executar de novo.
+
+    Args:
+        horizonte_dias: Locações devolvidas há mais dias que isso são arquivadas
+        tamanho_lote: Locações movidas por transação
+        data_referencia: Data considerada como hoje (padrão: hoje)
+        simular: Apenas conta as locações arquiváveis, sem mover
+        engine: Engine do banco (padrão: o do app)
+
+    Returns:
+        dict: Data limite, locações arquivadas, lotes, segundos e linhas/s
+    """
+    engine = engine or db.engine
+    inicio = time.perf_counter()
+    limite = (data_referencia or date.today()) - timedelta(days=horizonte_dias)
+    relatorio = {'data_limite': limite, 'arquivadas': 0, 'lotes': 0}
+
+    if simular:
+        with engine.connect() as conexao:
+            relatorio['arquivadas'] = conexao.execute(
+                select(func.count()).select_from(Locacao.__table__).where(*_arquivaveis(limite))
+            ).scalar()
+    else:
+        agora = datetime.utcnow()
+        consulta_ids = (
+            select(Locacao.__table__.c.id).where(*_arquivaveis(limite))
+            .order_by(Locacao.__table__.c.id).limit(tamanho_lote)
+        )
+        while True:
+            with engine.begin() as conexao:
+                ids = conexao.execute(consulta_ids).scalars().all()
+                if ids:
+                    _mover_lote(conexao, ids, agora)
+            if not ids:
+                break
+            relatorio['arquivadas'] += len(ids)
+            relatorio['lotes'] += 1
+        if relatorio['lotes']:
+            with engine.begin() as conexao:
+                atualizar_estatisticas(conexao)
+
+    segundos = time.perf_counter() - inicio
+    relatorio['segundos'] = round(segundos, 3)
+    relatorio['linhas_por_segundo'] = round(relatorio['arquivadas'] / segundos) if segundos > 0 else None
+    return relatorio
+
+
+def contagens(engine=None):
+    """Linhas na tabela principal (total e ativas) e no arquivo."""
+    engine = engine or db.engine
+    locacoes, arquivo = Locacao.__table__, LocacaoArquivada.__table__
+    with engine.connect() as conexao:
+        return {
+            'locacoes': conexao.execute(select(func.count()).select_from(locacoes)).scalar(),
+            'ativas': conexao.execute(
+                select(func.count()).select_from(locacoes).where(locacoes.c.status == 'ativa')
+            ).scalar(),
+            'arquivo': conexao.execute(select(func.count()).select_from(arquivo)).scalar(),
+        }
+
+
+def tamanhos_mb(engine=None):
+    """
+    MB ocupados (dados + índices) pela tabela principal e pelo arquivo.
+
+    Returns:
+        dict ou None: {'locacoes': MB, 'arquivo': MB}; None se o banco não informar
+    """
+    engine = engine or db.engine
+    with engine.connect() as conexao:
+        try:
+            if conexao.dialect.name == 'sqlite':
+                # dbstat: páginas de cada tabela e índice (extensão presente na maioria das builds)
+                bytes_por_tabela = dict(conexao.execute(text(
+                    "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+                    "WHERE m.tbl_name IN ('locacoes', 'locacoes_arquivo') GROUP BY m.tbl_name"
+                )).all())
+            elif conexao.dialect.name == 'postgresql':
+                bytes_por_tabela = {
+                    nome: conexao.execute(text(f"SELECT pg_total_relation_size('{nome}')")).scalar()
+                    for nome in ('locacoes', 'locacoes_arquivo')
+                }
+            else:
+                return None
+        except DBAPIError:
+            return None
+    return {
+        'locacoes': round((bytes_por_tabela.get('locacoes') or 0) / 2 ** 20, 1),
+        'arquivo': round((bytes_por_tabela.get('locacoes_arquivo') or 0) / 2 ** 20, 1),
+    }
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def _popular(engine, locacoes, carros, clientes, anos, lote=50000):
+    """Histórico sintético: encerradas ao longo de `anos`, ativas só nas últimas semanas."""
+    hoje = date.today()
+    aleatorio = random.Random(0)
+    with engine.begin() as conexao:
+        conexao.execute(insert(Carro.__table__), [
+            {'modelo': 'Benchmark', 'placa': f'ARQ-{numero:05d}', 'cor': 'Branco',
+             'categoria': ('Econômico', 'Conforto', 'Premium')[numero % 3], 'valor_diaria': 100.0 + numero % 50}
+            for numero in range(carros)
+        ])
+        conexao.execute(insert(Cliente.__table__), [
+            {'nome': f'Cliente {numero}', 'nome_normalizado': f'cliente {numero}', 'whatsapp': ''}
+            for numero in range(clientes)
+        ])
+
+    dias_historico = 365 * anos
+    for inicio in range(0, locacoes, lote):
+        linhas = []
+        for _ in range(min(lote, locacoes - inicio)):
+            retirada = hoje - timedelta(days=aleatorio.randrange(-30, dias_historico))
+            devolucao = retirada + timedelta(days=aleatorio.randrange(1, 8))
+            if devolucao >= hoje - timedelta(days=7):
+                status = 'ativa'
+            else:
+                status = 'cancelada' if aleatorio.random() < 0.1 else 'finalizada'
+            linhas.append({
+                'carro_id': aleatorio.randrange(1, carros + 1), 'cliente_id': aleatorio.randrange(1, clientes + 1),
+                'data_retirada': retirada, 'data_devolucao': devolucao, 'valor_total': 300.0, 'status': status,
+                'created_at': datetime.combine(retirada, datetime.min.time()),
+                'updated_at': datetime.combine(min(devolucao, hoje), datetime.min.time()),
+            })
+        with engine.begin() as conexao:
+            conexao.execute(insert(Locacao.__table__), linhas)
+
+
+def _consultas_benchmark(hoje):
+    """Consultas dos caminhos quentes (as monitoradas por verificar-indices) e a carga do índice."""
+    from migracoes import consultas_monitoradas
+
+    consultas = [
+        (nome, statement) for nome, statement, _ in consultas_monitoradas(hoje)
+        if nome not in ('gastos_periodo', 'cliente_por_chave', 'historico_arquivo')
+    ]
+    consultas.append(('indice_disponibilidade', (
+        select(Locacao.id, Locacao.carro_id, Locacao.data_retirada, Locacao.data_devolucao)
+        .where(Locacao.status == 'ativa')
+        .order_by(Locacao.carro_id, Locacao.data_retirada)
+    )))
+    consultas.append(('contagem_ativas', select(func.count()).where(Locacao.status == 'ativa')))
+    return consultas
+
+
+def _medir(engine, consultas, repeticoes):
+    """Mediana (ms) de cada consulta, lida até o fim, depois de uma execução de aquecimento."""
+    tempos = {}
+    with engine.connect() as conexao:
+        atualizar_estatisticas(conexao)
+        for nome, statement in consultas:
+            conexao.execute(statement).all()
+            amostras = []
+            for _ in range(repeticoes):
+                comeco = time.perf_counter()
+                conexao.execute(statement).all()
+                amostras.append((time.perf_counter() - comeco) * 1000)
+            tempos[nome] = round(statistics.median(amostras), 3)
+    return tempos
+
+
+def benchmark(locacoes=2_000_000, carros=2000, clientes=50000, anos=5, horizonte_dias=HORIZONTE_DIAS,
+              repeticoes=20, banco=None):
+    """
+    Tempos das consultas quentes num histórico grande, antes e depois de arquivar.
+
+    Usa um banco SQLite temporário (ou a URI de um banco descartável em
+    `banco`), populado com `locacoes` locações distribuídas em `anos` anos.
+
+    Returns:
+        dict: Contagens e tamanhos antes/depois, relatório do arquivamento e,
+              por consulta, a mediana em ms antes e depois
+    """
+    pasta = tempfile.mkdtemp(prefix='locamil-arquivo-')
+    engine = create_engine(banco or f"sqlite:///{os.path.join(pasta, 'arquivo.db')}")
+    try:
+        db.metadata.create_all(engine)
+
+        comeco = time.perf_counter()
+        _popular(engine, locacoes, carros, clientes, anos)
+        segundos_carga = round(time.perf_counter() - comeco, 1)
+
+        consultas = _consultas_benchmark(date.today())
+        contagens_antes, tamanhos_antes = contagens(engine), tamanhos_mb(engine)
+        antes = _medir(engine, consultas, repeticoes)
+        relatorio = arquivar(horizonte_dias, engine=engine)
+        contagens_depois, tamanhos_depois = contagens(engine), tamanhos_mb(engine)
+        depois = _medir(engine, consultas, repeticoes)
+    finally:
+        # O banco sintético tem centenas de MB: não fica para trás
+        engine.dispose()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    return {
+        'banco': str(engine.url),
+        'segundos_carga': segundos_carga,
+        'antes': {**contagens_antes, 'tamanho_mb': tamanhos_antes},
+        'depois': {**contagens_depois, 'tamanho_mb': tamanhos_depois},
+        'arquivamento': relatorio,
+        'consultas': [
+            {'consulta': nome, 'antes_ms': antes[nome], 'depois_ms': depois[nome]}
+            for nome, _ in consultas
+        ],
+    }
@@ -0,0 +1,250 @@
+"""
+Benchmark das rotas principais pelo test client do Flask.
+
+Mede, no banco configurado, o tempo de cada rota do começo da requisição até
+o último byte do corpo (as exportações são enviadas em streaming), a
+quantidade de consultas SQL e o tamanho da resposta. O resultado é um
+relatório JSON com o commit, o volume de dados e, por rota, p50/p95/mín/máx;
+dois relatórios (por exemplo, antes e depois de uma mudança, no mesmo banco
+gerado por `gerar-dados`) são comparados com `--comparar`.
+
+As locações criadas ao medir o POST de `/nova_locacao` (cliente
+CLIENTE_BENCHMARK, datas dez anos à frente) são removidas ao final pela
+sessão, para que resumo mensal e índice de disponibilidade continuem certos.
+
+Uso:
+    flask --app app benchmark-rotas --saida antes.json
+    flask --app app benchmark-rotas --saida depois.json --comparar antes.json
+"""
+
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select
+from models import db, Carro, Cliente, Locacao, LocacaoArquivada, Gasto
+from orcamento_consultas import ContadorConsultas
+import exportacao_colunar
+
+
+VERSAO_RELATORIO = 1
+CLIENTE_BENCHMARK = 'Benchmark Rotas'
+TOLERANCIA_REGRESSAO = 0.20  # p50 até 20% mais lento não é regressão (ruído)
+
+
+def _percentil(amostras, fracao):
+    """Percentil pelo método do posto mais próximo."""
+    ordenadas = sorted(amostras)
+    return ordenadas[max(0, math.ceil(fracao * len(ordenadas)) - 1)]
+
+
+def _commit_atual():
+    """Commit do código medido (com '-sujo' se houver alterações), ou None fora do git."""
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=pasta, capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+        alterado = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=pasta, capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return f"{commit}-sujo" if commit and alterado else commit or None
+
+
+def volume_dados():
+    """Linhas de cada tabela medida (para comparar só relatórios do mesmo volume)."""
+    modelos = {
+        'carros': Carro, 'clientes': Cliente, 'locacoes': Locacao,
+        'locacoes_arquivo': LocacaoArquivada, 'gastos': Gasto,
+    }
+    return {
+        nome: db.session.execute(select(func.count()).select_from(modelo)).scalar()
+        for nome, modelo in modelos.items()
+    }
+
+
+def _requisicoes(carro_id, hoje, cache):
+    """
+    Rotas medidas: (nome, método, url, argumentos(i) -> kwargs do test client, antes de cada amostra).
+
+    As exportações têm nome iniciado por 'exportar' e usam menos repetições.
+    """
+    semana = hoje + timedelta(days=7)
+    periodo = {'data_retirada': hoje.isoformat(), 'data_devolucao': semana.isoformat()}
+    sem_argumentos = lambda indice: {}
+
+    def reserva(indice):
+        # Períodos distantes e sem sobreposição: toda reserva é aceita
+        retirada = hoje + timedelta(days=3650 + 3 * indice)
+        return {'data': {
+            'nome_cliente': CLIENTE_BENCHMARK, 'whatsapp': '', 'carro_id': carro_id,
+            'data_retirada': retirada.isoformat(), 'data_devolucao': (retirada + timedelta(days=1)).isoformat(),
+        }}
+
+    requisicoes = [
+        ('index', 'GET', '/', sem_argumentos, cache.limpar),
+        ('index_cache', 'GET', '/', sem_argumentos, None),
+        ('historico', 'GET', '/historico', sem_argumentos, None),
+        ('historico_finalizadas', 'GET', '/historico?status=finalizada&por_pagina=200', sem_argumentos, None),
+        ('nova_locacao_form', 'GET', '/nova_locacao', sem_argumentos, None),
+        ('nova_locacao', 'POST', '/nova_locacao', reserva, None),
+        ('calcular_valor', 'POST', '/calcular_valor', lambda indice: {'json': {'carro_id': carro_id, **periodo}}, None),
+        ('cotacoes', 'POST', '/cotacoes', lambda indice: {'json': periodo}, None),
+        ('carros_disponiveis', 'GET',
+         f"/carros_disponiveis?data_retirada={hoje}&data_devolucao={semana}", sem_argumentos, None),
+        ('exportar_sql', 'GET', '/exportar/sql', sem_argumentos, None),
+        ('exportar_sql_copy', 'GET', '/exportar/sql?formato=copy', sem_argumentos, None),
+        ('exportar_csv', 'GET', '/exportar/csv', sem_argumentos, None),
+        ('exportar_json', 'GET', '/exportar/json', sem_argumentos, None),
+        ('exportar_alteracoes', 'GET',
+         f"/exportar/alteracoes?desde={datetime.utcnow() - timedelta(days=1):%Y-%m-%dT%H:%M:%S}",
+         sem_argumentos, None),
+    ]
+    if exportacao_colunar.disponivel():
+        requisicoes += [
+            ('exportar_colunar_locacoes', 'GET', '/exportar/colunar/locacoes', sem_argumentos, None),
+            ('exportar_colunar_gastos', 'GET', '/exportar/colunar/gastos?formato=arrow', sem_argumentos, None),
+        ]
+    return requisicoes
+
+
+def _medir(app, metodo, url, argumentos, repeticoes, antes):
+    """Executa a rota `repeticoes` vezes (mais uma de aquecimento) e resume as amostras."""
+    cliente = app.test_client()
+    tempos, consultas, status = [], [], {}
+    tamanho = 0
+    for indice in range(repeticoes + 1):
+        if antes:
+            antes()
+        with ContadorConsultas() as contador:
+            comeco = time.perf_counter()
+            resposta = cliente.open(url, method=metodo, **argumentos(indice))
+            # Exportações são enviadas em streaming: o tempo vai até o último byte
+            tamanho = len(resposta.get_data())
+            decorrido = (time.perf_counter() - comeco) * 1000
+        resposta.close()
+        if indice == 0:
+            continue
+        tempos.append(decorrido)
+        consultas.append(contador.total)
+        status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+
+    return {
+        'metodo': metodo,
+        'url': url,
+        'amostras': len(tempos),
+        'status': {str(codigo): quantidade for codigo, quantidade in sorted(status.items())},
+        'erros': sum(quantidade for codigo, quantidade in status.items() if codigo >= 400),
+        'p50_ms': round(statistics.median(tempos), 3),
+        'p95_ms': round(_percentil(tempos, 0.95), 3),
+        'min_ms': round(min(tempos), 3),
+        'max_ms': round(max(tempos), 3),
+        'media_ms': round(statistics.fmean(tempos), 3),
+        'consultas_sql': max(consultas),
+        'bytes': tamanho,
+    }
+
+
+def _remover_reservas_benchmark():
+    """Remove as locações e o cliente criados pelo POST medido; retorna quantas locações havia."""
+    removidas = 0
+    for cliente in Cliente.query.filter_by(nome=CLIENTE_BENCHMARK).all():
+        for locacao in Locacao.query.filter_by(cliente_id=cliente.id).all():
+            db.session.delete(locacao)
+            removidas += 1
+        db.session.delete(cliente)
+    db.session.commit()
+    return removidas
+
+
+def executar(app, cache, repeticoes=10, repeticoes_exportacao=3, rotas=None, progresso=None):
+    """
+    Mede as rotas principais e monta o relatório.
+
+    Args:
+        app: Aplicação Flask
+        cache: Cache do dashboard (limpo antes de cada amostra de 'index')
+        repeticoes: Amostras por rota (exceto exportações)
+        repeticoes_exportacao: Amostras por exportação (percorrem o banco inteiro)
+        rotas: Nomes das rotas a medir (padrão: todas)
+        progresso: Função chamada com (nome, resultado) após cada rota
+
+    Returns:
+        dict: Relatório (versão, data, commit, ambiente, volume e resultado por rota)
+
+    Raises:
+        ValueError: Se não houver carro ativo para as rotas de reserva
+    """
+    hoje = date.today()
+    with app.app_context():
+        carro_id = db.session.execute(
+            select(Carro.id).where(Carro.ativo.is_(True), Carro.em_manutencao.is_(False))
+            .order_by(Carro.id).limit(1)
+        ).scalar()
+        if carro_id is None:
+            raise ValueError('Nenhum carro ativo no banco: popule-o com `gerar-dados`.')
+        relatorio = {
+            'versao': VERSAO_RELATORIO,
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit_atual(),
+            'banco': db.engine.url.render_as_string(hide_password=True),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'repeticoes': repeticoes,
+            'repeticoes_exportacao': repeticoes_exportacao,
+            'volume': volume_dados(),
+            'rotas': {},
+        }
+        _remover_reservas_benchmark()
+
+    try:
+        for nome, metodo, url, argumentos, antes in _requisicoes(carro_id, hoje, cache):
+            if rotas and nome not in rotas:
+                continue
+            amostras = repeticoes_exportacao if nome.startswith('exportar') else repeticoes
+            resultado = _medir(app, metodo, url, argumentos, amostras, antes)
+            if nome == 'nova_locacao':
+                with app.app_context():
+                    criadas = Locacao.query.join(Cliente).filter(Cliente.nome == CLIENTE_BENCHMARK).count()
+                # Redirecionamento sem locação criada (carro ocupado, banco travado) também é erro
+                resultado['erros'] = max(resultado['erros'], amostras + 1 - criadas)
+            relatorio['rotas'][nome] = resultado
+            if progresso:
+                progresso(nome, resultado)
+    finally:
+        with app.app_context():
+            _remover_reservas_benchmark()
+
+    return relatorio
+
+
+def comparar(atual, anterior, tolerancia=TOLERANCIA_REGRESSAO):
+    """
+    Compara dois relatórios rota a rota.
+
+    Returns:
+        list: [{'rota', 'p50_antes', 'p50_depois', 'variacao', 'consultas_antes',
+                'consultas_depois', 'regressao'}, ...] das rotas presentes nos dois
+    """
+    comparacao = []
+    for nome, depois in atual['rotas'].items():
+        antes = anterior.get('rotas', {}).get(nome)
+        if antes is None:
+            continue
+        variacao = (depois['p50_ms'] - antes['p50_ms']) / antes['p50_ms'] if antes['p50_ms'] else 0.0
+        comparacao.append({
+            'rota': nome,
+            'p50_antes': antes['p50_ms'],
+            'p50_depois': depois['p50_ms'],
+            'variacao': round(variacao, 4),
+            'consultas_antes': antes['consultas_sql'],
+            'consultas_depois': depois['consultas_sql'],
+            'regressao': variacao > tolerancia or depois['consultas_sql'] > antes['consultas_sql'],
+        })
+    return comparacao
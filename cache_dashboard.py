@@ -0,0 +1,173 @@
+"""
+Cache do contexto calculado do dashboard com invalidação por versão dos dados.
+
+Toda transação que grava em Carro, Locacao, Gasto ou RegraPreco incrementa um
+contador de versão guardado num pequeno arquivo SQLite compartilhado. Cada
+worker do gunicorn mantém sua própria cópia do cache, mas compara a versão
+gravada com a versão atual a cada leitura, então uma escrita em um worker
+invalida o cache de todos os outros imediatamente. O TTL serve de rede de segurança para escritas
+feitas fora da aplicação.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Carro, Locacao, Gasto, RegraPreco
+
+
+_MODELOS_MONITORADOS = (Carro, Locacao, Gasto, RegraPreco)
+_CHAVE_ALTERADO = 'versao_dados_alterado'
+
+
+class VersaoDados:
+    """Contador de versão dos dados compartilhado entre processos."""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._observadores = []
+
+    def configurar(self, caminho):
+        """Define o arquivo SQLite que guarda a versão."""
+        self.caminho = caminho
+        self._local = threading.local()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is not None and self._local.pid != os.getpid():
+            # Herdada do processo pai (gunicorn --preload): o SQLite não pode usar
+            # uma conexão depois do fork. Fica aberta para não soltar as travas do pai
+            conexao = None
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=5.0, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS versao_dados '
+                '(id INTEGER PRIMARY KEY CHECK (id = 1), versao INTEGER NOT NULL)'
+            )
+            conexao.execute('INSERT OR IGNORE INTO versao_dados (id, versao) VALUES (1, 0)')
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def atual(self):
+        """Retorna a versão corrente (0 se não configurado)."""
+        if not self.caminho:
+            return 0
+        return self._conexao().execute('SELECT versao FROM versao_dados WHERE id = 1').fetchone()[0]
+
+    def incrementar(self):
+        """
+        Incrementa a versão; deve ser chamado após cada escrita confirmada.
+
+        Returns:
+            int: Nova versão (None se não configurado)
+        """
+        if not self.caminho:
+            return None
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.execute('UPDATE versao_dados SET versao = versao + 1 WHERE id = 1')
+            nova = conexao.execute('SELECT versao FROM versao_dados WHERE id = 1').fetchone()[0]
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+
+        for observador in self._observadores:
+            observador(nova - 1, nova)
+        return nova
+
+    def ao_incrementar(self, observador):
+        """Registra `observador(anterior, nova)`, chamado a cada incremento deste processo."""
+        self._observadores.append(observador)
+
+
+versao_dados = VersaoDados()
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_alteracao(session, flush_context):
+    """Marca a sessão quando o flush grava algum modelo monitorado."""
+    if session.info.get(_CHAVE_ALTERADO):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _MODELOS_MONITORADOS):
+            session.info[_CHAVE_ALTERADO] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _incrementar_apos_commit(session):
+    if session.info.pop(_CHAVE_ALTERADO, False):
+        versao_dados.incrementar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracao(session):
+    session.info.pop(_CHAVE_ALTERADO, None)
+
+
+class CacheContexto:
+    """
+    Cache em memória (por processo) de contextos calculados.
+
+    Cada entrada guarda a versão dos dados usada no cálculo e expira quando a
+    versão muda ou o TTL passa. Os valores devem ser dados simples (dicts,
+    listas, datas), nunca objetos ORM presos a uma sessão.
+    """
+
+    def __init__(self, ttl=60, versao=None, max_entradas=32):
+        self.ttl = ttl
+        self.versao = versao or versao_dados
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, construir):
+        """
+        Retorna o valor em cache para a chave ou o constrói com `construir()`.
+
+        Args:
+            chave: Chave do cache (ex.: data de referência em ISO)
+            construir: Função sem argumentos que calcula o valor
+        """
+        versao_atual = self.versao.atual()
+        agora = time.monotonic()
+
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                versao, expira_em, valor = entrada
+                if versao == versao_atual and agora < expira_em:
+                    self.acertos += 1
+                    return valor
+            self.falhas += 1
+
+        valor = construir()
+
+        with self._lock:
+            if len(self._entradas) >= self.max_entradas and chave not in self._entradas:
+                # Descartar a entrada que expira primeiro
+                mais_antiga = min(self._entradas, key=lambda c: self._entradas[c][1])
+                del self._entradas[mais_antiga]
+            self._entradas[chave] = (versao_atual, agora + self.ttl, valor)
+
+        return valor
+
+    def limpar(self):
+        """Remove todas as entradas deste processo."""
+        with self._lock:
+            self._entradas.clear()
+
+
+def caminho_padrao(instance_path):
+    """Caminho padrão do arquivo de versão dentro da pasta instance do Flask."""
+    os.makedirs(instance_path, exist_ok=True)
+    return os.path.join(instance_path, 'versao_dados.db')
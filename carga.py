@@ -0,0 +1,408 @@
+"""
+Teste de carga offline: o app servido por vários workers e muitos atendentes simultâneos.
+
+Sobe o app em processos servidores locais contra um banco descartável (SQLite
+temporário populado por `dados_sinteticos`, ou a URI de um banco de testes) e
+dispara, de vários processos clientes, um tráfego misto sorteado por MIX_PADRAO:
+dashboard, histórico, busca de carros livres, cotação, reservas disputadas nos
+mesmos poucos carros, finalizações, cancelamentos e exportações.
+
+Servidores:
+    gunicorn    `gunicorn --workers N --threads T app:app` (se instalado)
+    werkzeug    N processos com o servidor do werkzeug, cada um na sua porta,
+                chamados em rodízio como um balanceador faria (threads > 1 =
+                uma thread por requisição)
+
+O relatório traz requisições por segundo, p50/p95/p99 e taxa de erros por
+rota, as travas do SQLite ("database is locked") e reservas desistidas por
+banco ocupado contadas no log dos servidores, e as sobreposições de reservas
+encontradas ao final (deve ser zero). Nada sai da máquina.
+
+Uso:
+    flask --app app teste-carga --workers 4 --clientes 32 --segundos 30
+    flask --app app teste-carga --workers 4 --sqlite-perfil producao --saida carga.json
+"""
+
+import http.client
+import importlib.util
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+
+# rota: peso no sorteio
+MIX_PADRAO = {
+    'dashboard': 30,
+    'historico': 12,
+    'carros_disponiveis': 10,
+    'calcular_valor': 10,
+    'nova_locacao_form': 5,
+    'reserva': 18,
+    'finalizar': 6,
+    'cancelar': 3,
+    'exportar_csv': 3,
+    'exportar_json': 2,
+    'exportar_sql': 1,
+}
+SERVIDORES = ('gunicorn', 'werkzeug')
+CLIENTE_CARGA = 'Teste de Carga'
+
+# Sinais de contenção no log dos servidores
+_TRAVA_SQLITE = re.compile(r'database is locked|database table is locked')
+_BANCO_OCUPADO = re.compile(r'Reserva não concluída: banco ocupado')
+
+
+def gunicorn_disponivel():
+    return importlib.util.find_spec('gunicorn') is not None
+
+
+def _porta_livre():
+    with socket.socket() as soquete:
+        soquete.bind(('127.0.0.1', 0))
+        return soquete.getsockname()[1]
+
+
+# ============================================================================
+# PREPARO E SERVIDORES
+# ============================================================================
+
+def _inicializar_processo():
+    """Inicializador do processo de preparo: importa o app e abre o contexto."""
+    from app import app
+    app.app_context().push()
+
+
+def _preparar(carros, clientes, locacoes, carros_disputados):
+    """
+    Popula o banco (se vazio) e escolhe os carros disputados e as locações a encerrar.
+
+    Returns:
+        (list, list): ids dos carros disputados, ids de locações ativas
+    """
+    from sqlalchemy import select
+    from models import db, Carro, Locacao
+    import dados_sinteticos
+
+    if db.session.execute(select(Carro.id).limit(1)).first() is None:
+        dados_sinteticos.gerar(carros, clientes, locacoes, gastos=locacoes // 10, anos=2)
+    disputados = db.session.execute(
+        select(Carro.id).where(Carro.ativo.is_(True), Carro.em_manutencao.is_(False))
+        .order_by(Carro.id).limit(carros_disputados)
+    ).scalars().all()
+    ativas = db.session.execute(
+        select(Locacao.id).where(Locacao.status == 'ativa').order_by(Locacao.id)
+    ).scalars().all()
+    db.session.commit()
+    return disputados, ativas
+
+
+def _servidor_werkzeug(porta, threads, caminho_log):
+    """Um worker: servidor do werkzeug numa porta, com stderr no log compartilhado."""
+    import logging
+    from werkzeug.serving import make_server
+
+    log = open(caminho_log, 'a', buffering=1)
+    os.dup2(log.fileno(), 2)
+    sys.stderr = log
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # sem linha de acesso por requisição
+
+    from app import app
+    make_server('127.0.0.1', porta, app, threaded=threads > 1).serve_forever()
+
+
+def _iniciar_servidores(servidor, workers, threads, caminho_log):
+    """
+    Sobe os workers do app.
+
+    Returns:
+        (list, list): processos/subprocessos, portas que recebem requisições
+    """
+    if servidor == 'gunicorn':
+        porta = _porta_livre()
+        log = open(caminho_log, 'a')
+        processo = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+             '--bind', f'127.0.0.1:{porta}', '--timeout', '120', '--error-logfile', '-',
+             '--chdir', os.path.dirname(os.path.abspath(__file__)), 'app:app'],
+            stdout=log, stderr=subprocess.STDOUT
+        )
+        log.close()
+        return [processo], [porta]
+
+    contexto = multiprocessing.get_context('spawn')
+    processos, portas = [], []
+    for _ in range(workers):
+        porta = _porta_livre()
+        processo = contexto.Process(target=_servidor_werkzeug, args=(porta, threads, caminho_log), daemon=True)
+        processo.start()
+        processos.append(processo)
+        portas.append(porta)
+    return processos, portas
+
+
+def _aguardar_prontos(portas, processos, limite_segundos=120):
+    """Espera cada porta responder 200 em /healthz."""
+    prazo = time.time() + limite_segundos
+    pendentes = set(portas)
+    while pendentes:
+        if time.time() > prazo:
+            raise RuntimeError(f"Servidores não ficaram prontos em {limite_segundos}s (portas {sorted(pendentes)}).")
+        if any(not _vivo(processo) for processo in processos):
+            raise RuntimeError('Um processo servidor terminou durante a subida; veja o log.')
+        for porta in list(pendentes):
+            try:
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=5)
+                conexao.request('GET', '/healthz')
+                if conexao.getresponse().status == 200:
+                    pendentes.discard(porta)
+                conexao.close()
+            except OSError:
+                pass
+        time.sleep(0.2)
+
+
+def _vivo(processo):
+    return processo.poll() is None if isinstance(processo, subprocess.Popen) else processo.is_alive()
+
+
+def _parar_servidores(processos):
+    for processo in processos:
+        processo.terminate()
+    for processo in processos:
+        if isinstance(processo, subprocess.Popen):
+            try:
+                processo.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+        else:
+            processo.join(timeout=30)
+            if processo.is_alive():
+                processo.kill()
+
+
+# ============================================================================
+# CLIENTES
+# ============================================================================
+
+def _requisicao(rota, aleatorio, hoje, disputados, a_encerrar, todas_ativas):
+    """Monta (método, url, corpo, cabeçalhos) de uma requisição da rota sorteada."""
+    retirada = hoje + timedelta(days=aleatorio.randrange(30))
+    devolucao = retirada + timedelta(days=aleatorio.randrange(1, 5))
+    periodo = {'data_retirada': retirada.isoformat(), 'data_devolucao': devolucao.isoformat()}
+
+    if rota == 'dashboard':
+        return 'GET', '/', None, {}
+    if rota == 'historico':
+        return 'GET', '/historico', None, {}
+    if rota == 'carros_disponiveis':
+        return 'GET', f"/carros_disponiveis?{urlencode(periodo)}", None, {}
+    if rota == 'calcular_valor':
+        corpo = '{"carro_id": %d, "data_retirada": "%s", "data_devolucao": "%s"}' % (
+            aleatorio.choice(disputados), periodo['data_retirada'], periodo['data_devolucao']
+        )
+        return 'POST', '/calcular_valor', corpo, {'Content-Type': 'application/json'}
+    if rota == 'nova_locacao_form':
+        return 'GET', '/nova_locacao', None, {}
+    if rota == 'reserva':
+        corpo = urlencode({'nome_cliente': CLIENTE_CARGA, 'whatsapp': '', 'carro_id': aleatorio.choice(disputados), **periodo})
+        return 'POST', '/nova_locacao', corpo, {'Content-Type': 'application/x-www-form-urlencoded'}
+    if rota in ('finalizar', 'cancelar'):
+        # Locações ainda ativas deste cliente; esgotadas, repete ids já encerrados
+        locacao_id = a_encerrar.pop() if a_encerrar else aleatorio.choice(todas_ativas)
+        return 'POST', f"/{rota}_locacao/{locacao_id}", None, {}
+    return 'GET', {'exportar_csv': '/exportar/csv', 'exportar_json': '/exportar/json',
+                   'exportar_sql': '/exportar/sql'}[rota], None, {}
+
+
+def _cliente(parametros):
+    """Um atendente: requisições sorteadas pelo mix até o fim do tempo."""
+    portas, mix, segundos, largada, semente, disputados, a_encerrar, todas_ativas = parametros
+    aleatorio = random.Random(semente)
+    rotas, pesos = list(mix), list(mix.values())
+    hoje = date.today()
+    conexoes = {}
+    latencias = defaultdict(list)
+    erros = defaultdict(Counter)
+    reservas = Counter()
+
+    time.sleep(max(0.0, largada - time.time()))
+    fim = largada + segundos
+    vez = semente
+    while time.time() < fim:
+        rota = aleatorio.choices(rotas, pesos)[0]
+        metodo, url, corpo, cabecalhos = _requisicao(rota, aleatorio, hoje, disputados, a_encerrar, todas_ativas)
+        porta = portas[vez % len(portas)]  # rodízio entre os workers
+        vez += 1
+
+        comeco = time.perf_counter()
+        try:
+            conexao = conexoes.get(porta) or http.client.HTTPConnection('127.0.0.1', porta, timeout=120)
+            conexoes[porta] = conexao
+            conexao.request(metodo, url, body=corpo, headers=cabecalhos)
+            resposta = conexao.getresponse()
+            resposta.read()
+            if resposta.will_close:
+                conexao.close()
+                conexoes.pop(porta)
+        except (OSError, http.client.HTTPException):
+            conexao = conexoes.pop(porta, None)
+            if conexao:
+                conexao.close()
+            erros[rota]['conexao'] += 1
+            latencias[rota].append((time.perf_counter() - comeco) * 1000)
+            continue
+        latencias[rota].append((time.perf_counter() - comeco) * 1000)
+
+        if resposta.status >= 400:
+            erros[rota][f'http_{resposta.status}'] += 1
+        elif rota == 'reserva':
+            # Sucesso volta ao dashboard; recusa (carro ocupado, banco ocupado) ao formulário
+            destino = resposta.getheader('Location', '')
+            reservas['criadas' if not destino.rstrip('/').endswith('nova_locacao') else 'recusadas'] += 1
+
+    for conexao in conexoes.values():
+        conexao.close()
+    return dict(latencias), {rota: dict(contagem) for rota, contagem in erros.items()}, dict(reservas)
+
+
+def _percentil(amostras, percentil):
+    if not amostras:
+        return None
+    ordenadas = sorted(amostras)
+    return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * percentil / 100))], 2)
+
+
+def _verificar_sobreposicoes(carro_ids):
+    from reservas import contar_sobreposicoes
+    return contar_sobreposicoes(carro_ids)
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+def executar(workers=4, threads=1, clientes=16, segundos=30.0, servidor=None, mix=None, carros=200,
+             clientes_cadastrados=2000, locacoes=20000, carros_disputados=5, banco=None, sqlite_perfil=None):
+    """
+    Sobe os servidores, dispara o tráfego misto e resume o resultado.
+
+    Args:
+        workers: Processos servidores (workers do gunicorn)
+        threads: Threads por worker
+        clientes: Atendentes simultâneos (um processo cada)
+        segundos: Duração do tráfego
+        servidor: 'gunicorn' ou 'werkzeug' (padrão: gunicorn se instalado)
+        mix: {rota: peso} (padrão: MIX_PADRAO)
+        carros, clientes_cadastrados, locacoes: Volume gerado se o banco estiver vazio
+        carros_disputados: Carros em que todas as reservas são feitas (força disputas)
+        banco: URI de um banco descartável (padrão: SQLite temporário)
+        sqlite_perfil: SQLITE_PERFIL dos workers (padrao, producao)
+
+    Returns:
+        dict: Configuração, totais (req/s, erros, travas, reservas, sobreposições)
+              e, por rota, req/s, taxa de erros e p50/p95/p99 (ms)
+    """
+    servidor = servidor or ('gunicorn' if gunicorn_disponivel() else 'werkzeug')
+    if servidor not in SERVIDORES:
+        raise ValueError(f"Servidor deve ser um de {', '.join(SERVIDORES)} (recebido: {servidor!r}).")
+    if servidor == 'gunicorn' and not gunicorn_disponivel():
+        raise ValueError('gunicorn não está instalado (pip install gunicorn); use --servidor werkzeug.')
+    mix = {rota: peso for rota, peso in (mix or MIX_PADRAO).items() if peso > 0}
+
+    pasta = tempfile.mkdtemp(prefix='locamil-carga-')
+    caminho_log = os.path.join(pasta, 'servidores.log')
+    os.environ['DATABASE_URI'] = banco or f"sqlite:///{os.path.join(pasta, 'carga.db')}"
+    os.environ['CACHE_VERSAO_ARQUIVO'] = os.path.join(pasta, 'versao.db')
+    os.environ['METRICAS_DIR'] = os.path.join(pasta, 'metricas')
+    os.environ['SEED_DATABASE'] = 'False'
+    os.environ.pop('ENCERRAMENTO_AUTOMATICO_MINUTOS', None)
+    if sqlite_perfil:
+        os.environ['SQLITE_PERFIL'] = sqlite_perfil
+    contexto = multiprocessing.get_context('spawn')
+    processos = []
+
+    try:
+        with contexto.Pool(1, initializer=_inicializar_processo) as preparo:
+            disputados, ativas = preparo.apply(_preparar, (carros, clientes_cadastrados, locacoes, carros_disputados))
+        if not disputados:
+            raise ValueError('Nenhum carro ativo no banco para as reservas.')
+
+        processos, portas = _iniciar_servidores(servidor, workers, threads, caminho_log)
+        _aguardar_prontos(portas, processos)
+
+        aleatorio = random.Random(0)
+        aleatorio.shuffle(ativas)
+        with contexto.Pool(clientes) as pool:
+            largada = time.time() + 1.0 + 0.1 * clientes
+            parametros = [
+                (portas, mix, segundos, largada, semente, disputados, ativas[semente::clientes], ativas or [0])
+                for semente in range(clientes)
+            ]
+            saidas = pool.map(_cliente, parametros)
+            decorrido = max(segundos, time.time() - largada)
+
+        _parar_servidores(processos)
+        processos = []
+        with contexto.Pool(1, initializer=_inicializar_processo) as verificacao:
+            sobreposicoes = verificacao.apply(_verificar_sobreposicoes, (disputados,))
+
+        with open(caminho_log, encoding='utf-8', errors='replace') as arquivo:
+            log = arquivo.read()
+    finally:
+        _parar_servidores(processos)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    latencias, erros, reservas = defaultdict(list), defaultdict(Counter), Counter()
+    for latencias_cliente, erros_cliente, reservas_cliente in saidas:
+        for rota, amostras in latencias_cliente.items():
+            latencias[rota].extend(amostras)
+        for rota, contagem in erros_cliente.items():
+            erros[rota].update(contagem)
+        reservas.update(reservas_cliente)
+
+    rotas = {}
+    for rota in mix:
+        amostras = latencias.get(rota, [])
+        falhas = sum(erros[rota].values())
+        rotas[rota] = {
+            'requisicoes': len(amostras),
+            'por_segundo': round(len(amostras) / decorrido, 1),
+            'erros': dict(erros[rota]),
+            'taxa_erros': round(falhas / len(amostras), 4) if amostras else None,
+            'p50_ms': round(statistics.median(amostras), 2) if amostras else None,
+            'p95_ms': _percentil(amostras, 95),
+            'p99_ms': _percentil(amostras, 99),
+            'max_ms': round(max(amostras), 2) if amostras else None,
+        }
+
+    total = sum(rota['requisicoes'] for rota in rotas.values())
+    total_erros = sum(sum(contagem.values()) for contagem in erros.values())
+    return {
+        'servidor': servidor,
+        'workers': workers,
+        'threads': threads,
+        'clientes': clientes,
+        'segundos': round(decorrido, 1),
+        'banco': 'sqlite temporário' if not banco else banco,
+        'sqlite_perfil': os.environ.get('SQLITE_PERFIL', 'padrao'),
+        'requisicoes': total,
+        'requisicoes_por_segundo': round(total / decorrido, 1),
+        'erros': total_erros,
+        'taxa_erros': round(total_erros / total, 4) if total else None,
+        'travas_sqlite': len(_TRAVA_SQLITE.findall(log)),
+        'reservas_banco_ocupado': len(_BANCO_OCUPADO.findall(log)),
+        'reservas': {'criadas': reservas['criadas'], 'recusadas': reservas['recusadas']},
+        'sobreposicoes': sobreposicoes,
+        'rotas': rotas,
+    }
@@ -0,0 +1,241 @@
+"""
+Identificação de clientes por chave normalizada e deduplicação em lote.
+
+O cliente é identificado pelo nome normalizado (sem acentos, pontuação ou
+diferença de caixa e espaços: "José  da Silva" e "jose da silva" são o mesmo)
+mais o WhatsApp em E.164 (`formatar_telefone`). A coluna `nome_normalizado` é
+preenchida em todo flush e, junto com o WhatsApp, forma o índice
+`ix_clientes_chave`: achar o cliente é uma busca no índice, independente do
+tamanho da base.
+
+Cadastros antigos gravados com grafias diferentes são unidos por
+`deduplicar_clientes()`, que reaponta as locações dos duplicados para o
+cadastro mais antigo com UPDATEs em lote.
+
+Uso:
+    flask --app app deduplicar-clientes --simular
+    flask --app app deduplicar-clientes
+"""
+
+import re
+import time
+import unicodedata
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import Column, Integer, MetaData, Table, bindparam, delete, event, insert, select, update
+from models import db, Cliente, Locacao, LocacaoArquivada
+from consultas import consulta_cliente_por_chave
+from cache_dashboard import versao_dados
+
+
+CLIENTES_POR_LOTE = 10000
+
+_NAO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar_nome(nome):
+    """Nome sem acentos, pontuação e diferenças de caixa/espaços ('José  Silva' -> 'jose silva')."""
+    if not nome:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', nome)
+    sem_acentos = ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return _NAO_ALFANUMERICO.sub(' ', sem_acentos.casefold()).strip()[:100]
+
+
+def formatar_telefone(whatsapp):
+    """
+    Formata o número de telefone adicionando o prefixo +55 se necessário.
+    Remove caracteres não numéricos e adiciona +55 no início.
+
+    Args:
+        whatsapp: String com o número de telefone
+
+    Returns:
+        str: Número formatado com +55 ou string vazia se inválido
+    """
+    if not whatsapp or not whatsapp.strip():
+        return ""
+
+    # Se já começar com +55, retornar como está (após limpar)
+    if whatsapp.strip().startswith('+55'):
+        numeros = re.sub(r'\D', '', whatsapp)
+        return f"+{numeros}" if numeros.startswith('55') else f"+55{numeros[2:]}" if len(numeros) > 2 else ""
+
+    # Remover todos os caracteres não numéricos
+    numeros = re.sub(r'\D', '', whatsapp)
+
+    # Se já começar com 55 (sem +), adicionar +
+    if numeros.startswith('55'):
+        return f"+{numeros}"
+
+    # Se começar com 0, remover o 0 e adicionar 55
+    if numeros.startswith('0'):
+        numeros = numeros[1:]
+
+    # Adicionar +55 no início
+    if len(numeros) >= 10:  # Validar que tem pelo menos 10 dígitos (DDD + número)
+        return f"+55{numeros}"
+
+    return ""
+
+
+def resolver_cliente(nome, whatsapp=''):
+    """
+    Cliente existente com o mesmo nome normalizado e WhatsApp, ou um novo.
+
+    Um cadastro sem WhatsApp é reaproveitado (e ganha o número informado);
+    homônimos com outro número são clientes diferentes. O cliente novo é
+    adicionado à sessão e recebe id no flush.
+
+    Args:
+        nome: Nome digitado
+        whatsapp: Telefone em qualquer formato (opcional)
+
+    Returns:
+        Cliente: Cliente encontrado ou criado
+    """
+    whatsapp_formatado = formatar_telefone(whatsapp) if whatsapp else ""
+    cliente = consulta_cliente_por_chave(normalizar_nome(nome), whatsapp_formatado).first()
+    if cliente is None:
+        cliente = Cliente(nome=nome, whatsapp=whatsapp_formatado)
+        db.session.add(cliente)
+        db.session.flush()
+    elif whatsapp_formatado and not cliente.whatsapp:
+        cliente.whatsapp = whatsapp_formatado
+    return cliente
+
+
+@event.listens_for(Cliente, 'before_insert')
+@event.listens_for(Cliente, 'before_update')
+def _preencher_nome_normalizado(mapper, conexao, cliente):
+    cliente.nome_normalizado = normalizar_nome(cliente.nome)
+
+
+# ============================================================================
+# DEDUPLICAÇÃO
+# ============================================================================
+
+_mapa = Table(
+    'mapa_clientes_duplicados', MetaData(),
+    Column('antigo', Integer, primary_key=True),
+    Column('novo', Integer, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+
+def _unir_grupo(cadastros):
+    """
+    Duplicados de um grupo com o mesmo nome normalizado.
+
+    Cadastros com o mesmo WhatsApp são unidos no mais antigo. Os sem WhatsApp
+    são unidos ao único número do grupo, se houver só um; com números
+    diferentes (homônimos) ficam só entre si.
+
+    Args:
+        cadastros: [(id, whatsapp), ...] ordenados por id
+
+    Returns:
+        (dict, dict): ({id_duplicado: id_mantido}, {id_mantido: whatsapp a gravar})
+    """
+    por_numero = {}
+    sem_numero = []
+    for cliente_id, whatsapp in cadastros:
+        if whatsapp:
+            por_numero.setdefault(whatsapp, []).append(cliente_id)
+        else:
+            sem_numero.append(cliente_id)
+
+    uniao, telefones = {}, {}
+    if sem_numero and len(por_numero) == 1:
+        (whatsapp, ids), = por_numero.items()
+        todos = sorted(ids + sem_numero)
+        for cliente_id in todos[1:]:
+            uniao[cliente_id] = todos[0]
+        if todos[0] in sem_numero:
+            telefones[todos[0]] = whatsapp
+        return uniao, telefones
+
+    for ids in (*por_numero.values(), sem_numero):
+        for cliente_id in ids[1:]:
+            uniao[cliente_id] = ids[0]
+    return uniao, telefones
+
+
+def _aplicar_uniao(uniao, telefones):
+    """Reaponta locações (inclusive arquivadas), completa telefones e remove duplicados numa transação."""
+    agora = datetime.utcnow()
+    with db.engine.begin() as conexao:
+        _mapa.create(conexao, checkfirst=True)
+        conexao.execute(delete(_mapa))
+        conexao.execute(insert(_mapa), [{'antigo': antigo, 'novo': novo} for antigo, novo in uniao.items()])
+
+        duplicados = select(_mapa.c.antigo)
+        repontadas = 0
+        for modelo in (Locacao, LocacaoArquivada):
+            novo_id = select(_mapa.c.novo).where(_mapa.c.antigo == modelo.cliente_id).scalar_subquery()
+            repontadas += conexao.execute(
+                update(modelo.__table__)
+                .where(modelo.cliente_id.in_(duplicados))
+                .values(cliente_id=novo_id, updated_at=agora)
+            ).rowcount
+
+        if telefones:
+            tabela = Cliente.__table__
+            conexao.execute(
+                update(tabela).where(tabela.c.id == bindparam('cliente_id'))
+                .values(whatsapp=bindparam('novo_whatsapp'), updated_at=agora),
+                [{'cliente_id': cliente_id, 'novo_whatsapp': whatsapp} for cliente_id, whatsapp in telefones.items()]
+            )
+
+        conexao.execute(delete(Cliente.__table__).where(Cliente.id.in_(duplicados)))
+        _mapa.drop(conexao)
+    return repontadas
+
+
+def deduplicar_clientes(tamanho_lote=CLIENTES_POR_LOTE, simular=False):
+    """
+    Une clientes duplicados (mesmo nome normalizado e WhatsApp compatível).
+
+    Lê só id, nome normalizado e WhatsApp, na ordem do índice
+    `ix_clientes_chave`, agrupa por nome normalizado e grava as uniões em
+    lotes de até `tamanho_lote` duplicados, cada lote numa transação.
+
+    Returns:
+        dict: Grupos com duplicados, clientes removidos, locações reapontadas e segundos
+    """
+    inicio = time.perf_counter()
+    relatorio = {'grupos': 0, 'clientes_removidos': 0, 'locacoes_reapontadas': 0}
+    uniao, telefones = {}, {}
+
+    def gravar():
+        if not simular:
+            relatorio['locacoes_reapontadas'] += _aplicar_uniao(uniao, telefones)
+        relatorio['clientes_removidos'] += len(uniao)
+        uniao.clear()
+        telefones.clear()
+
+    consulta = (
+        select(Cliente.id, Cliente.nome_normalizado, Cliente.whatsapp)
+        .order_by(Cliente.nome_normalizado, Cliente.id)
+    )
+    cadastros = db.session.execute(consulta).all()
+    db.session.commit()
+
+    for _, grupo in groupby(cadastros, key=lambda cadastro: cadastro[1]):
+        grupo = [(cliente_id, whatsapp or '') for cliente_id, _, whatsapp in grupo]
+        uniao_grupo, telefones_grupo = _unir_grupo(grupo)
+        if not uniao_grupo:
+            continue
+        relatorio['grupos'] += 1
+        uniao.update(uniao_grupo)
+        telefones.update(telefones_grupo)
+        if len(uniao) >= tamanho_lote:
+            gravar()
+
+    if uniao:
+        gravar()
+
+    if relatorio['clientes_removidos'] and not simular:
+        versao_dados.incrementar()
+    relatorio['segundos'] = round(time.perf_counter() - inicio, 3)
+    return relatorio
@@ -0,0 +1,301 @@
+"""
+Configuração do engine do banco: perfil SQLite de produção e pool de conexões.
+
+Com vários workers do gunicorn no mesmo arquivo SQLite, o modo padrão
+(journal de rollback, sem espera por trava) serializa leitores durante cada
+escrita e devolve "database is locked". O perfil `producao` aplica, em toda
+conexão nova do pool:
+
+    journal_mode=WAL        leitores não bloqueiam o escritor (nem o contrário)
+    busy_timeout            espera a trava em vez de falhar na hora
+    synchronous=NORMAL      um fsync por checkpoint (seguro com WAL)
+    cache_size / mmap_size  páginas quentes em memória, leitura sem cópia
+    temp_store=MEMORY       tabelas temporárias e ordenações em memória
+
+Variáveis de ambiente (ao lado de DATABASE_URI):
+
+    SQLITE_PERFIL            padrao | producao (padrão: padrao)
+    SQLITE_BUSY_TIMEOUT_MS   espera por trava (padrão do perfil: 5000)
+    SQLITE_SYNCHRONOUS       OFF | NORMAL | FULL | EXTRA
+    SQLITE_CACHE_SIZE_MB     cache de páginas por conexão
+    SQLITE_MMAP_SIZE_MB      tamanho do mapeamento em memória
+    DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+
+Uso:
+    SQLITE_PERFIL=producao gunicorn -w 4 app:app
+    flask --app app benchmark-sqlite --processos 8 --segundos 10
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+import multiprocessing
+from datetime import date, timedelta
+from sqlalchemy import create_engine, event, func, insert, select, update
+from sqlalchemy.engine import make_url
+from models import db, Carro, Cliente, Locacao
+
+
+PERFIS = ('padrao', 'producao')
+
+# Pragmas de cada perfil; os valores podem ser trocados pelas variáveis de ambiente
+_PRAGMAS_PERFIL = {
+    'padrao': {},
+    'producao': {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'cache_size': -64 * 1024,       # negativo = KiB (64 MB)
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+_SINCRONIZACOES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+_POOL_PADRAO = {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': -1}
+
+
+def _inteiro(ambiente, nome, padrao=None):
+    valor = ambiente.get(nome)
+    if valor in (None, ''):
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"{nome} deve ser um número inteiro (recebido: {valor!r}).")
+
+
+def eh_sqlite_arquivo(uri):
+    """True para SQLite em arquivo (perfil e pool não se aplicam a `:memory:`)."""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def pragmas_sqlite(ambiente=None):
+    """
+    Pragmas do perfil escolhido em SQLITE_PERFIL, com os ajustes do ambiente.
+
+    Raises:
+        ValueError: Perfil ou valor inválido
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    perfil = (ambiente.get('SQLITE_PERFIL') or 'padrao').lower()
+    if perfil not in PERFIS:
+        raise ValueError(f"SQLITE_PERFIL deve ser um de {', '.join(PERFIS)} (recebido: {perfil!r}).")
+
+    pragmas = dict(_PRAGMAS_PERFIL[perfil])
+    busy_timeout = _inteiro(ambiente, 'SQLITE_BUSY_TIMEOUT_MS')
+    if busy_timeout is not None:
+        pragmas['busy_timeout'] = busy_timeout
+    sincronizacao = ambiente.get('SQLITE_SYNCHRONOUS')
+    if sincronizacao:
+        if sincronizacao.upper() not in _SINCRONIZACOES:
+            raise ValueError(f"SQLITE_SYNCHRONOUS deve ser um de {', '.join(_SINCRONIZACOES)}.")
+        pragmas['synchronous'] = sincronizacao.upper()
+    cache_mb = _inteiro(ambiente, 'SQLITE_CACHE_SIZE_MB')
+    if cache_mb is not None:
+        pragmas['cache_size'] = -cache_mb * 1024
+    mmap_mb = _inteiro(ambiente, 'SQLITE_MMAP_SIZE_MB')
+    if mmap_mb is not None:
+        pragmas['mmap_size'] = mmap_mb * 1024 * 1024
+    return pragmas
+
+
+def opcoes_engine(uri, ambiente=None):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS para a URI: pool explícito e, no SQLite, espera por trava.
+
+    Returns:
+        dict: Argumentos de `create_engine`
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    if make_url(uri).get_backend_name() == 'sqlite' and not eh_sqlite_arquivo(uri):
+        return {}
+
+    opcoes = {
+        'pool_size': _inteiro(ambiente, 'DB_POOL_SIZE', _POOL_PADRAO['pool_size']),
+        'max_overflow': _inteiro(ambiente, 'DB_POOL_MAX_OVERFLOW', _POOL_PADRAO['max_overflow']),
+        'pool_timeout': _inteiro(ambiente, 'DB_POOL_TIMEOUT', _POOL_PADRAO['pool_timeout']),
+        'pool_recycle': _inteiro(ambiente, 'DB_POOL_RECYCLE', _POOL_PADRAO['pool_recycle']),
+    }
+    if eh_sqlite_arquivo(uri):
+        # O busy_timeout do driver vale desde o connect, antes dos pragmas
+        busy_timeout = pragmas_sqlite(ambiente).get('busy_timeout')
+        if busy_timeout is not None:
+            opcoes['connect_args'] = {'timeout': busy_timeout / 1000}
+    else:
+        opcoes['pool_pre_ping'] = True
+    return opcoes
+
+
+def registrar_pragmas(engine, pragmas):
+    """Aplica os pragmas em cada conexão nova do engine (no SQLite)."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _aplicar_pragmas(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        try:
+            for nome, valor in pragmas.items():
+                cursor.execute(f'PRAGMA {nome}={valor}')
+        finally:
+            cursor.close()
+
+
+def pragmas_atuais(conexao):
+    """Valores vigentes dos pragmas do perfil numa conexão (para conferência)."""
+    return {
+        nome: conexao.exec_driver_sql(f'PRAGMA {nome}').scalar()
+        for nome in _PRAGMAS_PERFIL['producao']
+    }
+
+
+def configurar(app):
+    """Define SQLALCHEMY_ENGINE_OPTIONS a partir do ambiente (antes de `db.init_app`)."""
+    opcoes = opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**opcoes, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+
+def registrar(app):
+    """Instala os pragmas do perfil no engine do app (depois de `db.init_app`)."""
+    if not eh_sqlite_arquivo(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    with app.app_context():
+        registrar_pragmas(db.engine, pragmas_sqlite())
+
+
+def criar_engine(uri, ambiente=None):
+    """Engine fora do Flask com o mesmo perfil e pool do app."""
+    ambiente = os.environ if ambiente is None else ambiente
+    engine = create_engine(uri, **opcoes_engine(uri, ambiente))
+    if eh_sqlite_arquivo(uri):
+        registrar_pragmas(engine, pragmas_sqlite(ambiente))
+    return engine
+
+
+# ============================================================================
+# BENCHMARK MULTIPROCESSO
+# ============================================================================
+
+def _preparar_banco(uri, carros, locacoes):
+    """Cria o schema e popula um banco descartável para o benchmark."""
+    engine = create_engine(uri)
+    db.metadata.create_all(engine)
+    hoje = date.today()
+    aleatorio = random.Random(0)
+    with engine.begin() as conexao:
+        conexao.execute(insert(Cliente.__table__), [{'nome': 'Benchmark', 'whatsapp': ''}])
+        conexao.execute(insert(Carro.__table__), [
+            {'modelo': 'Benchmark', 'placa': f'BEN-{numero:04d}', 'cor': 'Branco',
+             'categoria': 'Econômico', 'valor_diaria': 100.0}
+            for numero in range(carros)
+        ])
+        linhas = []
+        for _ in range(locacoes):
+            retirada = hoje + timedelta(days=aleatorio.randrange(-365, 60))
+            linhas.append({
+                'carro_id': aleatorio.randrange(1, carros + 1), 'cliente_id': 1,
+                'data_retirada': retirada, 'data_devolucao': retirada + timedelta(days=aleatorio.randrange(1, 8)),
+                'valor_total': 300.0, 'status': aleatorio.choice(('ativa', 'finalizada', 'finalizada')),
+            })
+        conexao.execute(insert(Locacao.__table__), linhas)
+    engine.dispose()
+
+
+def _trabalhador_benchmark(parametros):
+    """Um processo: leituras e escritas sorteadas até o fim do tempo."""
+    uri, ambiente, carros, segundos, fracao_escritas, semente, largada = parametros
+    engine = criar_engine(uri, ambiente)
+    aleatorio = random.Random(semente)
+    locacoes = Locacao.__table__
+    hoje = date.today()
+    leituras, escritas, erros = [], [], 0
+
+    # Leitura típica do dashboard: locações ativas no dia, com o carro
+    consulta = (
+        select(Locacao.id, Locacao.data_devolucao, Carro.modelo, Carro.placa)
+        .join(Carro, Carro.id == Locacao.carro_id)
+        .where(Locacao.status == 'ativa', Locacao.data_retirada <= hoje, Locacao.data_devolucao >= hoje)
+    )
+
+    time.sleep(max(0.0, largada - time.time()))
+    fim = largada + segundos
+    while time.time() < fim:
+        comeco = time.perf_counter()
+        try:
+            if aleatorio.random() < fracao_escritas:
+                retirada = hoje + timedelta(days=aleatorio.randrange(60))
+                with engine.begin() as conexao:
+                    conexao.execute(insert(locacoes).values(
+                        carro_id=aleatorio.randrange(1, carros + 1), cliente_id=1,
+                        data_retirada=retirada, data_devolucao=retirada + timedelta(days=3),
+                        valor_total=300.0, status='ativa'
+                    ))
+                    conexao.execute(
+                        update(Carro.__table__).where(Carro.id == aleatorio.randrange(1, carros + 1))
+                        .values(quilometragem=Carro.quilometragem + 1)
+                    )
+                escritas.append((time.perf_counter() - comeco) * 1000)
+            else:
+                with engine.connect() as conexao:
+                    conexao.execute(consulta).all()
+                    conexao.execute(select(func.count()).select_from(locacoes)).scalar()
+                leituras.append((time.perf_counter() - comeco) * 1000)
+        except Exception:
+            erros += 1
+    engine.dispose()
+    return leituras, escritas, erros
+
+
+def _percentil(amostras, percentil):
+    if not amostras:
+        return None
+    ordenadas = sorted(amostras)
+    return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * percentil / 100))], 2)
+
+
+def benchmark(perfis=PERFIS, processos=8, segundos=5.0, fracao_escritas=0.2, carros=200, locacoes=20000):
+    """
+    Leituras e escritas simultâneas de vários processos num arquivo SQLite, por perfil.
+
+    Cada perfil roda numa cópia nova do mesmo banco sintético, com o pool e os
+    pragmas que o app usaria (ajustes do ambiente incluídos).
+
+    Returns:
+        list: Um dict por perfil com leituras/s, escritas/s, erros e p50/p99 (ms)
+    """
+    resultados = []
+    contexto = multiprocessing.get_context('spawn')
+    for perfil in perfis:
+        pasta = tempfile.mkdtemp(prefix='locamil-sqlite-')
+        uri = f"sqlite:///{os.path.join(pasta, 'benchmark.db')}"
+        _preparar_banco(uri, carros, locacoes)
+        ambiente = {**os.environ, 'SQLITE_PERFIL': perfil}
+
+        with contexto.Pool(processos) as pool:
+            largada = time.time() + 1.0 + 0.1 * processos
+            parametros = [
+                (uri, ambiente, carros, segundos, fracao_escritas, semente, largada)
+                for semente in range(processos)
+            ]
+            saidas = pool.map(_trabalhador_benchmark, parametros)
+
+        leituras = [amostra for saida in saidas for amostra in saida[0]]
+        escritas = [amostra for saida in saidas for amostra in saida[1]]
+        resultados.append({
+            'perfil': perfil,
+            'processos': processos,
+            'segundos': segundos,
+            'leituras_por_segundo': round(len(leituras) / segundos, 1),
+            'escritas_por_segundo': round(len(escritas) / segundos, 1),
+            'erros': sum(saida[2] for saida in saidas),
+            'leitura_p50_ms': round(statistics.median(leituras), 2) if leituras else None,
+            'leitura_p99_ms': _percentil(leituras, 99),
+            'escrita_p50_ms': round(statistics.median(escritas), 2) if escritas else None,
+            'escrita_p99_ms': _percentil(escritas, 99),
+        })
+    return resultados
@@ -0,0 +1,147 @@
+"""
+Consultas usadas nos caminhos mais acessados da aplicação.
+
+Centralizadas aqui para que as rotas e a verificação de planos de execução
+(`flask --app app verificar-indices`) usem exatamente os mesmos predicados.
+"""
+
+from sqlalchemy import or_
+from models import db, Carro, Cliente, Locacao, Gasto
+
+
+def consulta_conflitos(carro_id, data_retirada, data_devolucao, locacao_id=None):
+    """
+    Locações ativas do carro que se sobrepõem ao período informado.
+
+    Dois períodos fechados se sobrepõem quando cada um começa antes do fim do
+    outro; esse predicado único equivale aos três casos de sobreposição e pode
+    usar o índice (carro_id, status, data_retirada, data_devolucao).
+    """
+    consulta = Locacao.query.filter(
+        Locacao.carro_id == carro_id,
+        Locacao.status == 'ativa',
+        Locacao.data_retirada <= data_devolucao,
+        Locacao.data_devolucao >= data_retirada
+    )
+    if locacao_id:
+        consulta = consulta.filter(Locacao.id != locacao_id)
+    return consulta
+
+
+def consulta_carros_livres(data_retirada, data_devolucao, categoria=None):
+    """
+    Carros ativos, fora de manutenção e sem locação ativa sobreposta ao período.
+
+    Anti-join (NOT EXISTS) resolvido pelo índice (carro_id, status, data_retirada,
+    data_devolucao): uma única consulta para a frota inteira.
+    """
+    ocupado = db.session.query(Locacao.id).filter(
+        Locacao.carro_id == Carro.id,
+        Locacao.status == 'ativa',
+        Locacao.data_retirada <= data_devolucao,
+        Locacao.data_devolucao >= data_retirada
+    ).exists()
+
+    consulta = Carro.query.filter(
+        Carro.ativo.is_(True),
+        Carro.em_manutencao.isnot(True),
+        ~ocupado
+    )
+    if categoria:
+        consulta = consulta.filter(Carro.categoria == categoria)
+    return consulta.order_by(Carro.categoria, Carro.valor_diaria, Carro.modelo)
+
+
+def consulta_proximas_devolucoes(inicio, fim):
+    """Locações ativas com devolução entre as datas, da mais próxima à mais distante."""
+    return Locacao.query.filter(
+        Locacao.status == 'ativa',
+        Locacao.data_devolucao >= inicio,
+        Locacao.data_devolucao <= fim
+    ).order_by(Locacao.data_devolucao)
+
+
+def consulta_proximas_retiradas(inicio, fim):
+    """Locações ativas com retirada entre as datas, da mais próxima à mais distante."""
+    return Locacao.query.filter(
+        Locacao.status == 'ativa',
+        Locacao.data_retirada >= inicio,
+        Locacao.data_retirada <= fim
+    ).order_by(Locacao.data_retirada)
+
+
+def consulta_locacoes_vencidas(data_limite):
+    """Locações ainda ativas com devolução anterior à data limite (índice status/devolução)."""
+    return Locacao.query.filter(
+        Locacao.status == 'ativa',
+        Locacao.data_devolucao < data_limite
+    )
+
+
+def consulta_historico(modelo=Locacao):
+    """Todas as locações da tabela (Locacao ou LocacaoArquivada), das mais recentes para as mais antigas."""
+    return modelo.query.order_by(
+        modelo.data_retirada.desc(), modelo.id.desc()
+    )
+
+
+def consulta_gastos_periodo(inicio, fim):
+    """Gastos com data entre as datas informadas."""
+    return Gasto.query.filter(Gasto.data_gasto >= inicio, Gasto.data_gasto <= fim)
+
+
+def consulta_alteracoes(modelo, desde, ate):
+    """
+    Linhas do modelo criadas ou alteradas no intervalo (desde, ate], na ordem
+    das alterações. Usa o índice em `updated_at` da tabela.
+    """
+    tabela = modelo.__table__
+    consulta = db.select(tabela).where(tabela.c.updated_at <= ate)
+    if desde:
+        consulta = consulta.where(tabela.c.updated_at > desde)
+    return consulta.order_by(tabela.c.updated_at, tabela.c.id)
+
+
+def consulta_cliente_por_chave(nome_normalizado, whatsapp=None):
+    """
+    Candidatos a um cliente pelo nome normalizado e WhatsApp (índice ix_clientes_chave).
+
+    Com WhatsApp, vêm primeiro o cadastro com o mesmo número e depois os sem
+    número; cadastros homônimos com outro número ficam de fora.
+    """
+    consulta = Cliente.query.filter(Cliente.nome_normalizado == nome_normalizado)
+    if not whatsapp:
+        return consulta.order_by(Cliente.id)
+    return consulta.filter(
+        or_(Cliente.whatsapp == whatsapp, Cliente.whatsapp.is_(None), Cliente.whatsapp == '')
+    ).order_by((Cliente.whatsapp == whatsapp).desc(), Cliente.id)
+
+
+# ============================================================================
+# ESTRATÉGIAS DE CARREGAMENTO
+# ============================================================================
+# Os relacionamentos dos modelos são lazy; cada rota escolhe aqui como trazer
+# carro/cliente para não disparar uma consulta por linha ao serializar.
+
+def eager_carro_cliente(consulta, modelo=Locacao):
+    """
+    Carrega carro e cliente de cada locação no mesmo SELECT (JOIN).
+
+    Indicado para páginas curtas (dashboard, histórico paginado, uma locação).
+    """
+    return consulta.options(db.joinedload(modelo.carro), db.joinedload(modelo.cliente))
+
+
+def selectin_carro_cliente(consulta):
+    """
+    Carrega carros e clientes das locações em consultas `IN (...)` em lote.
+
+    Indicado para listas grandes (exportações): evita repetir as colunas de
+    carro/cliente em cada linha do JOIN e mantém o número de consultas constante.
+    """
+    return consulta.options(db.selectinload(Locacao.carro), db.selectinload(Locacao.cliente))
+
+
+def selectin_carro(consulta):
+    """Carrega o carro de cada gasto em lote (ver `selectin_carro_cliente`)."""
+    return consulta.options(db.selectinload(Gasto.carro))
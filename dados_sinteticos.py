@@ -0,0 +1,288 @@
+"""
+Gerador de dados sintéticos em escala: frota, clientes, locações e gastos.
+
+O seed de exemplo tem 9 carros; para reproduzir os problemas de volume da
+produção (dashboard, histórico, exportações) este gerador cria frotas de
+milhares de carros e milhões de locações com INSERTs em lote, uma transação
+por lote de LINHAS_POR_LOTE linhas.
+
+Os dados seguem as regras do sistema: as locações de cada carro formam uma
+sequência sem sobreposição ao longo de `anos` anos (até 60 dias no futuro), o
+status vem das datas (devolvidas = finalizadas, em curso e futuras = ativas,
+uma parte cancelada e algumas atrasadas ainda ativas), o valor é diária ×
+dias e o resumo mensal é atualizado na mesma transação de cada lote. Com a
+mesma semente, o resultado é o mesmo.
+
+Uso (num banco de testes, nunca no de produção):
+    export DATABASE_URI=sqlite:///escala.db SEED_DATABASE=False
+    flask --app app init-db --no-seed
+    flask --app app gerar-dados --carros 10000 --locacoes 1000000
+"""
+
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+from models import db, Carro, Cliente, Locacao, Gasto
+from clientes import normalizar_nome
+from resumo_mensal import aplicar_no_resumo, chave_mes, STATUS_DESPESA
+from disponibilidade import indice_disponibilidade
+from tarifas import tabela_tarifas
+from cache_dashboard import versao_dados
+from migracoes import atualizar_estatisticas
+
+
+LINHAS_POR_LOTE = 50000
+DIAS_FUTURO = 60
+
+# categoria: (peso na frota, modelos, faixa da diária)
+FROTA = {
+    'Econômico': (0.40, ('Renault Kwid', 'Fiat Mobi', 'Fiat Argo', 'VW Gol'), (70, 95)),
+    'Conforto': (0.30, ('Hyundai HB20', 'Chevrolet Onix', 'VW Polo', 'Fiat Cronos'), (110, 140)),
+    'SUV': (0.20, ('Jeep Renegade', 'Hyundai Creta', 'VW T-Cross', 'Chevrolet Tracker'), (180, 240)),
+    'Premium': (0.10, ('Toyota Corolla', 'Honda Civic', 'BMW 320i', 'Jeep Compass'), (280, 450)),
+}
+CORES = ('Branco', 'Prata', 'Preto', 'Cinza', 'Vermelho', 'Azul')
+
+NOMES = (
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+    'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vitória', 'Lucas',
+)
+SOBRENOMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa', 'Rodrigues', 'Almeida',
+    'Nascimento', 'Araújo', 'Carvalho', 'Gomes', 'Martins', 'Rocha', 'Ribeiro', 'Barbosa', 'Melo', 'Cardoso',
+)
+DDDS = ('11', '21', '31', '41', '48', '51', '61', '71', '81', '85')
+
+# tipo: (peso, descrições, faixa de valor)
+GASTOS = {
+    'Manutenção': (0.35, ('Troca de óleo e filtros', 'Alinhamento e balanceamento', 'Troca de pneus', 'Revisão'), (150, 1500)),
+    'Lavagem': (0.30, ('Lavagem simples', 'Lavagem completa', 'Lavagem e polimento'), (40, 150)),
+    'Combustível': (0.20, ('Abastecimento',), (150, 400)),
+    'Seguro': (0.07, ('Seguro anual',), (1200, 4000)),
+    'IPVA': (0.05, ('IPVA anual',), (800, 5000)),
+    'Outros': (0.03, ('Documentação', 'Multa'), (50, 500)),
+}
+
+
+def _placa(numero):
+    """Placa no padrão Mercosul (AAA0A00), única para cada número."""
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    numero, final = divmod(numero, 100)
+    numero, quarta = divmod(numero, 26)
+    numero, digito = divmod(numero, 10)
+    prefixo = ''
+    for _ in range(3):
+        numero, letra = divmod(numero, 26)
+        prefixo += letras[letra]
+    return f"{prefixo}{digito}{letras[quarta]}{final:02d}"
+
+
+def _sortear(aleatorio, tabela):
+    """Sorteia uma chave de {chave: (peso, ...)} conforme os pesos."""
+    chaves = list(tabela)
+    return aleatorio.choices(chaves, weights=[tabela[chave][0] for chave in chaves])[0]
+
+
+def _momento(dia, aleatorio, agora):
+    """Data e hora num dia (horário comercial), nunca no futuro."""
+    momento = datetime.combine(dia, datetime.min.time()) + timedelta(minutes=aleatorio.randrange(8 * 60, 19 * 60))
+    return min(momento, agora)
+
+
+class _Gravador:
+    """Acumula linhas e deltas do resumo e grava um lote por transação."""
+
+    def __init__(self, engine, tamanho_lote, progresso=None):
+        self.engine = engine
+        self.tamanho_lote = tamanho_lote
+        self.progresso = progresso
+        self.linhas = defaultdict(list)
+        self.resumo = defaultdict(lambda: [0.0, 0.0, 0, 0])
+        self.total = 0
+
+    def adicionar(self, tabela, linha):
+        self.linhas[tabela].append(linha)
+        if sum(len(linhas) for linhas in self.linhas.values()) >= self.tamanho_lote:
+            self.gravar()
+
+    def somar_resumo(self, chave, receita=0.0, despesas=0.0, locacoes=0, gastos=0):
+        valores = self.resumo[chave]
+        valores[0] += receita
+        valores[1] += despesas
+        valores[2] += locacoes
+        valores[3] += gastos
+
+    def gravar(self):
+        if not self.linhas:
+            return
+        with self.engine.begin() as conexao:
+            for tabela, linhas in self.linhas.items():
+                conexao.execute(insert(tabela), linhas)
+                self.total += len(linhas)
+            if self.resumo:
+                aplicar_no_resumo(conexao, {chave: tuple(valores) for chave, valores in self.resumo.items()})
+        self.linhas.clear()
+        self.resumo.clear()
+        if self.progresso:
+            self.progresso(self.total)
+
+
+def _sequencia_locacoes(aleatorio, quantidade, inicio, fim):
+    """
+    Períodos sem sobreposição de um carro entre `inicio` e `fim`.
+
+    Durações de 1 a 14 dias (a maioria curta) e intervalos sorteados,
+    escalados para que a sequência ocupe a janela inteira.
+    """
+    if quantidade <= 0:
+        return []
+    janela = (fim - inicio).days
+    duracoes = [min(14, max(1, int(aleatorio.expovariate(1 / 4)) + 1)) for _ in range(quantidade)]
+    ocupado = sum(duracoes)
+    if ocupado > janela:  # frota muito ocupada: encurta as locações
+        duracoes = [max(1, janela // quantidade)] * quantidade
+        ocupado = sum(duracoes)
+    intervalos = [aleatorio.random() for _ in range(quantidade)]
+    escala = max(0, janela - ocupado) / sum(intervalos)
+
+    periodos = []
+    dia = inicio
+    for duracao, intervalo in zip(duracoes, intervalos):
+        dia += timedelta(days=int(intervalo * escala))
+        retirada, devolucao = dia, dia + timedelta(days=duracao - 1)
+        if devolucao > fim:
+            break
+        periodos.append((retirada, devolucao))
+        dia = devolucao + timedelta(days=1)
+    return periodos
+
+
+def _status(aleatorio, retirada, devolucao, hoje):
+    """Status coerente com as datas (com cancelamentos e alguns atrasos)."""
+    if aleatorio.random() < 0.06:
+        return 'cancelada'
+    if devolucao >= hoje:
+        return 'ativa'
+    # Devolução nos últimos 14 dias ainda não baixada no sistema
+    if (hoje - devolucao).days <= 14 and aleatorio.random() < 0.3:
+        return 'ativa'
+    return 'finalizada'
+
+
+def gerar(carros=1000, clientes=20000, locacoes=100000, gastos=20000, anos=3, semente=0,
+          tamanho_lote=LINHAS_POR_LOTE, engine=None, progresso=None):
+    """
+    Cria frota, clientes, locações e gastos sintéticos com INSERTs em lote.
+
+    Pode ser executado num banco com dados: os novos carros e clientes
+    recebem ids e placas/telefones depois dos existentes.
+
+    Args:
+        carros, clientes, locacoes, gastos: Quantidades a criar
+        anos: Anos de histórico (as locações vão até DIAS_FUTURO dias à frente)
+        semente: Semente do gerador (mesma semente = mesmos dados)
+        tamanho_lote: Linhas por INSERT/transação
+        engine: Engine do banco (padrão: o do app)
+        progresso: Função chamada com o total de linhas gravadas após cada lote
+
+    Returns:
+        dict: Quantidades criadas, segundos e linhas por segundo
+    """
+    if locacoes and not (carros and clientes):
+        raise ValueError('Locações sintéticas precisam de pelo menos um carro e um cliente.')
+    engine = engine or db.engine
+    inicio_execucao = time.perf_counter()
+    aleatorio = random.Random(semente)
+    hoje = date.today()
+    agora = datetime.utcnow()
+    inicio, fim = hoje - timedelta(days=365 * anos), hoje + timedelta(days=DIAS_FUTURO)
+
+    with engine.connect() as conexao:
+        primeiro_carro = (conexao.execute(select(func.max(Carro.id))).scalar() or 0) + 1
+        primeiro_cliente = (conexao.execute(select(func.max(Cliente.id))).scalar() or 0) + 1
+
+    gravador = _Gravador(engine, tamanho_lote, progresso)
+
+    # Frota
+    frota = []  # (id, categoria, diária)
+    for numero in range(carros):
+        carro_id = primeiro_carro + numero
+        categoria = _sortear(aleatorio, FROTA)
+        _, modelos, (diaria_minima, diaria_maxima) = FROTA[categoria]
+        diaria = float(aleatorio.randrange(diaria_minima, diaria_maxima + 1, 5))
+        criado = _momento(inicio - timedelta(days=aleatorio.randrange(365)), aleatorio, agora)
+        frota.append((carro_id, categoria, diaria))
+        gravador.adicionar(Carro.__table__, {
+            'id': carro_id, 'modelo': aleatorio.choice(modelos), 'placa': _placa(carro_id),
+            'cor': aleatorio.choice(CORES), 'categoria': categoria,
+            'quilometragem': aleatorio.randrange(5000, 120000), 'valor_diaria': diaria,
+            'ativo': aleatorio.random() > 0.01, 'em_manutencao': aleatorio.random() < 0.02,
+            'created_at': criado, 'updated_at': criado,
+        })
+
+    # Clientes
+    for numero in range(clientes):
+        cliente_id = primeiro_cliente + numero
+        nome = f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}"
+        criado = _momento(inicio + timedelta(days=aleatorio.randrange(max(1, (hoje - inicio).days))), aleatorio, agora)
+        gravador.adicionar(Cliente.__table__, {
+            'id': cliente_id, 'nome': nome, 'nome_normalizado': normalizar_nome(nome),
+            'whatsapp': f"+55{DDDS[cliente_id % len(DDDS)]}9{cliente_id:08d}",
+            'created_at': criado, 'updated_at': criado,
+        })
+
+    # Locações: sequência sem sobreposição por carro, clientes frequentes com mais locações
+    por_carro, sobra = divmod(locacoes, carros) if carros else (0, 0)
+    criadas_locacoes = 0
+    for posicao, (carro_id, categoria, diaria) in enumerate(frota):
+        quantidade = por_carro + (1 if posicao < sobra else 0)
+        for retirada, devolucao in _sequencia_locacoes(aleatorio, quantidade, inicio, fim):
+            status = _status(aleatorio, retirada, devolucao, hoje)
+            dias = (devolucao - retirada).days + 1
+            valor_total = round(diaria * dias, 2)
+            criado = _momento(retirada - timedelta(days=aleatorio.randrange(0, 30)), aleatorio, agora)
+            alterado = _momento(min(devolucao, hoje), aleatorio, agora) if status != 'ativa' else criado
+            gravador.adicionar(Locacao.__table__, {
+                'carro_id': carro_id,
+                'cliente_id': primeiro_cliente + int(clientes * aleatorio.random() ** 2),
+                'data_retirada': retirada, 'data_devolucao': devolucao, 'valor_total': valor_total,
+                'status': status, 'created_at': criado, 'updated_at': max(criado, alterado),
+            })
+            gravador.somar_resumo((chave_mes(retirada), categoria, status), receita=valor_total, locacoes=1)
+            criadas_locacoes += 1
+
+    # Gastos
+    for _ in range(gastos if frota else 0):
+        carro_id, categoria, _ = aleatorio.choice(frota)
+        tipo = _sortear(aleatorio, GASTOS)
+        _, descricoes, (valor_minimo, valor_maximo) = GASTOS[tipo]
+        data_gasto = inicio + timedelta(days=aleatorio.randrange(max(1, (hoje - inicio).days + 1)))
+        valor = float(aleatorio.randrange(valor_minimo, valor_maximo + 1))
+        criado = _momento(data_gasto, aleatorio, agora)
+        gravador.adicionar(Gasto.__table__, {
+            'carro_id': carro_id, 'tipo': tipo, 'descricao': aleatorio.choice(descricoes), 'valor': valor,
+            'data_gasto': data_gasto, 'created_at': criado, 'updated_at': criado,
+        })
+        gravador.somar_resumo((chave_mes(data_gasto), categoria, STATUS_DESPESA), despesas=valor, gastos=1)
+
+    gravador.gravar()
+    with engine.begin() as conexao:
+        atualizar_estatisticas(conexao)
+
+    # INSERTs em lote não passam pelos eventos da sessão
+    indice_disponibilidade.invalidar()
+    tabela_tarifas.invalidar()
+    versao_dados.incrementar()
+
+    segundos = time.perf_counter() - inicio_execucao
+    return {
+        'carros': carros,
+        'clientes': clientes,
+        'locacoes': criadas_locacoes,
+        'gastos': gastos if frota else 0,
+        'linhas': gravador.total,
+        'segundos': round(segundos, 1),
+        'linhas_por_segundo': round(gravador.total / segundos) if segundos > 0 else None,
+    }
@@ -0,0 +1,247 @@
+"""
+Índice em memória de disponibilidade da frota.
+
+Mantém, por carro, os períodos das locações ativas ordenados pela data de
+retirada, junto com o máximo acumulado das datas de devolução. Uma consulta de
+sobreposição localiza por busca binária as locações que começam até o fim do
+período pedido e descarta todas de uma vez quando nenhuma termina depois do
+início, resolvendo o caso comum em O(log n) sem ir ao banco.
+
+O índice é atualizado a cada commit desta aplicação (eventos da sessão) e
+recarregado quando a versão dos dados compartilhada entre os workers indica
+uma escrita feita por outro processo. O banco continua sendo a autoridade
+final: `reservas.reservar()` repete a checagem na transação travada do commit.
+"""
+
+import threading
+from bisect import bisect_right, insort
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import db, Carro, Locacao
+from cache_dashboard import versao_dados
+
+
+_CHAVE_PENDENTES = 'disponibilidade_pendentes'
+
+
+class PeriodosCarro:
+    """Períodos ativos de um carro, ordenados por data de retirada."""
+
+    __slots__ = ('periodos', 'max_fim')
+
+    def __init__(self):
+        self.periodos = []  # [(data_retirada, data_devolucao, locacao_id), ...]
+        self.max_fim = []   # max_fim[i] = maior data_devolucao em periodos[:i + 1]
+
+    def _recalcular_max(self, inicio=0):
+        maior = self.max_fim[inicio - 1] if inicio > 0 else None
+        del self.max_fim[inicio:]
+        for _, fim, _ in self.periodos[inicio:]:
+            maior = fim if maior is None or fim > maior else maior
+            self.max_fim.append(maior)
+
+    def adicionar(self, inicio, fim, locacao_id):
+        periodo = (inicio, fim, locacao_id)
+        insort(self.periodos, periodo)
+        self._recalcular_max(self.periodos.index(periodo))
+
+    def remover(self, locacao_id):
+        for posicao, (_, _, atual_id) in enumerate(self.periodos):
+            if atual_id == locacao_id:
+                del self.periodos[posicao]
+                self._recalcular_max(posicao)
+                return
+
+    def conflito(self, inicio, fim, ignorar_id=None):
+        """Retorna o id de uma locação que se sobrepõe a [inicio, fim], ou None."""
+        # Candidatas: locações que começam até o fim do período pedido
+        limite = bisect_right(self.periodos, fim, key=lambda periodo: periodo[0])
+        posicao = limite - 1
+        while posicao >= 0 and self.max_fim[posicao] >= inicio:
+            _, fim_existente, locacao_id = self.periodos[posicao]
+            if fim_existente >= inicio and locacao_id != ignorar_id:
+                return locacao_id
+            posicao -= 1
+        return None
+
+
+class IndiceDisponibilidade:
+    """Índice de disponibilidade da frota deste processo."""
+
+    def __init__(self, versao=None):
+        self.versao = versao or versao_dados
+        self.carros = {}      # carro_id -> {'modelo', 'placa', 'ativo', 'em_manutencao'}
+        self.periodos = {}    # carro_id -> PeriodosCarro
+        self.locacoes = {}    # locacao_id -> carro_id
+        self.versao_carregada = None
+        self.recargas = 0
+        self.consultas = 0    # leituras (as que exigiram recarga contam também em recargas)
+        self._lock = threading.RLock()
+        self.versao.ao_incrementar(self._ao_incrementar_versao)
+
+    # ------------------------------------------------------------------ carga
+
+    def carregar(self):
+        """Recarrega carros e locações ativas do banco (duas consultas)."""
+        versao = self.versao.atual()
+        carros = db.session.execute(
+            select(Carro.id, Carro.modelo, Carro.placa, Carro.ativo, Carro.em_manutencao)
+        ).all()
+        locacoes = db.session.execute(
+            select(Locacao.id, Locacao.carro_id, Locacao.data_retirada, Locacao.data_devolucao)
+            .where(Locacao.status == 'ativa')
+            .order_by(Locacao.carro_id, Locacao.data_retirada)
+        ).all()
+
+        novos_carros = {
+            carro_id: {'modelo': modelo, 'placa': placa, 'ativo': ativo, 'em_manutencao': em_manutencao}
+            for carro_id, modelo, placa, ativo, em_manutencao in carros
+        }
+        novos_periodos = {}
+        novas_locacoes = {}
+        for locacao_id, carro_id, inicio, fim in locacoes:
+            periodos = novos_periodos.setdefault(carro_id, PeriodosCarro())
+            periodos.periodos.append((inicio, fim, locacao_id))
+            novas_locacoes[locacao_id] = carro_id
+        for periodos in novos_periodos.values():
+            periodos.periodos.sort()
+            periodos._recalcular_max()
+
+        with self._lock:
+            self.carros = novos_carros
+            self.periodos = novos_periodos
+            self.locacoes = novas_locacoes
+            self.versao_carregada = versao
+            self.recargas += 1
+
+    def _garantir_atualizado(self):
+        self.consultas += 1
+        if self.versao_carregada is None or self.versao.atual() != self.versao_carregada:
+            self.carregar()
+
+    def _ao_incrementar_versao(self, anterior, nova):
+        # Escrita deste processo: já aplicada via eventos da sessão
+        with self._lock:
+            if self.versao_carregada == anterior:
+                self.versao_carregada = nova
+
+    def invalidar(self):
+        """
+        Força a recarga na próxima consulta.
+
+        Usado após escritas em massa feitas fora da sessão ORM (importação,
+        UPDATEs em lote), que não passam pelos eventos do flush. Deve ser
+        chamado antes de `versao_dados.incrementar()`.
+        """
+        with self._lock:
+            self.versao_carregada = None
+
+    # ----------------------------------------------------------- atualização
+
+    def registrar_locacao(self, locacao_id, carro_id, inicio, fim, status):
+        """Insere, move ou remove uma locação conforme seu status atual."""
+        with self._lock:
+            carro_anterior = self.locacoes.pop(locacao_id, None)
+            if carro_anterior is not None:
+                self.periodos[carro_anterior].remover(locacao_id)
+            if status == 'ativa' and inicio is not None and fim is not None:
+                self.periodos.setdefault(carro_id, PeriodosCarro()).adicionar(inicio, fim, locacao_id)
+                self.locacoes[locacao_id] = carro_id
+
+    def remover_locacao(self, locacao_id):
+        """Remove uma locação do índice (excluída do banco)."""
+        self.registrar_locacao(locacao_id, None, None, None, None)
+
+    def registrar_carro(self, carro_id, modelo, placa, ativo, em_manutencao):
+        """Atualiza os dados de um carro usados nas mensagens e na checagem de manutenção."""
+        with self._lock:
+            self.carros[carro_id] = {
+                'modelo': modelo, 'placa': placa, 'ativo': ativo, 'em_manutencao': em_manutencao
+            }
+
+    # --------------------------------------------------------------- consulta
+
+    def carro(self, carro_id):
+        """Dados em memória do carro (modelo, placa, ativo, em_manutencao) ou None."""
+        self._garantir_atualizado()
+        return self.carros.get(carro_id)
+
+    def verificar(self, carro_id, data_retirada, data_devolucao, locacao_id=None):
+        """
+        Verifica a disponibilidade do carro sem acessar o banco.
+
+        Args:
+            carro_id: ID do carro
+            data_retirada: Data de retirada
+            data_devolucao: Data de devolução
+            locacao_id: ID da locação atual (para edição, excluir da verificação)
+
+        Returns:
+            (bool, str): (disponivel, mensagem_erro)
+        """
+        self._garantir_atualizado()
+
+        with self._lock:
+            carro = self.carros.get(carro_id)
+            if carro is None:
+                return False, "Carro não encontrado."
+
+            if carro['em_manutencao']:
+                return False, (
+                    f"O carro {carro['modelo']} - {carro['placa']} está em manutenção "
+                    f"e não pode ser alugado."
+                )
+
+            if data_devolucao < data_retirada:
+                return False, "A data de devolução não pode ser anterior à data de retirada."
+
+            periodos = self.periodos.get(carro_id)
+            if periodos is not None and periodos.conflito(data_retirada, data_devolucao, locacao_id):
+                return False, f"O carro {carro['modelo']} - {carro['placa']} já está alugado neste período."
+
+        return True, ""
+
+
+indice_disponibilidade = IndiceDisponibilidade()
+
+
+# ============================================================================
+# SINCRONIZAÇÃO COM A SESSÃO
+# ============================================================================
+
+@event.listens_for(Session, 'after_flush')
+def _coletar_alteracoes(session, flush_context):
+    """Guarda as locações e carros gravados para aplicar no índice após o commit."""
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, {})
+
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Locacao):
+            pendentes[('locacao', obj.id)] = (
+                obj.carro_id, obj.data_retirada, obj.data_devolucao, obj.status or 'ativa'
+            )
+        elif isinstance(obj, Carro):
+            pendentes[('carro', obj.id)] = (obj.modelo, obj.placa, obj.ativo, obj.em_manutencao)
+
+    for obj in session.deleted:
+        if isinstance(obj, Locacao):
+            pendentes[('locacao', obj.id)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_alteracoes(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if not pendentes:
+        return
+
+    for (tipo, chave), dados in pendentes.items():
+        if tipo == 'carro':
+            indice_disponibilidade.registrar_carro(chave, *dados)
+        elif dados is None:
+            indice_disponibilidade.remover_locacao(chave)
+        else:
+            indice_disponibilidade.registrar_locacao(chave, *dados)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
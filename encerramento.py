@@ -0,0 +1,189 @@
+"""
+Encerramento automático de locações vencidas.
+
+Uma locação só sai de 'ativa' quando alguém clica em finalizar; as esquecidas
+ficam para sempre no conjunto de locações ativas que o dashboard, a checagem
+de disponibilidade e o status da frota percorrem. Aqui as locações ativas com
+devolução já passada viram 'finalizada' com um único UPDATE em lote, na mesma
+transação que:
+
+    - ajusta o resumo mensal (as locações passam de 'ativa' para 'finalizada'
+      em cada mês/categoria; o UPDATE em lote não passa pelos eventos do flush)
+    - grava em `encerramentos_automaticos` quais locações foram encerradas
+
+Execução repetida ou simultânea é segura: o UPDATE só alcança linhas ainda
+ativas, então quem chega depois encerra zero locações e nada é registrado.
+
+Uso:
+    flask --app app encerrar-vencidas --simular
+    flask --app app encerrar-vencidas           # cron, ex.: 5 0 * * *
+    flask --app app encerramentos               # últimas execuções
+    ENCERRAMENTO_AUTOMATICO_MINUTOS=60          # ou: thread em cada worker
+"""
+
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, select, update
+from models import db, Carro, Locacao, EncerramentoAutomatico
+from consultas import consulta_locacoes_vencidas
+from resumo_mensal import aplicar_no_resumo, chave_mes
+from disponibilidade import indice_disponibilidade
+from cache_dashboard import versao_dados
+
+
+TOLERANCIA_DIAS = 0  # dias de atraso tolerados antes do encerramento
+
+
+def data_limite(data_referencia=None, tolerancia_dias=TOLERANCIA_DIAS):
+    """Locações ativas com devolução anterior a esta data estão vencidas."""
+    return (data_referencia or date.today()) - timedelta(days=tolerancia_dias)
+
+
+def _deltas_resumo(conexao, encerradas):
+    """Deltas do resumo mensal: cada locação sai de 'ativa' e entra em 'finalizada'."""
+    carro_ids = {carro_id for _, carro_id, _, _ in encerradas}
+    categorias = dict(conexao.execute(
+        select(Carro.id, Carro.categoria).where(Carro.id.in_(carro_ids))
+    ).all())
+
+    deltas = defaultdict(lambda: (0.0, 0.0, 0, 0))
+    for _, carro_id, data_retirada, valor_total in encerradas:
+        mes, categoria = chave_mes(data_retirada), categorias.get(carro_id) or 'Sem categoria'
+        valor = valor_total or 0.0
+        receita, despesas, quantidade, gastos = deltas[(mes, categoria, 'ativa')]
+        deltas[(mes, categoria, 'ativa')] = (receita - valor, despesas, quantidade - 1, gastos)
+        receita, despesas, quantidade, gastos = deltas[(mes, categoria, 'finalizada')]
+        deltas[(mes, categoria, 'finalizada')] = (receita + valor, despesas, quantidade + 1, gastos)
+    return deltas
+
+
+def encerrar_vencidas(data_referencia=None, tolerancia_dias=TOLERANCIA_DIAS, simular=False, origem='cli'):
+    """
+    Finaliza, num único UPDATE, as locações ativas com devolução vencida.
+
+    Args:
+        data_referencia: Data considerada como hoje (padrão: hoje)
+        tolerancia_dias: Dias de atraso tolerados após a devolução
+        simular: Apenas conta as locações vencidas, sem gravar
+        origem: Quem disparou a execução ('cli', 'agendador'), gravado no registro
+
+    Returns:
+        dict: Data limite, locações encerradas (ids) e segundos
+    """
+    inicio = time.perf_counter()
+    limite = data_limite(data_referencia, tolerancia_dias)
+    relatorio = {'data_limite': limite, 'encerradas': 0, 'locacao_ids': []}
+
+    if simular:
+        relatorio['encerradas'] = consulta_locacoes_vencidas(limite).count()
+        db.session.rollback()
+        relatorio['segundos'] = round(time.perf_counter() - inicio, 3)
+        return relatorio
+
+    tabela = Locacao.__table__
+    vencidas = (tabela.c.status == 'ativa', tabela.c.data_devolucao < limite)
+    colunas = (tabela.c.id, tabela.c.carro_id, tabela.c.data_retirada, tabela.c.valor_total)
+    agora = datetime.utcnow()
+    comando = update(tabela).where(*vencidas).values(status='finalizada', updated_at=agora)
+
+    with db.engine.begin() as conexao:
+        if conexao.dialect.update_returning:
+            encerradas = conexao.execute(comando.returning(*colunas)).all()
+        else:
+            # Sem UPDATE ... RETURNING: mesma seleção, travada, na mesma transação
+            encerradas = conexao.execute(select(*colunas).where(*vencidas).with_for_update()).all()
+            conexao.execute(comando)
+
+        if encerradas:
+            aplicar_no_resumo(conexao, _deltas_resumo(conexao, encerradas))
+            ids = sorted(locacao_id for locacao_id, _, _, _ in encerradas)
+            conexao.execute(insert(EncerramentoAutomatico.__table__).values(
+                executado_em=agora, data_limite=limite, quantidade=len(ids),
+                locacao_ids=','.join(str(locacao_id) for locacao_id in ids), origem=origem
+            ))
+            relatorio['locacao_ids'] = ids
+
+    if encerradas:
+        indice_disponibilidade.invalidar()
+        versao_dados.incrementar()
+    relatorio['encerradas'] = len(encerradas)
+    relatorio['segundos'] = round(time.perf_counter() - inicio, 3)
+    return relatorio
+
+
+def ultimas_execucoes(limite=10):
+    """Registros mais recentes do encerramento automático."""
+    return EncerramentoAutomatico.query.order_by(
+        EncerramentoAutomatico.executado_em.desc(), EncerramentoAutomatico.id.desc()
+    ).limit(limite).all()
+
+
+# ============================================================================
+# AGENDADOR EM PROCESSO
+# ============================================================================
+
+class AgendadorEncerramento:
+    """
+    Thread daemon que executa `encerrar_vencidas` a cada intervalo.
+
+    Cada worker do gunicorn tem a sua; a primeira execução é sorteada dentro
+    do primeiro minuto para que os workers não disputem a mesma escrita.
+    """
+
+    def __init__(self):
+        self.intervalo = None
+        self.execucoes = 0
+        self.ultima_execucao = None
+        self.ultimo_erro = None
+        self._thread = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self, app, intervalo_minutos, tolerancia_dias=TOLERANCIA_DIAS):
+        """Inicia a thread deste processo (uma vez; chamadas seguintes não fazem nada)."""
+        if self.ativo:
+            return
+        with self._lock:
+            if self.ativo:
+                return
+            self.intervalo = intervalo_minutos * 60
+            self._parar.clear()
+            self._thread = threading.Thread(
+                target=self._executar, args=(app, tolerancia_dias),
+                name='encerramento-vencidas', daemon=True
+            )
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _executar(self, app, tolerancia_dias):
+        espera = random.uniform(1, 60)
+        while not self._parar.wait(espera):
+            with app.app_context():
+                try:
+                    relatorio = encerrar_vencidas(tolerancia_dias=tolerancia_dias, origem='agendador')
+                    self.ultimo_erro = None
+                    if relatorio['encerradas']:
+                        app.logger.info(
+                            "Encerramento automático: %d locação(ões) vencida(s) finalizada(s)",
+                            relatorio['encerradas']
+                        )
+                except Exception as erro:  # a thread não pode morrer por uma falha do banco
+                    self.ultimo_erro = str(erro)
+                    app.logger.exception("Falha no encerramento automático de locações vencidas")
+                finally:
+                    db.session.remove()
+            self.execucoes += 1
+            self.ultima_execucao = datetime.utcnow()
+            espera = self.intervalo
+
+
+agendador = AgendadorEncerramento()
@@ -0,0 +1,444 @@
+"""
+Geradores das exportações (SQL, CSV e JSON) em streaming.
+
+Cada gerador percorre as tabelas com cursores do lado do servidor
+(`yield_per`), traz carro e cliente de cada locação no mesmo SELECT e devolve
+o arquivo em blocos de bytes. A memória usada fica constante, qualquer que
+seja o tamanho das tabelas, e o primeiro byte sai assim que a primeira linha
+é lida.
+
+As locações vêm das duas tabelas, a principal e o arquivo
+(`locacoes_arquivo`): primeiro as arquivadas, depois as demais.
+"""
+
+import csv
+import io
+import json
+import textwrap
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import select
+from models import db, Carro, Cliente, Locacao, LocacaoArquivada, Gasto
+from consultas import consulta_alteracoes
+
+
+LINHAS_POR_LOTE = 1000
+TAMANHO_BLOCO = 64 * 1024
+
+
+def _em_lotes(statement, tamanho_lote=LINHAS_POR_LOTE):
+    """Executa a consulta com cursor de servidor, lendo `tamanho_lote` linhas por vez."""
+    return db.session.execute(statement.execution_options(yield_per=tamanho_lote))
+
+
+def _em_blocos(partes, codificacao='utf-8'):
+    """Agrupa pedaços de texto em blocos de bytes de ~TAMANHO_BLOCO."""
+    buffer = []
+    tamanho = 0
+    for parte in partes:
+        buffer.append(parte)
+        tamanho += len(parte)
+        if tamanho >= TAMANHO_BLOCO:
+            yield ''.join(buffer).encode(codificacao)
+            buffer = []
+            tamanho = 0
+    if buffer:
+        yield ''.join(buffer).encode(codificacao)
+
+
+# Arquivo primeiro: as locações arquivadas são as mais antigas
+MODELOS_LOCACAO = (LocacaoArquivada, Locacao)
+
+
+def consulta_locacoes_completa(modelo=Locacao):
+    """Locações com modelo/placa/diária do carro e nome/WhatsApp do cliente (um JOIN)."""
+    return (
+        select(
+            modelo.id, modelo.carro_id, modelo.cliente_id,
+            modelo.data_retirada, modelo.data_devolucao, modelo.valor_total,
+            modelo.status, modelo.observacoes, modelo.created_at,
+            Carro.modelo, Carro.placa, Carro.valor_diaria,
+            Cliente.nome, Cliente.whatsapp
+        )
+        .join(Carro, Carro.id == modelo.carro_id)
+        .join(Cliente, Cliente.id == modelo.cliente_id)
+        .order_by(modelo.id)
+    )
+
+
+def locacoes_completas():
+    """Linhas de `consulta_locacoes_completa()` das duas tabelas, em lotes."""
+    for modelo in MODELOS_LOCACAO:
+        yield from _em_lotes(consulta_locacoes_completa(modelo))
+
+
+def nome_arquivo(prefixo, extensao):
+    """Nome do arquivo exportado com data e hora."""
+    return f"{prefixo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extensao}"
+
+
+# ============================================================================
+# SQL
+# ============================================================================
+
+# Dump completo para restauração: todas as tabelas e colunas, na ordem das
+# chaves estrangeiras. Restaure num banco vazio criado com
+# `flask --app app init-db --no-seed`.
+
+# Tabelas novas entram no dump sozinhas; aqui só o que o banco de destino já
+# tem (as versões de schema gravadas pelo próprio init-db)
+TABELAS_FORA_DO_DUMP = {'schema_versao'}
+
+LINHAS_POR_INSERT = 500
+LINHAS_POR_TRANSACAO = 10000
+
+FORMATOS_SQL = ('insert', 'copy')
+
+# Mesmo formato que o SQLAlchemy grava no SQLite (sempre com microssegundos),
+# para que comparações de texto entre datas restauradas e novas continuem valendo
+FORMATO_DATA_HORA = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def _literal_sql(valor):
+    """Valor como literal SQL portável (SQLite, PostgreSQL, MySQL)."""
+    if valor is None:
+        return 'NULL'
+    if isinstance(valor, bool):
+        return 'TRUE' if valor else 'FALSE'
+    if isinstance(valor, (int, float)):
+        return repr(valor)
+    if isinstance(valor, datetime):
+        return f"'{valor.strftime(FORMATO_DATA_HORA)}'"
+    if isinstance(valor, date):
+        return f"'{valor.isoformat()}'"
+    return "'" + str(valor).replace("'", "''") + "'"
+
+
+_ESCAPES_COPY = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _literal_copy(valor):
+    """Valor no formato texto do COPY do PostgreSQL."""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    if isinstance(valor, datetime):
+        return valor.strftime(FORMATO_DATA_HORA)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor).translate(_ESCAPES_COPY)
+
+
+def _cabecalho_sql(formato):
+    yield "-- Exportação de dados da Locadora\n"
+    yield f"-- Data: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    if formato == 'copy':
+        yield "-- Formato: PostgreSQL COPY (restaure com: psql -f arquivo.sql)\n"
+    else:
+        yield f"-- Formato: INSERT com {LINHAS_POR_INSERT} linhas por comando, transações de {LINHAS_POR_TRANSACAO} linhas\n"
+    yield "-- Restaure num banco vazio (flask --app app init-db --no-seed)\n"
+
+
+def _titulo_tabela(nome):
+    yield "\n"
+    yield "-- ============================================\n"
+    yield f"-- TABELA: {nome.upper()}\n"
+    yield "-- ============================================\n"
+    yield "\n"
+
+
+def _linhas_tabela(tabela):
+    return _em_lotes(select(tabela).order_by(*tabela.primary_key.columns))
+
+
+def _inserts_tabela(tabela):
+    """INSERTs de várias linhas, em transações de LINHAS_POR_TRANSACAO linhas."""
+    prefixo = f"INSERT INTO {tabela.name} ({', '.join(coluna.name for coluna in tabela.columns)}) VALUES\n"
+    valores = []
+    linhas_na_transacao = 0
+
+    def comando():
+        return prefixo + ',\n'.join(valores) + ';\n'
+
+    for linha in _linhas_tabela(tabela):
+        if linhas_na_transacao == 0:
+            yield "BEGIN;\n"
+        valores.append('(' + ', '.join(_literal_sql(valor) for valor in linha) + ')')
+        linhas_na_transacao += 1
+        if len(valores) == LINHAS_POR_INSERT:
+            yield comando()
+            valores = []
+        if linhas_na_transacao == LINHAS_POR_TRANSACAO:
+            if valores:
+                yield comando()
+                valores = []
+            yield "COMMIT;\n"
+            linhas_na_transacao = 0
+
+    if valores:
+        yield comando()
+    if linhas_na_transacao:
+        yield "COMMIT;\n"
+
+
+def _copy_tabela(tabela):
+    """Bloco `COPY ... FROM stdin` com as linhas separadas por tabulação."""
+    colunas = ', '.join(coluna.name for coluna in tabela.columns)
+    yield f"COPY {tabela.name} ({colunas}) FROM stdin;\n"
+    for linha in _linhas_tabela(tabela):
+        yield '\t'.join(_literal_copy(valor) for valor in linha) + '\n'
+    yield "\\.\n"
+
+
+def tabelas_dump():
+    """Tabelas do dump, pais antes dos filhos (chaves estrangeiras)."""
+    return [tabela for tabela in db.metadata.sorted_tables if tabela.name not in TABELAS_FORA_DO_DUMP]
+
+
+def _ajustar_sequencias():
+    """Depois do COPY com IDs explícitos, avança as sequências do PostgreSQL."""
+    yield "\n-- Sequências dos IDs\n"
+    for tabela in tabelas_dump():
+        if 'id' in tabela.c and tabela.c.id.autoincrement in (True, 'auto'):
+            yield (
+                f"SELECT setval(pg_get_serial_sequence('{tabela.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {tabela.name}), 0) + 1, false);\n"
+            )
+
+
+def _linhas_sql(formato='insert'):
+    yield from _cabecalho_sql(formato)
+    if formato == 'copy':
+        yield "\nBEGIN;\n"
+
+    for tabela in tabelas_dump():
+        yield from _titulo_tabela(tabela.name)
+        yield from (_copy_tabela(tabela) if formato == 'copy' else _inserts_tabela(tabela))
+
+    if formato == 'copy':
+        yield from _ajustar_sequencias()
+        yield "\nCOMMIT;\n"
+
+
+def gerar_sql(formato='insert'):
+    """
+    Dump SQL completo (todas as tabelas e colunas) em blocos de bytes.
+
+    Args:
+        formato: 'insert' (INSERTs de várias linhas, portável) ou 'copy'
+                 (COPY FROM stdin do PostgreSQL, a carga mais rápida)
+    """
+    return _em_blocos(_linhas_sql(formato))
+
+
+# ============================================================================
+# CSV
+# ============================================================================
+
+CABECALHO_CSV = [
+    'ID', 'Carro', 'Placa', 'Cliente', 'WhatsApp',
+    'Data Retirada', 'Data Devolução', 'Dias',
+    'Valor Diária', 'Valor Total', 'Status', 'Data Criação'
+]
+
+
+def _linhas_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def linha(valores):
+        writer.writerow(valores)
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto
+
+    yield '\ufeff'  # BOM para Excel
+    yield linha(CABECALHO_CSV)
+
+    for registro in locacoes_completas():
+        dias = (registro.data_devolucao - registro.data_retirada).days + 1
+        yield linha([
+            registro.id,
+            registro.modelo,
+            registro.placa,
+            registro.nome,
+            registro.whatsapp or '',
+            registro.data_retirada.strftime('%d/%m/%Y'),
+            registro.data_devolucao.strftime('%d/%m/%Y'),
+            dias,
+            registro.valor_diaria,
+            registro.valor_total,
+            registro.status,
+            registro.created_at.strftime('%d/%m/%Y %H:%M:%S') if registro.created_at else ''
+        ])
+
+
+def gerar_csv():
+    """Exportação CSV das locações em blocos de bytes."""
+    return _em_blocos(_linhas_csv())
+
+
+# ============================================================================
+# JSON
+# ============================================================================
+
+def _json_item(objeto):
+    return textwrap.indent(json.dumps(objeto, ensure_ascii=False, indent=2), '    ')
+
+
+def _lista_json(chave, itens, ultima=False):
+    """Escreve `"chave": [ ... ]` item a item."""
+    yield f'  "{chave}": [\n'
+    primeiro = True
+    for item in itens:
+        if not primeiro:
+            yield ',\n'
+        yield _json_item(item)
+        primeiro = False
+    yield '\n  ]\n' if ultima else '\n  ],\n'
+
+
+def locacao_para_json(registro):
+    """Converte uma linha de `consulta_locacoes_completa()` no formato da exportação JSON."""
+    return {
+        'id': registro.id,
+        'carro': registro.modelo,
+        'placa': registro.placa,
+        'cliente': registro.nome,
+        'whatsapp': registro.whatsapp,
+        'data_retirada': registro.data_retirada.isoformat(),
+        'data_devolucao': registro.data_devolucao.isoformat(),
+        'valor_total': registro.valor_total,
+        'status': registro.status,
+        'created_at': registro.created_at.isoformat() if registro.created_at else None
+    }
+
+
+def _linhas_json():
+    cabecalho = {'data': datetime.now().isoformat(), 'versao': '1.0'}
+    yield '{\n'
+    yield '  "exportacao": '
+    yield textwrap.indent(json.dumps(cabecalho, ensure_ascii=False, indent=2), '  ').lstrip()
+    yield ',\n'
+
+    carros = (carro.to_dict() for carro in _em_lotes(select(Carro).order_by(Carro.id)).scalars())
+    yield from _lista_json('carros', carros)
+
+    clientes = (cliente.to_dict() for cliente in _em_lotes(select(Cliente).order_by(Cliente.id)).scalars())
+    yield from _lista_json('clientes', clientes)
+
+    locacoes = (locacao_para_json(registro) for registro in locacoes_completas())
+    yield from _lista_json('locacoes', locacoes, ultima=True)
+    yield '}\n'
+
+
+def gerar_json():
+    """Exportação JSON completa em blocos de bytes."""
+    return _em_blocos(_linhas_json())
+
+
+# ============================================================================
+# ALTERAÇÕES (EXPORTAÇÃO INCREMENTAL)
+# ============================================================================
+# Só as linhas criadas ou alteradas depois da marca (`updated_at`) anterior. O
+# custo de cada sincronização depende do volume de mudanças, não do tamanho do
+# histórico.
+
+# A marca devolvida fica alguns segundos atrás do relógio: uma escrita gravada
+# com updated_at logo antes da exportação, mas confirmada (COMMIT) logo depois,
+# ainda entra na próxima sincronização.
+MARGEM_MARCA = timedelta(seconds=5)
+
+# Locações arquivadas saem na mesma lista das demais (com `arquivada_em`).
+# Locações e gastos levam também as chaves naturais do carro (placa) e do
+# cliente (nome e WhatsApp): quem importa o arquivo em outro banco resolve as
+# referências mesmo quando o carro ou o cliente não mudou no período
+TABELAS_ALTERACOES = (
+    ('carros', (Carro,)),
+    ('clientes', (Cliente,)),
+    ('locacoes', (Locacao, LocacaoArquivada)),
+    ('gastos', (Gasto,)),
+)
+
+
+def ler_marca(valor):
+    """
+    Converte a marca recebida (ISO 8601) em datetime.
+
+    Marcas com fuso (`...Z`, `...-03:00`) são convertidas para UTC sem fuso,
+    como as colunas `updated_at`.
+
+    Returns:
+        datetime ou None: None se vazia
+
+    Raises:
+        ValueError: Se a marca for inválida
+    """
+    if not valor:
+        return None
+    marca = datetime.fromisoformat(valor)
+    if marca.tzinfo is not None:
+        marca = marca.astimezone(timezone.utc).replace(tzinfo=None)
+    return marca
+
+
+def _valor_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def linha_para_json(linha):
+    """Todas as colunas da linha, com datas em ISO 8601."""
+    return {coluna: _valor_json(valor) for coluna, valor in linha._mapping.items()}
+
+
+def _alteracoes_com_chaves(modelo, desde, ate):
+    """`consulta_alteracoes` com placa e cliente (nome, WhatsApp) das referências."""
+    tabela = modelo.__table__
+    consulta = consulta_alteracoes(modelo, desde, ate)
+    if 'carro_id' in tabela.c:
+        consulta = consulta.add_columns(Carro.placa).outerjoin(Carro, Carro.id == tabela.c.carro_id)
+    if 'cliente_id' in tabela.c:
+        consulta = consulta.add_columns(Cliente.nome.label('cliente'), Cliente.whatsapp) \
+            .outerjoin(Cliente, Cliente.id == tabela.c.cliente_id)
+    return consulta
+
+
+def _linhas_alteracoes(desde, ate):
+    cabecalho = {
+        'data': datetime.now().isoformat(),
+        'versao': '1.0',
+        'desde': desde.isoformat() if desde else None,
+        'proxima_marca': ate.isoformat()
+    }
+    yield '{\n'
+    yield '  "exportacao": '
+    yield textwrap.indent(json.dumps(cabecalho, ensure_ascii=False, indent=2), '  ').lstrip()
+    yield ',\n'
+
+    for posicao, (chave, modelos) in enumerate(TABELAS_ALTERACOES):
+        linhas = (
+            linha_para_json(linha)
+            for modelo in modelos
+            for linha in _em_lotes(_alteracoes_com_chaves(modelo, desde, ate))
+        )
+        yield from _lista_json(chave, linhas, ultima=posicao == len(TABELAS_ALTERACOES) - 1)
+    yield '}\n'
+
+
+def gerar_alteracoes(desde=None):
+    """
+    Exportação JSON das linhas criadas/alteradas desde a marca, em blocos de bytes.
+
+    Args:
+        desde: Marca (`proxima_marca`) da sincronização anterior; None exporta tudo
+
+    Returns:
+        (iterator, datetime): (blocos do arquivo, marca para a próxima chamada)
+    """
+    ate = datetime.utcnow() - MARGEM_MARCA
+    if desde and desde > ate:
+        ate = desde
+    return _em_blocos(_linhas_alteracoes(desde, ate)), ate
@@ -0,0 +1,264 @@
+"""
+Exportação colunar (Parquet e Arrow IPC) de locações e gastos para análise.
+
+Diferente do CSV, os tipos vão no próprio arquivo: datas como `date32`,
+momentos como `timestamp[us]` e dinheiro como `decimal128(12, 2)`. Os schemas
+abaixo são fixos (mesmas colunas, na mesma ordem, a cada exportação), então
+notebooks podem ler só as colunas que usam ou mapear o arquivo Arrow em
+memória (`pyarrow.memory_map`) sem converter nada.
+
+As linhas são lidas com cursor do servidor e escritas em grupos de
+LINHAS_POR_GRUPO (row groups no Parquet, record batches no Arrow), então a
+memória usada não depende do tamanho do histórico.
+
+Requer o pacote opcional `pyarrow` (pip install pyarrow).
+
+Uso:
+    flask --app app exportar-colunar exportacoes/
+    flask --app app exportar-colunar exportacoes/ --formato arrow
+"""
+
+from sqlalchemy import select
+from models import db, Carro, Cliente, Locacao, LocacaoArquivada, Gasto
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # dependência opcional
+    pa = pc = pq = None
+
+
+LINHAS_POR_GRUPO = 100_000
+
+FORMATOS = ('parquet', 'arrow')
+CONJUNTOS = ('locacoes', 'gastos')
+
+EXTENSOES = {'parquet': 'parquet', 'arrow': 'arrow'}
+MIMETYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+_COLUNAS_DINHEIRO = ('valor_total', 'valor_diaria', 'valor')
+
+
+class PyarrowIndisponivel(RuntimeError):
+    """O pacote opcional pyarrow não está instalado."""
+
+
+def disponivel():
+    """True se o pyarrow estiver instalado."""
+    return pa is not None
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise PyarrowIndisponivel(
+            "A exportação Parquet/Arrow requer o pacote opcional pyarrow (pip install pyarrow)."
+        )
+
+
+# ============================================================================
+# SCHEMAS E CONSULTAS
+# ============================================================================
+
+def schema(conjunto):
+    """Schema Arrow fixo do conjunto ('locacoes' ou 'gastos')."""
+    _exigir_pyarrow()
+    dinheiro = pa.decimal128(12, 2)
+    momento = pa.timestamp('us')
+
+    if conjunto == 'locacoes':
+        return pa.schema([
+            ('id', pa.int64()),
+            ('carro_id', pa.int64()),
+            ('cliente_id', pa.int64()),
+            ('data_retirada', pa.date32()),
+            ('data_devolucao', pa.date32()),
+            ('dias', pa.int32()),
+            ('valor_total', dinheiro),
+            ('status', pa.string()),
+            ('observacoes', pa.string()),
+            ('created_at', momento),
+            ('updated_at', momento),
+            ('carro_modelo', pa.string()),
+            ('carro_placa', pa.string()),
+            ('carro_categoria', pa.string()),
+            ('valor_diaria', dinheiro),
+            ('cliente_nome', pa.string()),
+            ('cliente_whatsapp', pa.string()),
+        ])
+
+    if conjunto == 'gastos':
+        return pa.schema([
+            ('id', pa.int64()),
+            ('carro_id', pa.int64()),
+            ('tipo', pa.string()),
+            ('descricao', pa.string()),
+            ('valor', dinheiro),
+            ('data_gasto', pa.date32()),
+            ('created_at', momento),
+            ('updated_at', momento),
+            ('carro_modelo', pa.string()),
+            ('carro_placa', pa.string()),
+            ('carro_categoria', pa.string()),
+        ])
+
+    raise ValueError(f"Conjunto desconhecido: {conjunto}")
+
+
+def consulta(conjunto, modelo=Locacao):
+    """
+    SELECT com as colunas do schema (exceto as derivadas, como `dias`), num único JOIN.
+
+    Para 'locacoes', `modelo` escolhe a tabela: Locacao ou LocacaoArquivada.
+    """
+    carro = (
+        Carro.modelo.label('carro_modelo'),
+        Carro.placa.label('carro_placa'),
+        Carro.categoria.label('carro_categoria'),
+    )
+
+    if conjunto == 'locacoes':
+        return (
+            select(
+                modelo.id, modelo.carro_id, modelo.cliente_id,
+                modelo.data_retirada, modelo.data_devolucao,
+                modelo.valor_total, modelo.status, modelo.observacoes,
+                modelo.created_at, modelo.updated_at,
+                *carro,
+                Carro.valor_diaria,
+                Cliente.nome.label('cliente_nome'), Cliente.whatsapp.label('cliente_whatsapp')
+            )
+            .join(Carro, Carro.id == modelo.carro_id)
+            .join(Cliente, Cliente.id == modelo.cliente_id)
+            .order_by(modelo.id)
+        )
+
+    if conjunto == 'gastos':
+        return (
+            select(
+                Gasto.id, Gasto.carro_id, Gasto.tipo, Gasto.descricao, Gasto.valor,
+                Gasto.data_gasto, Gasto.created_at, Gasto.updated_at,
+                *carro
+            )
+            .join(Carro, Carro.id == Gasto.carro_id)
+            .order_by(Gasto.id)
+        )
+
+    raise ValueError(f"Conjunto desconhecido: {conjunto}")
+
+
+# ============================================================================
+# GRUPOS DE LINHAS
+# ============================================================================
+
+def _lote_arrow(esquema, nomes, linhas):
+    """Converte linhas da consulta num RecordBatch com os tipos do schema."""
+    colunas = dict(zip(nomes, zip(*linhas)))
+    arrays = {}
+    for campo in esquema:
+        if campo.name == 'dias':
+            continue
+        valores = colunas[campo.name]
+        if campo.name in _COLUNAS_DINHEIRO:
+            arrays[campo.name] = pc.round(pa.array(valores, pa.float64()), 2).cast(campo.type)
+        else:
+            arrays[campo.name] = pa.array(valores, campo.type)
+
+    if 'dias' in esquema.names:
+        dias = pc.days_between(arrays['data_retirada'], arrays['data_devolucao'])
+        arrays['dias'] = pc.add(dias, 1).cast(pa.int32())
+
+    return pa.record_batch([arrays[nome] for nome in esquema.names], schema=esquema)
+
+
+def lotes(conjunto, linhas_por_grupo=LINHAS_POR_GRUPO):
+    """Gera RecordBatches de até `linhas_por_grupo` linhas do conjunto."""
+    esquema = schema(conjunto)
+    # Locações: primeiro as arquivadas (as mais antigas), depois as demais
+    if conjunto == 'locacoes':
+        statements = [consulta(conjunto, modelo) for modelo in (LocacaoArquivada, Locacao)]
+    else:
+        statements = [consulta(conjunto)]
+    for statement in statements:
+        resultado = db.session.execute(statement.execution_options(yield_per=linhas_por_grupo))
+        nomes = list(resultado.keys())
+        for particao in resultado.partitions():
+            yield _lote_arrow(esquema, nomes, particao)
+
+
+class _SaidaEmBlocos:
+    """Destino de escrita do pyarrow que acumula os bytes até serem drenados."""
+
+    def __init__(self):
+        self.blocos = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self.blocos.append(dados)
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self):
+        blocos, self.blocos = self.blocos, []
+        return b''.join(blocos)
+
+
+def _escritor(formato, destino, esquema):
+    if formato == 'parquet':
+        return pq.ParquetWriter(destino, esquema, compression='zstd')
+    if formato == 'arrow':
+        return pa.ipc.new_file(destino, esquema)
+    raise ValueError(f"Formato desconhecido: {formato}")
+
+
+def gerar(conjunto, formato='parquet', linhas_por_grupo=LINHAS_POR_GRUPO):
+    """
+    Arquivo Parquet/Arrow do conjunto em blocos de bytes (um por grupo de linhas).
+
+    Args:
+        conjunto: 'locacoes' ou 'gastos'
+        formato: 'parquet' ou 'arrow' (Arrow IPC, mapeável em memória)
+        linhas_por_grupo: Linhas por row group / record batch
+    """
+    _exigir_pyarrow()
+    esquema = schema(conjunto)
+    saida = _SaidaEmBlocos()
+    escritor = _escritor(formato, saida, esquema)
+
+    for lote in lotes(conjunto, linhas_por_grupo):
+        escritor.write_batch(lote)
+        yield saida.drenar()
+
+    escritor.close()
+    yield saida.drenar()
+
+
+def gravar(conjunto, caminho, formato='parquet', linhas_por_grupo=LINHAS_POR_GRUPO):
+    """
+    Grava o conjunto num arquivo local.
+
+    Returns:
+        int: Quantidade de linhas gravadas
+    """
+    _exigir_pyarrow()
+    esquema = schema(conjunto)
+    total = 0
+    with _escritor(formato, caminho, esquema) as escritor:
+        for lote in lotes(conjunto, linhas_por_grupo):
+            escritor.write_batch(lote)
+            total += lote.num_rows
+    return total
@@ -0,0 +1,94 @@
+"""
+Serviços de consulta de status da frota.
+"""
+
+from datetime import date
+from sqlalchemy.orm import contains_eager
+from models import db, Carro, Cliente, Locacao
+
+
+STATUS_DISPONIVEL = 'disponivel'
+STATUS_ALUGADO = 'alugado'
+STATUS_MANUTENCAO = 'manutencao'
+
+
+def consulta_status_frota(data_referencia, carro_ids=None):
+    """
+    Carros com a locação ativa (e o cliente) que cobre a data de referência.
+
+    Returns:
+        Query: Tuplas (Carro, Locacao ou None) em ordem de exibição
+    """
+    cobre_data = db.and_(
+        Locacao.carro_id == Carro.id,
+        Locacao.status == 'ativa',
+        Locacao.data_retirada <= data_referencia,
+        Locacao.data_devolucao >= data_referencia
+    )
+
+    consulta = (
+        db.session.query(Carro, Locacao)
+        .outerjoin(Locacao, cobre_data)
+        .outerjoin(Cliente, Cliente.id == Locacao.cliente_id)
+        .options(contains_eager(Locacao.cliente))
+    )
+
+    if carro_ids is None:
+        consulta = consulta.filter(Carro.ativo.is_(True))
+    else:
+        consulta = consulta.filter(Carro.id.in_(list(carro_ids)))
+
+    return consulta.order_by(Carro.categoria, Carro.modelo, Carro.id, Locacao.data_retirada)
+
+
+def status_frota(data_referencia=None, carro_ids=None):
+    """
+    Resolve o status de toda a frota numa data com uma única consulta.
+
+    Faz um LEFT JOIN dos carros com as locações ativas que cobrem a data de
+    referência (e seus clientes), evitando uma consulta por carro.
+
+    Args:
+        data_referencia: Data usada para o status (padrão: hoje)
+        carro_ids: Restringe a consulta a estes carros (padrão: frota ativa)
+
+    Returns:
+        dict: {carro_id: {'carro': Carro, 'status': str, 'locacao': Locacao ou None}},
+              na ordem de exibição do dashboard (categoria, modelo)
+    """
+    data_referencia = data_referencia or date.today()
+    consulta = consulta_status_frota(data_referencia, carro_ids)
+
+    snapshot = {}
+    for carro, locacao in consulta:
+        # Mais de uma locação cobrindo a data não deveria ocorrer; manter a primeira
+        if carro.id in snapshot:
+            continue
+
+        if locacao is not None:
+            status = STATUS_ALUGADO
+        elif carro.em_manutencao:
+            status = STATUS_MANUTENCAO
+        else:
+            status = STATUS_DISPONIVEL
+
+        snapshot[carro.id] = {
+            'carro': carro,
+            'status': status,
+            'locacao': locacao
+        }
+
+    return snapshot
+
+
+def contar_status(snapshot):
+    """
+    Conta os carros de um snapshot por status (para o gráfico de rosca).
+
+    Returns:
+        dict: {'disponivel': int, 'alugado': int, 'manutencao': int}
+    """
+    contagem = {STATUS_DISPONIVEL: 0, STATUS_ALUGADO: 0, STATUS_MANUTENCAO: 0}
+    for item in snapshot.values():
+        contagem[item['status']] += 1
+    return contagem
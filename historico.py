@@ -0,0 +1,186 @@
+"""
+Histórico de locações com filtros no servidor e paginação por chave (keyset).
+
+A ordenação é (data_retirada, id) decrescente, coberta pelo índice
+`ix_locacoes_historico`; as duas colunas são obrigatórias, então nenhuma linha
+escapa da comparação do cursor. Em vez de OFFSET, cada página começa logo depois da
+última linha da página anterior (cursor), então o custo de qualquer página é o
+mesmo, por mais longo que seja o histórico. Os totais vêm de agregados SQL.
+
+Locações encerradas antigas ficam em `locacoes_arquivo` (ver arquivamento.py),
+com índice equivalente: cada página e cada total consulta as duas tabelas e
+junta os resultados, que chegam na mesma ordem.
+"""
+
+from datetime import datetime
+from models import db, Cliente, Locacao, LocacaoArquivada
+from consultas import consulta_historico, eager_carro_cliente
+
+
+POR_PAGINA_PADRAO = 50
+POR_PAGINA_MAXIMO = 200
+
+STATUS_VALIDOS = ('ativa', 'finalizada', 'cancelada')
+
+# Tabela principal e arquivo (que só guarda locações encerradas)
+MODELOS = (Locacao, LocacaoArquivada)
+
+
+def ler_filtros(args):
+    """
+    Extrai e valida os filtros do histórico da query string.
+
+    Returns:
+        dict: {'status', 'carro_id', 'cliente_id', 'cliente', 'data_inicio', 'data_fim'}
+              (apenas os filtros informados e válidos)
+    """
+    filtros = {}
+
+    status = args.get('status')
+    if status in STATUS_VALIDOS:
+        filtros['status'] = status
+
+    for campo in ('carro_id', 'cliente_id'):
+        valor = args.get(campo, type=int)
+        if valor:
+            filtros[campo] = valor
+
+    cliente = (args.get('cliente') or '').strip()
+    if cliente:
+        filtros['cliente'] = cliente
+
+    for campo in ('data_inicio', 'data_fim'):
+        valor = args.get(campo)
+        if valor:
+            try:
+                filtros[campo] = datetime.strptime(valor, '%Y-%m-%d').date()
+            except ValueError:
+                pass
+
+    return filtros
+
+
+def _padrao_like(termo):
+    """Padrão `%termo%` com os curingas do próprio termo escapados (`\\`)."""
+    termo = termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{termo}%'
+
+
+def filtrar(consulta, modelo=Locacao, status=None, carro_id=None, cliente_id=None, cliente=None,
+            data_inicio=None, data_fim=None):
+    """Aplica os filtros do histórico a uma consulta de Locacao (ou LocacaoArquivada)."""
+    if status:
+        consulta = consulta.filter(modelo.status == status)
+    if carro_id:
+        consulta = consulta.filter(modelo.carro_id == carro_id)
+    if cliente_id:
+        consulta = consulta.filter(modelo.cliente_id == cliente_id)
+    if cliente:
+        consulta = consulta.filter(
+            modelo.cliente_id.in_(
+                db.session.query(Cliente.id).filter(Cliente.nome.ilike(_padrao_like(cliente), escape='\\'))
+            )
+        )
+    if data_inicio:
+        consulta = consulta.filter(modelo.data_retirada >= data_inicio)
+    if data_fim:
+        consulta = consulta.filter(modelo.data_retirada <= data_fim)
+    return consulta
+
+
+def modelos_consultados(filtros):
+    """Tabelas que podem ter locações com esses filtros (o arquivo não tem ativas)."""
+    if filtros.get('status') == 'ativa':
+        return (Locacao,)
+    return MODELOS
+
+
+# ============================================================================
+# CURSOR
+# ============================================================================
+
+def chave_ordem(locacao):
+    """Posição da locação na ordem do histórico (data_retirada, id)."""
+    return (locacao.data_retirada, locacao.id)
+
+
+def codificar_cursor(locacao):
+    """Cursor que aponta para logo depois desta locação na ordem do histórico."""
+    return f"{locacao.data_retirada.isoformat()}_{locacao.id}"
+
+
+def decodificar_cursor(cursor):
+    """
+    Converte o cursor em (data_retirada, id).
+
+    Returns:
+        tuple ou None: None se o cursor for inválido
+    """
+    try:
+        data_retirada, locacao_id = cursor.split('_')
+        return (
+            datetime.strptime(data_retirada, '%Y-%m-%d').date(),
+            int(locacao_id)
+        )
+    except (AttributeError, ValueError):
+        return None
+
+
+# ============================================================================
+# PÁGINAS E TOTAIS
+# ============================================================================
+
+def pagina(filtros, cursor=None, por_pagina=POR_PAGINA_PADRAO):
+    """
+    Busca uma página do histórico com carro e cliente já carregados.
+
+    Args:
+        filtros: Filtros retornados por `ler_filtros()`
+        cursor: Cursor da página anterior (None para a primeira página)
+        por_pagina: Quantidade de linhas por página
+
+    Returns:
+        (list, str ou None): (locações da página, cursor da próxima página)
+    """
+    por_pagina = max(1, min(por_pagina or POR_PAGINA_PADRAO, POR_PAGINA_MAXIMO))
+    chave = decodificar_cursor(cursor) if cursor else None
+
+    # Uma linha a mais indica se existe próxima página; cada tabela devolve
+    # sua página já ordenada e a página final sai da junção das duas
+    locacoes = []
+    for modelo in modelos_consultados(filtros):
+        consulta = eager_carro_cliente(filtrar(consulta_historico(modelo), modelo, **filtros), modelo)
+        if chave:
+            consulta = consulta.filter(
+                db.tuple_(modelo.data_retirada, modelo.id) < db.tuple_(*chave)
+            )
+        locacoes.extend(consulta.limit(por_pagina + 1).all())
+    locacoes.sort(key=chave_ordem, reverse=True)
+
+    proximo = codificar_cursor(locacoes[por_pagina - 1]) if len(locacoes) > por_pagina else None
+    return locacoes[:por_pagina], proximo
+
+
+def resumo(filtros):
+    """
+    Totais do histórico filtrado, calculados no banco.
+
+    Returns:
+        dict: {'total': int, 'ativas': int, 'valor_total': float}
+    """
+    totais = {'total': 0, 'ativas': 0, 'valor_total': 0.0}
+    for modelo in modelos_consultados(filtros):
+        consulta = filtrar(
+            db.session.query(
+                db.func.count(modelo.id),
+                db.func.sum(db.case((modelo.status == 'ativa', 1), else_=0)),
+                db.func.sum(modelo.valor_total)
+            ),
+            modelo,
+            **filtros
+        )
+        total, ativas, valor_total = consulta.one()
+        totais['total'] += total or 0
+        totais['ativas'] += ativas or 0
+        totais['valor_total'] += valor_total or 0.0
+    return totais
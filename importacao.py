@@ -0,0 +1,732 @@
+"""
+Importação em massa a partir dos próprios formatos de exportação (JSON e CSV).
+
+Aceita o JSON completo (`/exportar/json`), o JSON incremental
+(`/exportar/alteracoes`) e o CSV de locações (`/exportar/csv`). Cada linha é
+validada e resolvida em memória pelas chaves naturais: carros pela placa,
+clientes pelo nome normalizado mais o WhatsApp em E.164 (as mesmas regras de
+`clientes.resolver_cliente` e da deduplicação) e conflitos de período pelos
+intervalos ativos de cada carro. Locações e gastos já existentes com as mesmas
+chaves são ignorados, então repetir a importação do mesmo arquivo não duplica
+dados. No formato incremental, a locação existente cujo `updated_at` no arquivo
+é mais recente recebe o novo status (finalização, cancelamento).
+
+As linhas válidas são gravadas em lotes, cada lote na sua própria transação e
+com INSERTs em lote (executemany), junto com os deltas do resumo mensal. Os IDs
+de origem não são preservados: o arquivo pode vir de outra filial.
+
+Uso:
+    flask --app app importar locadora_export.json
+    flask --app app importar locacoes_export.csv --lote 10000 --simular
+"""
+
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import bindparam, insert, select, update
+from models import db, Carro, Cliente, Locacao, LocacaoArquivada, Gasto
+from resumo_mensal import chave_mes, aplicar_no_resumo, STATUS_DESPESA
+from disponibilidade import PeriodosCarro, indice_disponibilidade
+from clientes import normalizar_nome
+from cache_dashboard import versao_dados
+from tarifas import tabela_tarifas
+from migracoes import atualizar_estatisticas
+
+
+TAMANHO_LOTE = 5000
+MAXIMO_ERROS = 50
+
+STATUS_VALIDOS = ('ativa', 'finalizada', 'cancelada')
+
+
+class ErroLinha(ValueError):
+    """Linha do arquivo rejeitada na validação."""
+
+
+class RelatorioImportacao:
+    """Contadores, erros e vazão de uma importação."""
+
+    def __init__(self):
+        self.lidas = 0
+        self.locacoes = 0
+        self.gastos = 0
+        self.atualizadas = 0
+        self.carros_criados = 0
+        self.clientes_criados = 0
+        self.duplicadas = 0
+        self.conflitos = 0
+        self.invalidas = 0
+        self.lotes = 0
+        self.erros = []  # [{'linha': int, 'motivo': str}, ...] (até MAXIMO_ERROS)
+        self.iniciado_em = time.perf_counter()
+        self.segundos = 0.0
+
+    def rejeitar(self, linha, motivo):
+        if len(self.erros) < MAXIMO_ERROS:
+            self.erros.append({'linha': linha, 'motivo': motivo})
+
+    def atualizar_tempo(self):
+        self.segundos = time.perf_counter() - self.iniciado_em
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidas / self.segundos if self.segundos else 0.0
+
+    def to_dict(self):
+        """Converte o relatório para dicionário."""
+        return {
+            'lidas': self.lidas,
+            'locacoes': self.locacoes,
+            'gastos': self.gastos,
+            'atualizadas': self.atualizadas,
+            'carros_criados': self.carros_criados,
+            'clientes_criados': self.clientes_criados,
+            'duplicadas': self.duplicadas,
+            'conflitos': self.conflitos,
+            'invalidas': self.invalidas,
+            'lotes': self.lotes,
+            'segundos': round(self.segundos, 3),
+            'linhas_por_segundo': round(self.linhas_por_segundo, 1),
+            'erros': self.erros
+        }
+
+
+# ============================================================================
+# LEITURA DOS ARQUIVOS
+# ============================================================================
+# Cada leitor produz registros normalizados (tipo, número da linha, dados),
+# com carro e cliente identificados pelas chaves naturais (placa e nome).
+
+def _data_br(texto):
+    """'dd/mm/aaaa[ HH:MM:SS]' -> datetime, sem strptime (gargalo em arquivos grandes)."""
+    data, _, hora = texto.partition(' ')
+    dia, mes, ano = data.split('/')
+    horas, minutos, segundos = (hora.split(':') + ['0', '0', '0'])[:3] if hora else (0, 0, 0)
+    return datetime(int(ano), int(mes), int(dia), int(horas), int(minutos), int(float(segundos)))
+
+
+def _data(valor, campo):
+    """Data em ISO (JSON) ou dd/mm/aaaa (CSV)."""
+    if not valor:
+        raise ErroLinha(f"{campo} vazia")
+    texto = str(valor).strip()
+    try:
+        if '/' in texto:
+            return _data_br(texto[:10]).date()
+        return date.fromisoformat(texto[:10])
+    except ValueError:
+        raise ErroLinha(f"{campo} inválida: {valor}")
+
+
+def _data_hora(valor):
+    if not valor:
+        return None
+    texto = str(valor).strip()
+    try:
+        return _data_br(texto) if '/' in texto else datetime.fromisoformat(texto)
+    except ValueError:
+        return None
+
+
+def _numero(valor, campo, obrigatorio=True):
+    if valor is None or str(valor).strip() == '':
+        if obrigatorio:
+            raise ErroLinha(f"{campo} vazio")
+        return None
+    try:
+        numero = float(str(valor).replace(',', '.')) if isinstance(valor, str) else float(valor)
+    except (TypeError, ValueError):
+        raise ErroLinha(f"{campo} inválido: {valor}")
+    if numero < 0:
+        raise ErroLinha(f"{campo} negativo: {valor}")
+    return numero
+
+
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ''
+
+
+def _booleano(valor, padrao):
+    if valor is None or valor == '':
+        return padrao
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('1', 'true', 'sim', 't')
+    return bool(valor)
+
+
+def ler_json(arquivo):
+    """
+    Registros de um JSON exportado (completo ou incremental).
+
+    No incremental, carro e cliente de cada locação e gasto vêm das chaves
+    naturais da própria linha (placa, nome e WhatsApp), resolvidas no banco de
+    destino; arquivos sem elas só resolvem os IDs de origem presentes no
+    arquivo.
+
+    O arquivo é carregado inteiro (o módulo json da biblioteca padrão não lê
+    em streaming); a gravação continua em lotes.
+    """
+    dados = json.load(arquivo)
+    placas = {}    # id de origem -> placa
+    clientes = {}  # id de origem -> (nome, whatsapp)
+    linha = 0
+
+    for carro in dados.get('carros', []):
+        linha += 1
+        placas[carro.get('id')] = _texto(carro.get('placa')).upper()
+        yield 'carro', linha, {
+            'placa': _texto(carro.get('placa')).upper(),
+            'modelo': _texto(carro.get('modelo')),
+            'cor': _texto(carro.get('cor')) or None,
+            'categoria': _texto(carro.get('categoria')) or None,
+            'quilometragem': carro.get('quilometragem'),
+            'valor_diaria': carro.get('valor_diaria'),
+            'ativo': carro.get('ativo'),
+            'em_manutencao': carro.get('em_manutencao'),
+            'created_at': carro.get('created_at'),
+        }
+
+    for cliente in dados.get('clientes', []):
+        linha += 1
+        clientes[cliente.get('id')] = (_texto(cliente.get('nome')), cliente.get('whatsapp'))
+        yield 'cliente', linha, {
+            'nome': _texto(cliente.get('nome')),
+            'whatsapp': cliente.get('whatsapp'),
+            'created_at': cliente.get('created_at'),
+        }
+
+    for locacao in dados.get('locacoes', []):
+        linha += 1
+        # O formato incremental traz os IDs de origem e as chaves naturais do
+        # carro e do cliente; pelos IDs só se resolvem os presentes no arquivo
+        placa = _texto(locacao.get('placa')).upper() or placas.get(locacao.get('carro_id'), '')
+        if 'cliente' in locacao:
+            nome, whatsapp = _texto(locacao.get('cliente')), locacao.get('whatsapp')
+        else:
+            nome, whatsapp = clientes.get(locacao.get('cliente_id'), ('', None))
+        yield 'locacao', linha, {
+            'placa': placa,
+            'carro_origem': locacao.get('carro_id'),
+            'modelo': _texto(locacao.get('carro')),
+            'valor_diaria': None,
+            'cliente': nome,
+            'whatsapp': whatsapp,
+            'data_retirada': locacao.get('data_retirada'),
+            'data_devolucao': locacao.get('data_devolucao'),
+            'valor_total': locacao.get('valor_total'),
+            'status': locacao.get('status'),
+            'observacoes': locacao.get('observacoes'),
+            'created_at': locacao.get('created_at'),
+            'updated_at': locacao.get('updated_at'),
+        }
+
+    for gasto in dados.get('gastos', []):
+        linha += 1
+        yield 'gasto', linha, {
+            'placa': _texto(gasto.get('placa')).upper() or placas.get(gasto.get('carro_id'), ''),
+            'carro_origem': gasto.get('carro_id'),
+            'tipo': _texto(gasto.get('tipo')),
+            'descricao': gasto.get('descricao'),
+            'valor': gasto.get('valor'),
+            'data_gasto': gasto.get('data_gasto'),
+            'created_at': gasto.get('created_at'),
+        }
+
+
+def ler_csv(arquivo):
+    """Registros do CSV de locações (mesmo cabeçalho de `/exportar/csv`)."""
+    leitor = csv.DictReader(arquivo)
+    for linha, registro in enumerate(leitor, start=2):
+        yield 'locacao', linha, {
+            'placa': _texto(registro.get('Placa')).upper(),
+            'modelo': _texto(registro.get('Carro')),
+            'valor_diaria': registro.get('Valor Diária'),
+            'cliente': _texto(registro.get('Cliente')),
+            'whatsapp': registro.get('WhatsApp'),
+            'data_retirada': registro.get('Data Retirada'),
+            'data_devolucao': registro.get('Data Devolução'),
+            'valor_total': registro.get('Valor Total'),
+            'status': registro.get('Status'),
+            'observacoes': None,
+            'created_at': registro.get('Data Criação'),
+            'updated_at': None,
+        }
+
+
+def ler_arquivo(arquivo, formato):
+    """
+    Registros do arquivo no formato informado ('json' ou 'csv').
+
+    Args:
+        arquivo: Arquivo binário aberto (ou stream de upload)
+        formato: 'json' ou 'csv'
+    """
+    if formato == 'json':
+        return ler_json(arquivo)
+    if formato == 'csv':
+        return ler_csv(io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline=''))
+    raise ValueError(f"Formato não suportado: {formato}")
+
+
+# ============================================================================
+# IMPORTAÇÃO
+# ============================================================================
+
+class _Importador:
+    """Estado em memória de uma importação: chaves existentes e lote pendente."""
+
+    def __init__(self, normalizar_telefone, relatorio):
+        self.normalizar_telefone = normalizar_telefone
+        self.relatorio = relatorio
+
+        conexao = db.session.connection()
+        # placa -> {'id', 'categoria', 'valor_diaria'}
+        self.carros = {
+            placa: {'id': carro_id, 'categoria': categoria, 'valor_diaria': valor_diaria}
+            for carro_id, placa, categoria, valor_diaria in conexao.execute(
+                select(Carro.id, Carro.placa, Carro.categoria, Carro.valor_diaria)
+            )
+        }
+        placa_por_id = {dados['id']: placa for placa, dados in self.carros.items()}
+
+        # Clientes por nome normalizado e WhatsApp ('' = sem número). A chave é
+        # o id do cadastro mais antigo com esse par; clientes novos do arquivo
+        # têm chave temporária negativa até o INSERT
+        self.numeros = defaultdict(dict)  # nome normalizado -> {WhatsApp: chave}
+        self.clientes = {}                # chave -> id no banco
+        chave_por_id = {}
+        for cliente_id, nome, whatsapp in conexao.execute(
+            select(Cliente.id, Cliente.nome_normalizado, Cliente.whatsapp).order_by(Cliente.id)
+        ):
+            chave = self.numeros[nome].setdefault(whatsapp or '', cliente_id)
+            self.clientes[chave] = chave
+            chave_por_id[cliente_id] = chave
+
+        # (placa, cliente, retirada, devolução) -> (id, status, valor_total, updated_at)
+        # das locações da tabela principal; None para as arquivadas (também
+        # contam como existentes: reimportação não as duplica) e as criadas aqui
+        self.locacoes_existentes = {}
+        self.periodos = defaultdict(PeriodosCarro)  # placa -> períodos ativos
+        for modelo in (Locacao, LocacaoArquivada):
+            consulta_locacoes = select(
+                modelo.id, modelo.carro_id, modelo.cliente_id, modelo.data_retirada,
+                modelo.data_devolucao, modelo.status, modelo.valor_total, modelo.updated_at
+            ).execution_options(yield_per=TAMANHO_LOTE)
+            for (locacao_id, carro_id, cliente_id, inicio, fim,
+                 status, valor_total, atualizado_em) in conexao.execute(consulta_locacoes):
+                placa = placa_por_id.get(carro_id)
+                self.locacoes_existentes[(placa, chave_por_id.get(cliente_id), inicio, fim)] = (
+                    (locacao_id, status, valor_total, atualizado_em) if modelo is Locacao else None
+                )
+                if status == 'ativa':
+                    self.periodos[placa].periodos.append((inicio, fim, locacao_id))
+        for periodos in self.periodos.values():
+            periodos.periodos.sort()
+            periodos._recalcular_max()
+
+        self.gastos_existentes = {
+            (placa_por_id.get(carro_id), tipo, data_gasto, valor)
+            for carro_id, tipo, data_gasto, valor in conexao.execute(
+                select(Gasto.carro_id, Gasto.tipo, Gasto.data_gasto, Gasto.valor)
+                .execution_options(yield_per=TAMANHO_LOTE)
+            )
+        }
+        db.session.commit()
+
+        self._proximo_id_temporario = -1
+        self._proxima_chave_cliente = -1
+        self._limpar_lote()
+
+    def _limpar_lote(self):
+        self.novos_carros = {}    # placa -> linha para INSERT
+        self.novos_clientes = {}  # chave do cliente -> linha para INSERT
+        self.novos_telefones = {}  # id de cliente sem número -> WhatsApp a gravar
+        self.novas_locacoes = []
+        self.novos_status = []  # mudanças de status de locações existentes
+        self.novos_gastos = []
+
+    @property
+    def tamanho_lote(self):
+        return (len(self.novos_carros) + len(self.novos_clientes)
+                + len(self.novas_locacoes) + len(self.novos_status) + len(self.novos_gastos))
+
+    # ------------------------------------------------------------ validação
+
+    def _carro(self, placa, modelo=None, valor_diaria=None, origem=None, **extras):
+        """Dados do carro pela placa, registrando-o para criação se for novo."""
+        if not placa:
+            if origem is not None:
+                raise ErroLinha(f"linha sem placa e carro de origem {origem} fora do arquivo")
+            raise ErroLinha("placa vazia")
+        if placa in self.carros:
+            return self.carros[placa]
+        if not modelo or valor_diaria is None:
+            raise ErroLinha(f"carro {placa} não cadastrado e sem modelo/valor da diária no arquivo")
+
+        carro = {'id': None, 'categoria': extras.get('categoria') or 'Econômico', 'valor_diaria': valor_diaria}
+        self.carros[placa] = carro
+        linha = {
+            'placa': placa,
+            'modelo': modelo[:50],
+            'cor': extras.get('cor'),
+            'categoria': carro['categoria'],
+            'quilometragem': int(_numero(extras.get('quilometragem'), 'quilometragem', False) or 0),
+            'valor_diaria': valor_diaria,
+            'ativo': _booleano(extras.get('ativo'), True),
+            'em_manutencao': _booleano(extras.get('em_manutencao'), False),
+            'created_at': _data_hora(extras.get('created_at')) or datetime.utcnow(),
+        }
+        self.novos_carros[placa] = linha
+        return carro
+
+    def _identificar_cliente(self, nome, whatsapp):
+        """(nome normalizado, WhatsApp em E.164 ou '') da linha."""
+        nome_normalizado = normalizar_nome(nome)
+        if not nome_normalizado:
+            raise ErroLinha("nome do cliente vazio")
+        return nome_normalizado, self.normalizar_telefone(_texto(whatsapp))
+
+    def _chave_cliente(self, nome_normalizado, whatsapp):
+        """
+        Chave do cadastro da linha, pelas regras de `resolver_cliente` e `_unir_grupo`.
+
+        Com WhatsApp: o cadastro com o mesmo número ou, se o nome só tiver um
+        cadastro e ele for sem número, esse cadastro. Sem WhatsApp: o único
+        número cadastrado para o nome ou o cadastro sem número. Homônimos com
+        números diferentes são clientes diferentes.
+
+        Returns:
+            int ou None: Chave do cliente, ou None se ele ainda não existe
+        """
+        numeros = self.numeros.get(nome_normalizado, {})
+        if whatsapp:
+            if whatsapp in numeros:
+                return numeros[whatsapp]
+            return numeros[''] if list(numeros) == [''] else None
+        com_numero = [numero for numero in numeros if numero]
+        if len(com_numero) == 1:
+            return numeros[com_numero[0]]
+        return numeros.get('')
+
+    def _cliente(self, nome, whatsapp, created_at=None):
+        """
+        Resolve o cliente, registrando-o para criação se for novo.
+
+        Um cadastro sem número reaproveitado por uma linha com WhatsApp ganha o
+        número (como em `resolver_cliente`).
+
+        Returns:
+            int: Chave do cliente no importador
+        """
+        nome_normalizado, whatsapp = self._identificar_cliente(nome, whatsapp)
+        numeros = self.numeros[nome_normalizado]
+        chave = self._chave_cliente(nome_normalizado, whatsapp)
+
+        if chave is None:
+            chave = self._proxima_chave_cliente
+            self._proxima_chave_cliente -= 1
+            numeros[whatsapp] = chave
+            self.novos_clientes[chave] = {
+                'nome': nome[:100],
+                'nome_normalizado': nome_normalizado,
+                'whatsapp': whatsapp,
+                'created_at': _data_hora(created_at) or datetime.utcnow(),
+            }
+        elif whatsapp and whatsapp not in numeros:
+            # Cadastro sem número passa a ter o WhatsApp da linha
+            numeros[whatsapp] = numeros.pop('')
+            if chave in self.novos_clientes:
+                self.novos_clientes[chave]['whatsapp'] = whatsapp
+            else:
+                self.novos_telefones[self.clientes[chave]] = whatsapp
+        return chave
+
+    def adicionar_carro(self, dados):
+        placa = dados['placa']
+        if placa in self.carros:
+            self.relatorio.duplicadas += 1
+            return
+        self._carro(
+            placa, dados['modelo'], _numero(dados['valor_diaria'], 'valor_diaria'),
+            cor=dados['cor'], categoria=dados['categoria'], quilometragem=dados['quilometragem'],
+            ativo=dados['ativo'], em_manutencao=dados['em_manutencao'], created_at=dados['created_at']
+        )
+
+    def adicionar_cliente(self, dados):
+        if self._chave_cliente(*self._identificar_cliente(dados['nome'], dados['whatsapp'])) is not None:
+            self.relatorio.duplicadas += 1
+        self._cliente(dados['nome'], dados['whatsapp'], dados['created_at'])
+
+    def adicionar_locacao(self, linha, dados):
+        inicio = _data(dados['data_retirada'], 'data_retirada')
+        fim = _data(dados['data_devolucao'], 'data_devolucao')
+        if fim < inicio:
+            raise ErroLinha("data de devolução anterior à retirada")
+        status = _texto(dados['status']).lower() or 'ativa'
+        if status not in STATUS_VALIDOS:
+            raise ErroLinha(f"status inválido: {dados['status']}")
+
+        placa = dados['placa']
+        carro = self._carro(
+            placa, dados['modelo'], _numero(dados['valor_diaria'], 'valor_diaria', False),
+            origem=dados.get('carro_origem')
+        )
+        valor_total = _numero(dados['valor_total'], 'valor_total', obrigatorio=False)
+        if valor_total is None:
+            valor_total = ((fim - inicio).days + 1) * carro['valor_diaria']
+
+        nome_normalizado, whatsapp = self._identificar_cliente(dados['cliente'], dados['whatsapp'])
+        # Sem WhatsApp, a linha repete a locação de qualquer homônimo no mesmo carro e período
+        candidatos = [self._chave_cliente(nome_normalizado, whatsapp)] if whatsapp \
+            else self.numeros.get(nome_normalizado, {}).values()
+        existente = next((
+            (placa, cliente, inicio, fim) for cliente in candidatos
+            if (placa, cliente, inicio, fim) in self.locacoes_existentes
+        ), None)
+        if existente is not None:
+            # O cliente já existe; só completa o WhatsApp de um cadastro sem número
+            self._cliente(dados['cliente'], dados['whatsapp'])
+            self._alterar_status(linha, existente, status, _data_hora(dados['updated_at']))
+            return
+
+        if status == 'ativa':
+            periodos = self.periodos[placa]
+            if periodos.conflito(inicio, fim) is not None:
+                self.relatorio.conflitos += 1
+                self.relatorio.rejeitar(linha, f"carro {placa} já alugado entre {inicio} e {fim}")
+                return
+            periodos.adicionar(inicio, fim, self._proximo_id_temporario)
+            self._proximo_id_temporario -= 1
+
+        cliente = self._cliente(dados['cliente'], dados['whatsapp'])
+        self.locacoes_existentes[(placa, cliente, inicio, fim)] = None
+        criada_em = _data_hora(dados['created_at']) or datetime.utcnow()
+        self.novas_locacoes.append({
+            'placa': placa,
+            'cliente': cliente,
+            'data_retirada': inicio,
+            'data_devolucao': fim,
+            'valor_total': valor_total,
+            'status': status,
+            'observacoes': dados['observacoes'],
+            'created_at': criada_em,
+            # Última alteração na origem (o JSON completo e o CSV só têm a criação)
+            'updated_at': _data_hora(dados['updated_at']) or criada_em,
+        })
+
+    def _alterar_status(self, linha, chave, status, atualizado_em):
+        """
+        Registra a mudança de status de uma locação já existente, se a linha for mais recente.
+
+        Só linhas com `updated_at` (formato incremental) alteram locações da
+        tabela principal; as demais contam como duplicadas. A locação fica
+        com o `updated_at` da origem (como as criadas pela importação), que é
+        o comparado nas próximas importações.
+        """
+        existente = self.locacoes_existentes[chave]
+        if existente is None or atualizado_em is None:
+            self.relatorio.duplicadas += 1
+            return
+        locacao_id, anterior, valor_total, atualizado_antes = existente
+        if status == anterior or (atualizado_antes is not None and atualizado_em <= atualizado_antes):
+            self.relatorio.duplicadas += 1
+            return
+
+        placa, _, inicio, fim = chave
+        periodos = self.periodos[placa]
+        if status == 'ativa':
+            if periodos.conflito(inicio, fim) is not None:
+                self.relatorio.conflitos += 1
+                self.relatorio.rejeitar(linha, f"carro {placa} já alugado entre {inicio} e {fim}")
+                return
+            periodos.adicionar(inicio, fim, locacao_id)
+        elif anterior == 'ativa':
+            periodos.remover(locacao_id)
+
+        self.locacoes_existentes[chave] = (locacao_id, status, valor_total, atualizado_em)
+        self.novos_status.append({
+            'locacao_id': locacao_id,
+            'placa': placa,
+            'data_retirada': inicio,
+            'valor_total': valor_total,
+            'anterior': anterior,
+            'status': status,
+            'atualizado_em': atualizado_em,
+        })
+
+    def adicionar_gasto(self, dados):
+        if not dados['tipo']:
+            raise ErroLinha("tipo do gasto vazio")
+        data_gasto = _data(dados['data_gasto'], 'data_gasto')
+        valor = _numero(dados['valor'], 'valor')
+        placa = dados['placa']
+        self._carro(placa, origem=dados.get('carro_origem'))
+
+        chave = (placa, dados['tipo'], data_gasto, valor)
+        if chave in self.gastos_existentes:
+            self.relatorio.duplicadas += 1
+            return
+        self.gastos_existentes.add(chave)
+        self.novos_gastos.append({
+            'placa': placa,
+            'tipo': dados['tipo'][:30],
+            'descricao': dados['descricao'],
+            'valor': valor,
+            'data_gasto': data_gasto,
+            'created_at': _data_hora(dados['created_at']) or datetime.utcnow(),
+        })
+
+    # ------------------------------------------------------------- gravação
+
+    @staticmethod
+    def _inserir_com_ids(conexao, modelo, chaves_linhas):
+        """INSERT em lote de {chave natural: linha} devolvendo {chave natural: id}."""
+        tabela = modelo.__table__
+        chaves, linhas = list(chaves_linhas), list(chaves_linhas.values())
+        resultado = conexao.execute(
+            insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True),
+            linhas
+        )
+        return dict(zip(chaves, resultado.scalars()))
+
+    def gravar_lote(self, simular=False):
+        """
+        Grava o lote pendente numa transação (carros, clientes, locações, gastos, resumo).
+
+        Returns:
+            bool: True se havia linhas no lote
+        """
+        if not self.tamanho_lote:
+            return False
+        if simular:
+            self.relatorio.carros_criados += len(self.novos_carros)
+            self.relatorio.clientes_criados += len(self.novos_clientes)
+            self.relatorio.locacoes += len(self.novas_locacoes)
+            self.relatorio.atualizadas += len(self.novos_status)
+            self.relatorio.gastos += len(self.novos_gastos)
+            self._limpar_lote()
+            return True
+
+        with db.engine.begin() as conexao:
+            if self.novos_carros:
+                for placa, carro_id in self._inserir_com_ids(conexao, Carro, self.novos_carros).items():
+                    self.carros[placa]['id'] = carro_id
+            if self.novos_clientes:
+                self.clientes.update(self._inserir_com_ids(conexao, Cliente, self.novos_clientes))
+            if self.novos_telefones:
+                tabela = Cliente.__table__
+                conexao.execute(
+                    update(tabela).where(tabela.c.id == bindparam('cliente_id'))
+                    .values(whatsapp=bindparam('novo_whatsapp'), updated_at=datetime.utcnow()),
+                    [{'cliente_id': cliente_id, 'novo_whatsapp': whatsapp}
+                     for cliente_id, whatsapp in self.novos_telefones.items()]
+                )
+
+            deltas = defaultdict(lambda: (0.0, 0.0, 0, 0))
+
+            def somar(chave, valores):
+                deltas[chave] = tuple(a + v for a, v in zip(deltas[chave], valores))
+
+            locacoes = []
+            for linha in self.novas_locacoes:
+                carro = self.carros[linha.pop('placa')]
+                linha['carro_id'] = carro['id']
+                linha['cliente_id'] = self.clientes[linha.pop('cliente')]
+                locacoes.append(linha)
+                somar((chave_mes(linha['data_retirada']), carro['categoria'], linha['status']),
+                      (linha['valor_total'], 0.0, 1, 0))
+            if locacoes:
+                conexao.execute(insert(Locacao.__table__), locacoes)
+
+            if self.novos_status:
+                tabela = Locacao.__table__
+                conexao.execute(
+                    update(tabela).where(tabela.c.id == bindparam('locacao_id'))
+                    .values(status=bindparam('novo_status'), updated_at=bindparam('atualizado_em')),
+                    [{'locacao_id': alteracao['locacao_id'], 'novo_status': alteracao['status'],
+                      'atualizado_em': alteracao['atualizado_em']} for alteracao in self.novos_status]
+                )
+                for alteracao in self.novos_status:
+                    mes = chave_mes(alteracao['data_retirada'])
+                    categoria = self.carros[alteracao['placa']]['categoria']
+                    valor_total = alteracao['valor_total'] or 0.0
+                    somar((mes, categoria, alteracao['anterior']), (-valor_total, 0.0, -1, 0))
+                    somar((mes, categoria, alteracao['status']), (valor_total, 0.0, 1, 0))
+
+            gastos = []
+            for linha in self.novos_gastos:
+                carro = self.carros[linha.pop('placa')]
+                linha['carro_id'] = carro['id']
+                gastos.append(linha)
+                somar((chave_mes(linha['data_gasto']), carro['categoria'], STATUS_DESPESA),
+                      (0.0, linha['valor'], 0, 1))
+            if gastos:
+                conexao.execute(insert(Gasto.__table__), gastos)
+
+            aplicar_no_resumo(conexao, deltas)
+
+        self.relatorio.carros_criados += len(self.novos_carros)
+        self.relatorio.clientes_criados += len(self.novos_clientes)
+        self.relatorio.locacoes += len(locacoes)
+        self.relatorio.atualizadas += len(self.novos_status)
+        self.relatorio.gastos += len(gastos)
+        self._limpar_lote()
+        return True
+
+
+def importar(registros, normalizar_telefone, tamanho_lote=TAMANHO_LOTE, simular=False, progresso=None):
+    """
+    Importa os registros lidos por `ler_arquivo()`.
+
+    Args:
+        registros: Iterável de (tipo, linha, dados)
+        normalizar_telefone: Função que formata o WhatsApp (formatar_telefone)
+        tamanho_lote: Linhas gravadas por transação
+        simular: Apenas valida e conta, sem gravar
+        progresso: Função chamada com o relatório após cada lote
+
+    Returns:
+        RelatorioImportacao: Contadores, erros e vazão
+    """
+    relatorio = RelatorioImportacao()
+    importador = _Importador(normalizar_telefone, relatorio)
+    adicionar = {
+        'carro': lambda linha, dados: importador.adicionar_carro(dados),
+        'cliente': lambda linha, dados: importador.adicionar_cliente(dados),
+        'locacao': importador.adicionar_locacao,
+        'gasto': lambda linha, dados: importador.adicionar_gasto(dados),
+    }
+
+    try:
+        for tipo, linha, dados in registros:
+            relatorio.lidas += 1
+            try:
+                adicionar[tipo](linha, dados)
+            except ErroLinha as erro:
+                relatorio.invalidas += 1
+                relatorio.rejeitar(linha, str(erro))
+
+            if importador.tamanho_lote >= tamanho_lote:
+                relatorio.lotes += importador.gravar_lote(simular)
+                relatorio.atualizar_tempo()
+                if progresso:
+                    progresso(relatorio)
+
+        relatorio.lotes += importador.gravar_lote(simular)
+    finally:
+        if not simular and relatorio.lotes:
+            # Escritas fora da sessão ORM: recarregar o índice de disponibilidade
+            # e as tarifas, e invalidar os caches dos workers
+            indice_disponibilidade.invalidar()
+            tabela_tarifas.invalidar()
+            versao_dados.incrementar()
+            with db.engine.begin() as conexao:
+                atualizar_estatisticas(conexao)
+
+    relatorio.atualizar_tempo()
+    if progresso:
+        progresso(relatorio)
+    return relatorio
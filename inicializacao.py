@@ -0,0 +1,120 @@
+"""
+Ciclo de inicialização da aplicação: criação do schema, migrações, seed
+opcional e verificação de prontidão.
+
+Executado uma vez por processo na importação do app (ou uma vez por deploy via
+`flask --app app init-db`), nunca dentro das rotas. Processos que sobem juntos
+se revezam na trava do banco (migracoes.transacao_travada).
+"""
+
+import threading
+from datetime import datetime
+from sqlalchemy import inspect, text
+from models import db
+from migracoes import aplicar_migracoes, criar_tabelas, travar_esquema
+
+
+TABELAS_OBRIGATORIAS = ('carros', 'clientes', 'locacoes', 'gastos', 'resumo_mensal', 'regras_preco',
+                        'encerramentos_automaticos', 'locacoes_arquivo')
+
+
+class EstadoInicializacao:
+    """Estado do bootstrap deste processo, exposto pelo endpoint /healthz."""
+
+    def __init__(self):
+        self.pronto = False
+        self.iniciado_em = None
+        self.concluido_em = None
+        self.erro = None
+        self.etapas = []
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        """Converte o estado para dicionário."""
+        return {
+            'pronto': self.pronto,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+            'erro': self.erro,
+            'etapas': list(self.etapas)
+        }
+
+
+estado = EstadoInicializacao()
+
+
+def verificar_prontidao():
+    """
+    Confirma que o banco responde e que todas as tabelas existem.
+
+    Returns:
+        (bool, str): (pronto, mensagem_erro)
+    """
+    try:
+        db.session.execute(text('SELECT 1'))
+        existentes = set(inspect(db.engine).get_table_names())
+    except Exception as erro:  # banco indisponível
+        return False, f"Banco de dados indisponível: {erro}"
+    finally:
+        db.session.remove()
+
+    faltando = [tabela for tabela in TABELAS_OBRIGATORIAS if tabela not in existentes]
+    if faltando:
+        return False, f"Tabelas ausentes: {', '.join(faltando)}"
+
+    return True, ""
+
+
+def inicializar(app, criar_schema=True, semear=False, seed=None, forcar=False):
+    """
+    Executa o bootstrap uma única vez neste processo.
+
+    Args:
+        app: Aplicação Flask
+        criar_schema: Executa db.create_all()
+        semear: Popula a frota de exemplo se o banco estiver vazio
+        seed: Função de seed (ex.: app.seed_database)
+        forcar: Executa novamente mesmo se o processo já estiver pronto
+
+    Returns:
+        EstadoInicializacao: Estado final do bootstrap
+    """
+    with estado._lock:
+        if estado.pronto and not forcar:
+            return estado
+
+        estado.pronto = False
+        estado.iniciado_em = datetime.utcnow()
+        estado.erro = None
+        estado.etapas = []
+
+        with app.app_context():
+            try:
+                if criar_schema:
+                    criar_tabelas()
+                    estado.etapas.append('schema')
+                    aplicar_migracoes()
+                    estado.etapas.append('migracoes')
+
+                if semear and seed is not None:
+                    # Com a trava, o segundo processo já encontra a frota gravada
+                    db.session.rollback()
+                    travar_esquema(db.session.connection())
+                    seed()
+                    db.session.commit()
+                    estado.etapas.append('seed')
+
+                pronto, mensagem = verificar_prontidao()
+                estado.etapas.append('prontidao')
+                if not pronto:
+                    estado.erro = mensagem
+                    return estado
+            except Exception as erro:
+                db.session.rollback()
+                estado.erro = str(erro)
+                app.logger.exception("Falha na inicialização do banco de dados")
+                return estado
+
+        estado.pronto = True
+        estado.concluido_em = datetime.utcnow()
+        return estado
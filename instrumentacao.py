@@ -0,0 +1,245 @@
+"""
+Instrumentação por requisição: tempo de banco, de renderização e total.
+
+Para cada requisição são medidos:
+
+    sql      instruções enviadas ao banco (eventos do engine)
+    db       tempo de execução dessas instruções no driver (a leitura das
+             linhas em streaming, como nas exportações, conta em app)
+    render   tempo do Jinja em `render_template` (sinais do Flask)
+    app      o restante: Python da rota (agregações, cache, serialização)
+    total    do `before_request` ao fim da resposta
+
+Os valores vão no cabeçalho `Server-Timing` (aparece na aba de rede do
+navegador) e numa linha JSON no logger `locamil.requisicoes`. Em respostas em
+streaming (exportações) o cabeçalho sai antes do corpo e traz os tempos até
+ali; a linha de log é escrita ao fim do último bloco, com o total real.
+
+Instruções mais lentas que CONSULTA_LENTA_MS (também fora de requisições,
+como CLI e agendador) vão para o logger `locamil.consultas_lentas` com o SQL
+normalizado (literais e listas de parâmetros trocados por ?) e o ponto do
+código do app que as disparou. O local só é procurado para as lentas, então o
+custo por instrução é o de dois `perf_counter`.
+
+Variáveis de ambiente:
+
+    INSTRUMENTACAO                 True | False (padrão: True)
+    INSTRUMENTACAO_SERVER_TIMING   envia o cabeçalho (padrão: True)
+    INSTRUMENTACAO_LOG_MINIMO_MS   só registra requisições a partir deste total (padrão: 0 = todas)
+    CONSULTA_LENTA_MS              limiar do log de consultas lentas (padrão: 100; 0 desliga)
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import time
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+log_requisicoes = logging.getLogger('locamil.requisicoes')
+log_consultas_lentas = logging.getLogger('locamil.consultas_lentas')
+
+_PASTA_APP = os.path.dirname(os.path.abspath(__file__))
+_CHAVE_INICIOS = 'instrumentacao_inicios'
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAMETROS = re.compile(r"%\(\w+\)s|(?<!:):\w+|\$\d+|%s")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar_sql(instrucao):
+    """SQL sem literais nem valores ('... WHERE id IN (?, ?, ?)' -> '... WHERE id IN (...)')."""
+    instrucao = _LITERAIS.sub('?', instrucao)
+    instrucao = _PARAMETROS.sub('?', instrucao)
+    instrucao = _LISTAS.sub('(...)', instrucao)
+    return _ESPACOS.sub(' ', instrucao).strip()
+
+
+def local_chamada():
+    """Primeiro quadro da pilha no código do app (fora de bibliotecas e deste módulo)."""
+    quadro = sys._getframe(1)
+    while quadro is not None:
+        arquivo = quadro.f_code.co_filename
+        if arquivo.startswith(_PASTA_APP) and 'site-packages' not in arquivo and arquivo != __file__:
+            return f"{os.path.relpath(arquivo, _PASTA_APP)}:{quadro.f_lineno} ({quadro.f_code.co_name})"
+        quadro = quadro.f_back
+    return None
+
+
+class Medicao:
+    """Tempos e contagens de uma requisição (guardada em `g`)."""
+
+    __slots__ = ('inicio', 'sql', 'db_ms', 'render_ms', 'inicio_render', 'bytes')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.sql = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.inicio_render = None
+        self.bytes = 0
+
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def server_timing(self, total_ms, streaming=False):
+        app_ms = max(0.0, total_ms - self.db_ms - self.render_ms)
+        total = f'total;dur={total_ms:.1f}' + (';desc="antes do streaming"' if streaming else '')
+        return (
+            f'db;dur={self.db_ms:.1f};desc="{self.sql} SQL", render;dur={self.render_ms:.1f}, '
+            f'app;dur={app_ms:.1f}, {total}'
+        )
+
+
+class ConfiguracaoInstrumentacao:
+    """Configuração da instrumentação (lida do ambiente em `registrar`)."""
+
+    def __init__(self):
+        self.ativa = False
+        self.server_timing = True
+        self.log_minimo_ms = 0.0
+        self.consulta_lenta_ms = 100.0
+
+    def configurar(self, ambiente=None):
+        ambiente = os.environ if ambiente is None else ambiente
+        self.ativa = ambiente.get('INSTRUMENTACAO', 'True') == 'True'
+        self.server_timing = ambiente.get('INSTRUMENTACAO_SERVER_TIMING', 'True') == 'True'
+        self.log_minimo_ms = float(ambiente.get('INSTRUMENTACAO_LOG_MINIMO_MS') or 0)
+        self.consulta_lenta_ms = float(ambiente.get('CONSULTA_LENTA_MS') or 100)
+
+
+configuracao = ConfiguracaoInstrumentacao()
+
+
+# ============================================================================
+# BANCO
+# ============================================================================
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _iniciar_consulta(conexao, cursor, instrucao, parametros, contexto, executemany):
+    if configuracao.ativa:
+        conexao.info.setdefault(_CHAVE_INICIOS, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _concluir_consulta(conexao, cursor, instrucao, parametros, contexto, executemany):
+    inicios = conexao.info.get(_CHAVE_INICIOS)
+    if not inicios:
+        return
+    decorrido_ms = (time.perf_counter() - inicios.pop()) * 1000
+
+    medicao = g.get('medicao') if has_app_context() else None
+    if medicao is not None:
+        medicao.sql += 1
+        medicao.db_ms += decorrido_ms
+
+    if 0 < configuracao.consulta_lenta_ms <= decorrido_ms:
+        log_consultas_lentas.warning(_json({
+            'evento': 'consulta_lenta',
+            'ms': round(decorrido_ms, 1),
+            'sql': normalizar_sql(instrucao),
+            'local': local_chamada(),
+            'endpoint': request.endpoint if medicao is not None else None,
+        }))
+
+
+@event.listens_for(Engine, 'handle_error')
+def _descartar_inicio(contexto_erro):
+    # A instrução falhou: o after_cursor_execute não vem
+    conexao = contexto_erro.connection
+    if conexao is not None and conexao.info.get(_CHAVE_INICIOS):
+        conexao.info[_CHAVE_INICIOS].pop()
+
+
+# ============================================================================
+# REQUISIÇÕES
+# ============================================================================
+
+def _json(dados):
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+
+
+def _configurar_logger(logger, nivel):
+    """Saída padrão (uma linha JSON por evento) se o deploy não configurou o logger."""
+    if logger.handlers:
+        return
+    saida = logging.StreamHandler()
+    saida.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logger.addHandler(saida)
+    logger.setLevel(nivel)
+    logger.propagate = False
+
+
+def _registrar_requisicao(medicao, metodo, caminho, endpoint, status, total_ms, streaming):
+    if total_ms < configuracao.log_minimo_ms:
+        return
+    log_requisicoes.info(_json({
+        'evento': 'requisicao',
+        'metodo': metodo,
+        'caminho': caminho,
+        'endpoint': endpoint,
+        'status': status,
+        'total_ms': round(total_ms, 1),
+        'db_ms': round(medicao.db_ms, 1),
+        'sql': medicao.sql,
+        'render_ms': round(medicao.render_ms, 1),
+        'app_ms': round(max(0.0, total_ms - medicao.db_ms - medicao.render_ms), 1),
+        'bytes': medicao.bytes,
+        'streaming': streaming,
+    }))
+
+
+def registrar(app, ambiente=None):
+    """Instala a medição por requisição e os loggers (uma vez, na criação do app)."""
+    configuracao.configurar(ambiente)
+    if not configuracao.ativa:
+        return
+    _configurar_logger(log_requisicoes, logging.INFO)
+    _configurar_logger(log_consultas_lentas, logging.WARNING)
+
+    def corpo_medido(corpo, medicao, dados):
+        try:
+            for bloco in corpo:
+                medicao.bytes += len(bloco) if isinstance(bloco, bytes) else len(bloco.encode())
+                yield bloco
+        finally:
+            _registrar_requisicao(medicao, *dados, medicao.total_ms(), True)
+
+    @app.before_request
+    def _iniciar_medicao():
+        g.medicao = Medicao()
+
+    @before_render_template.connect_via(app)
+    def _iniciar_render(remetente, template, context, **extras):
+        medicao = g.get('medicao')
+        if medicao is not None:
+            medicao.inicio_render = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def _concluir_render(remetente, template, context, **extras):
+        medicao = g.get('medicao')
+        if medicao is not None and medicao.inicio_render is not None:
+            medicao.render_ms += (time.perf_counter() - medicao.inicio_render) * 1000
+            medicao.inicio_render = None
+
+    @app.after_request
+    def _concluir_medicao(resposta):
+        medicao = g.get('medicao')
+        if medicao is None:
+            return resposta
+        total_ms = medicao.total_ms()
+        if configuracao.server_timing:
+            resposta.headers['Server-Timing'] = medicao.server_timing(total_ms, resposta.is_streamed)
+
+        dados = (request.method, request.path, request.endpoint, resposta.status_code)
+        if resposta.is_streamed:
+            resposta.response = corpo_medido(resposta.response, medicao, dados)
+        else:
+            medicao.bytes = resposta.content_length or 0
+            _registrar_requisicao(medicao, *dados, total_ms, False)
+        return resposta
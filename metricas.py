@@ -0,0 +1,382 @@
+"""
+Métricas no formato texto do Prometheus (`GET /metrics`), somadas entre os workers.
+
+Cada worker do gunicorn acumula suas métricas em memória (contadores,
+histogramas e requisições em andamento, sob um lock) e uma thread daemon grava
+a cada METRICAS_INTERVALO_S um instantâneo em `METRICAS_DIR/<pid>.json`
+(escrita atômica). O worker que atende o `/metrics` grava o próprio
+instantâneo e soma os de todos:
+
+    contadores e histogramas   somados em todos os arquivos da execução atual,
+                               inclusive de workers já reciclados (os valores
+                               deles continuam valendo)
+    gauges                     somados só nos workers vivos
+
+Arquivos de execuções anteriores (outro processo mestre, pid já morto) são
+apagados na leitura. As gauges e os contadores de outros workers têm o atraso
+de até um intervalo de gravação; um worker que sai normalmente grava o último
+instantâneo, um morto à força (SIGKILL) perde até um intervalo.
+
+Métricas:
+
+    locamil_requisicoes_total                    endpoint, metodo, status
+    locamil_requisicao_duracao_segundos          histograma por endpoint e metodo
+    locamil_requisicoes_em_andamento             gauge por endpoint
+    locamil_sql_instrucoes_total                 por endpoint (com a instrumentação ativa)
+    locamil_sql_duracao_segundos_total           por endpoint (com a instrumentação ativa)
+    locamil_db_pool_conexoes                     gauge por estado (em_uso, livres, overflow)
+    locamil_cache_acertos_total / _falhas_total  por cache (dashboard, disponibilidade, tarifas)
+    locamil_cache_taxa_acerto                    acertos / leituras, por cache
+    locamil_reservas_criadas_total
+    locamil_reservas_recusadas_total             motivo (indisponivel, banco_ocupado)
+    locamil_exportacoes_total                    formato
+
+Variáveis de ambiente:
+
+    METRICAS               True | False (padrão: True)
+    METRICAS_DIR           pasta dos instantâneos (padrão: instance/metricas)
+    METRICAS_INTERVALO_S   intervalo de gravação (padrão: 1)
+
+Uso:
+    curl http://localhost:5000/metrics
+    # prometheus.yml: scrape_configs: [{job_name: locamil, static_configs: [{targets: ['localhost:5000']}]}]
+"""
+
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from flask import g, request
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# nome: (tipo, ajuda)
+DEFINICOES = {
+    'locamil_requisicoes_total': ('counter', 'Requisições atendidas por endpoint, método e status.'),
+    'locamil_requisicao_duracao_segundos': (
+        'histogram', 'Duração das requisições até o último byte da resposta, por endpoint e método.'
+    ),
+    'locamil_requisicoes_em_andamento': ('gauge', 'Requisições em andamento por endpoint.'),
+    'locamil_sql_instrucoes_total': ('counter', 'Instruções SQL executadas por endpoint.'),
+    'locamil_sql_duracao_segundos_total': ('counter', 'Tempo de execução de SQL por endpoint.'),
+    'locamil_db_pool_conexoes': ('gauge', 'Conexões do pool do SQLAlchemy por estado.'),
+    'locamil_db_pool_tamanho': ('gauge', 'Tamanho configurado do pool do SQLAlchemy (soma dos workers).'),
+    'locamil_cache_acertos_total': ('counter', 'Leituras atendidas pelo cache em memória, por cache.'),
+    'locamil_cache_falhas_total': ('counter', 'Leituras que recalcularam ou recarregaram o cache, por cache.'),
+    'locamil_cache_taxa_acerto': ('gauge', 'Acertos / leituras de cada cache desde a subida dos workers.'),
+    'locamil_reservas_criadas_total': ('counter', 'Locações criadas pelo formulário de nova locação.'),
+    'locamil_reservas_recusadas_total': ('counter', 'Reservas recusadas por motivo.'),
+    'locamil_exportacoes_total': ('counter', 'Exportações servidas por formato.'),
+    'locamil_workers': ('gauge', 'Workers vivos com métricas gravadas.'),
+}
+
+_IGNORADOS = ('metricas_prometheus', 'static')  # endpoints fora das métricas de requisição
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos_texto(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _pid_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metricas:
+    """Métricas deste processo e agregação dos instantâneos de todos os workers."""
+
+    def __init__(self):
+        self.pasta = None
+        self.intervalo = 1.0
+        self._contadores = {}    # (nome, rótulos) -> valor
+        self._histogramas = {}   # (nome, rótulos) -> [contagens por bucket..., soma]
+        self._gauges = {}        # (nome, rótulos) -> valor
+        self._coletores = []     # funções chamadas no instantâneo: [(nome, rótulos, valor), ...]
+        self._alterado = True
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    # ------------------------------------------------------------- registro
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+            self._alterado = True
+
+    def observar(self, nome, valor, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._lock:
+            serie = self._histogramas.get(chave)
+            if serie is None:
+                serie = self._histogramas[chave] = [0] * (len(BUCKETS) + 1) + [0.0]
+            serie[bisect.bisect_left(BUCKETS, valor)] += 1
+            serie[-1] += valor
+            self._alterado = True
+
+    def somar_gauge(self, nome, delta, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._lock:
+            self._gauges[chave] = self._gauges.get(chave, 0) + delta
+            self._alterado = True
+
+    def coletor(self, funcao):
+        """Registra uma função lida a cada instantâneo (valores mantidos por outros objetos)."""
+        self._coletores.append(funcao)
+        return funcao
+
+    def monitorar_cache(self, nome, acertos_falhas):
+        """Acertos e falhas de um cache em memória: `acertos_falhas()` -> (acertos, falhas)."""
+        def coletar():
+            acertos, falhas = acertos_falhas()
+            return [
+                ('locamil_cache_acertos_total', {'cache': nome}, acertos),
+                ('locamil_cache_falhas_total', {'cache': nome}, falhas),
+            ]
+        self.coletor(coletar)
+
+    # --------------------------------------------------------- instantâneos
+
+    def instantaneo(self):
+        """Estado deste processo, serializável em JSON."""
+        coletados = []
+        for funcao in self._coletores:
+            coletados.extend(funcao())
+        with self._lock:
+            contadores = [[nome, dict(rotulos), valor] for (nome, rotulos), valor in self._contadores.items()]
+            histogramas = [[nome, dict(rotulos), list(serie)] for (nome, rotulos), serie in self._histogramas.items()]
+            gauges = [[nome, dict(rotulos), valor] for (nome, rotulos), valor in self._gauges.items()]
+            self._alterado = False
+        for nome, rotulos, valor in coletados:
+            (gauges if DEFINICOES[nome][0] == 'gauge' else contadores).append([nome, rotulos, valor])
+        return {
+            'pid': os.getpid(),
+            'pai': os.getppid(),
+            'gravado_em': time.time(),
+            'contadores': contadores,
+            'histogramas': histogramas,
+            'gauges': gauges,
+        }
+
+    def gravar(self):
+        """Grava o instantâneo deste processo (troca atômica do arquivo)."""
+        if self.pasta is None:
+            return
+        conteudo = json.dumps(self.instantaneo(), ensure_ascii=False)
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, prefix='.tmp-', suffix='.json')
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, os.path.join(self.pasta, f'{os.getpid()}.json'))
+
+    def _instantaneos(self):
+        """Instantâneos da execução atual (mesmo processo mestre); apaga os de execuções mortas."""
+        pai = os.getppid()
+        for nome_arquivo in os.listdir(self.pasta):
+            if not nome_arquivo.endswith('.json') or nome_arquivo.startswith('.'):
+                continue
+            caminho = os.path.join(self.pasta, nome_arquivo)
+            try:
+                with open(caminho, encoding='utf-8') as arquivo:
+                    dados = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+            vivo = _pid_vivo(dados['pid'])
+            if dados['pai'] != pai and dados['pid'] != os.getpid():
+                if not vivo:
+                    try:
+                        os.remove(caminho)
+                    except OSError:
+                        pass
+                continue
+            yield dados, vivo
+
+    def agregar(self):
+        """
+        Soma os instantâneos dos workers.
+
+        Returns:
+            (dict, dict, dict): contadores, histogramas e gauges por (nome, rótulos)
+        """
+        if self.pasta is None:
+            dados = self.instantaneo()
+            fontes = [(dados, True)]
+        else:
+            self.gravar()
+            fontes = list(self._instantaneos())
+
+        contadores, histogramas, gauges = {}, {}, {}
+        workers = 0
+        for dados, vivo in fontes:
+            for nome, rotulos, valor in dados['contadores']:
+                chave = _chave(nome, rotulos)
+                contadores[chave] = contadores.get(chave, 0) + valor
+            for nome, rotulos, serie in dados['histogramas']:
+                chave = _chave(nome, rotulos)
+                atual = histogramas.setdefault(chave, [0] * len(serie))
+                for posicao, valor in enumerate(serie):
+                    atual[posicao] += valor
+            if not vivo:
+                continue
+            workers += 1
+            for nome, rotulos, valor in dados['gauges']:
+                chave = _chave(nome, rotulos)
+                gauges[chave] = gauges.get(chave, 0) + valor
+
+        gauges[_chave('locamil_workers', {})] = workers
+        for (nome, rotulos), acertos in list(contadores.items()):
+            if nome == 'locamil_cache_acertos_total':
+                leituras = acertos + contadores.get(('locamil_cache_falhas_total', rotulos), 0)
+                if leituras:
+                    gauges[('locamil_cache_taxa_acerto', rotulos)] = round(acertos / leituras, 4)
+        return contadores, histogramas, gauges
+
+    def texto(self):
+        """Exposição no formato texto do Prometheus (versão 0.0.4)."""
+        contadores, histogramas, gauges = self.agregar()
+        series = {}
+        for origem in (contadores, gauges, histogramas):
+            for (nome, rotulos), valor in origem.items():
+                series.setdefault(nome, []).append((rotulos, valor))
+
+        linhas = []
+        for nome in sorted(series):
+            tipo, ajuda = DEFINICOES.get(nome, ('untyped', ''))
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            for rotulos, valor in sorted(series[nome]):
+                if tipo != 'histogram':
+                    linhas.append(f'{nome}{_rotulos_texto(rotulos)} {_numero(valor)}')
+                    continue
+                acumulado = 0
+                for limite, quantidade in zip((*BUCKETS, float('inf')), valor[:-1]):
+                    acumulado += quantidade
+                    rotulos_bucket = (*rotulos, ('le', _numero(limite) if limite != float('inf') else '+Inf'))
+                    linhas.append(f'{nome}_bucket{_rotulos_texto(rotulos_bucket)} {acumulado}')
+                linhas.append(f'{nome}_sum{_rotulos_texto(rotulos)} {_numero(float(valor[-1]))}')
+                linhas.append(f'{nome}_count{_rotulos_texto(rotulos)} {acumulado}')
+        return '\n'.join(linhas) + '\n'
+
+    # -------------------------------------------------------------- gravador
+
+    def iniciar(self):
+        """Inicia a thread de gravação deste processo (uma vez por pid)."""
+        if self.pasta is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._gravar_periodicamente, name='metricas', daemon=True)
+            self._thread.start()
+        # Saída normal do worker (ex.: gunicorn reciclando): grava o que faltou
+        atexit.register(self.gravar)
+
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo)
+            if self._alterado:
+                try:
+                    self.gravar()
+                except OSError:
+                    pass  # disco cheio/pasta removida: tenta de novo no próximo intervalo
+
+
+metricas = Metricas()
+
+
+# ============================================================================
+# REQUISIÇÕES
+# ============================================================================
+
+def _concluir(endpoint, metodo, status, inicio, medicao):
+    if medicao is not None and medicao.sql:  # instrumentacao.py, quando ativa
+        metricas.incrementar('locamil_sql_instrucoes_total', medicao.sql, endpoint=endpoint)
+        metricas.incrementar('locamil_sql_duracao_segundos_total', medicao.db_ms / 1000, endpoint=endpoint)
+    metricas.observar('locamil_requisicao_duracao_segundos', time.perf_counter() - inicio,
+                      endpoint=endpoint, metodo=metodo)
+    metricas.incrementar('locamil_requisicoes_total', endpoint=endpoint, metodo=metodo, status=str(status))
+    metricas.somar_gauge('locamil_requisicoes_em_andamento', -1, endpoint=endpoint)
+
+
+def registrar(app, engine=None, ambiente=None):
+    """
+    Instala as métricas de requisição e o coletor do pool (uma vez, na criação do app).
+
+    Args:
+        app: Aplicação Flask
+        engine: Engine cujo pool é medido (padrão: nenhum)
+        ambiente: Variáveis de ambiente (padrão: os.environ)
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    if ambiente.get('METRICAS', 'True') != 'True':
+        return False
+    metricas.pasta = ambiente.get('METRICAS_DIR') or os.path.join(app.instance_path, 'metricas')
+    metricas.intervalo = float(ambiente.get('METRICAS_INTERVALO_S') or 1)
+    os.makedirs(metricas.pasta, exist_ok=True)
+
+    if engine is not None and hasattr(engine.pool, 'checkedout'):
+        pool = engine.pool
+
+        @metricas.coletor
+        def _coletar_pool():
+            return [
+                ('locamil_db_pool_conexoes', {'estado': 'em_uso'}, pool.checkedout()),
+                ('locamil_db_pool_conexoes', {'estado': 'livres'}, pool.checkedin()),
+                ('locamil_db_pool_conexoes', {'estado': 'overflow'}, max(0, pool.overflow())),
+                ('locamil_db_pool_tamanho', {}, pool.size()),
+            ]
+
+    def corpo_medido(corpo, dados):
+        try:
+            yield from corpo
+        finally:
+            _concluir(*dados)
+
+    @app.before_request
+    def _iniciar_metricas():
+        metricas.iniciar()
+        if request.endpoint in _IGNORADOS:
+            return
+        g.metricas_inicio = time.perf_counter()
+        metricas.somar_gauge('locamil_requisicoes_em_andamento', 1, endpoint=request.endpoint or 'desconhecido')
+
+    @app.after_request
+    def _concluir_metricas(resposta):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None:
+            return resposta
+        dados = (request.endpoint or 'desconhecido', request.method, resposta.status_code, inicio, g.get('medicao'))
+        if resposta.is_streamed:
+            # Exportações: a duração e o SQL vão até o último bloco
+            resposta.response = corpo_medido(resposta.response, dados)
+        else:
+            _concluir(*dados)
+        return resposta
+
+    return True
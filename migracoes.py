@@ -0,0 +1,406 @@
+"""
+Migrações versionadas do schema para bancos existentes (SQLite/PostgreSQL).
+
+`db.create_all()` só cria tabelas que ainda não existem; alterações em tabelas
+já criadas (índices, colunas novas) ficam registradas aqui, em ordem. Cada
+migração é idempotente e, depois de aplicada, é gravada na tabela
+`schema_versao`.
+
+Uso:
+    flask --app app migrar              # aplica as migrações pendentes
+    flask --app app migrar --status     # lista aplicadas/pendentes
+    flask --app app verificar-indices   # confere os planos (EXPLAIN)
+
+Criação das tabelas, migrações e seed rodam sob uma trava do banco (BEGIN
+IMMEDIATE no SQLite, pg_advisory_xact_lock no PostgreSQL): workers que sobem
+juntos aplicam cada migração uma única vez, e as versões aplicadas são relidas
+já com a trava.
+"""
+
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import bindparam, inspect, select, insert, text, update
+from sqlalchemy.exc import OperationalError
+from models import db
+
+
+Migracao = namedtuple('Migracao', ['versao', 'descricao', 'aplicar'])
+
+MIGRACOES = []
+
+# Chave da trava consultiva do PostgreSQL (qualquer bigint fixo do app)
+CHAVE_TRAVA_ESQUEMA = 7_460_001
+# Quanto um processo espera outro terminar de migrar (segundos)
+ESPERA_TRAVA_ESQUEMA = 600
+
+tabela_versao = db.Table(
+    'schema_versao',
+    db.Column('versao', db.Integer, primary_key=True),
+    db.Column('descricao', db.String(200), nullable=False),
+    db.Column('aplicada_em', db.DateTime, nullable=False),
+)
+
+
+def migracao(versao, descricao):
+    """Registra uma função como migração de schema da versão informada."""
+    def registrar(funcao):
+        MIGRACOES.append(Migracao(versao, descricao, funcao))
+        MIGRACOES.sort(key=lambda m: m.versao)
+        return funcao
+    return registrar
+
+
+TABELAS_INDEXADAS = ('carros', 'locacoes', 'gastos', 'clientes', 'locacoes_arquivo')
+
+
+def _colunas(conexao, nome_tabela):
+    return {coluna['name'] for coluna in inspect(conexao).get_columns(nome_tabela)}
+
+
+def _criar_indices(conexao, nome_tabela):
+    """
+    Cria os índices declarados no modelo que ainda não existem no banco.
+
+    Índices sobre colunas que uma migração posterior ainda vai adicionar ficam
+    para essa migração.
+    """
+    tabela = db.metadata.tables[nome_tabela]
+    existentes = _colunas(conexao, nome_tabela)
+    for indice in tabela.indexes:
+        if all(coluna.name in existentes for coluna in indice.columns):
+            indice.create(conexao, checkfirst=True)
+
+
+def atualizar_estatisticas(conexao):
+    """
+    Recalcula as estatísticas do planejador (ANALYZE) no SQLite e no PostgreSQL.
+
+    Sem elas o SQLite escolhe entre índices que atendem à mesma junção por
+    heurística, e a escolha muda com a ordem de criação dos índices e com
+    detalhes da consulta (o status da frota chegava a percorrer todas as
+    locações ativas por carro via ix_locacoes_status_devolucao). Executada
+    pela migração 8 e ao fim das cargas em massa (importação, dados
+    sintéticos, arquivamento).
+    """
+    if conexao.dialect.name in ('sqlite', 'postgresql'):
+        conexao.execute(text('ANALYZE'))
+
+
+# ============================================================================
+# MIGRAÇÕES
+# ============================================================================
+
+@migracao(1, 'Índices compostos de locações, gastos e clientes')
+def _indices_compostos(conexao):
+    for nome_tabela in ('locacoes', 'gastos', 'clientes'):
+        _criar_indices(conexao, nome_tabela)
+
+
+@migracao(2, 'Coluna updated_at (exportação incremental) em carros, clientes, locações e gastos')
+def _coluna_updated_at(conexao):
+    for nome_tabela in ('carros', 'clientes', 'locacoes', 'gastos'):
+        if 'updated_at' not in _colunas(conexao, nome_tabela):
+            tipo = db.DateTime().compile(dialect=conexao.dialect)
+            conexao.execute(text(f'ALTER TABLE {nome_tabela} ADD COLUMN updated_at {tipo}'))
+        # Linhas antigas: a última alteração conhecida é a criação
+        conexao.execute(text(
+            f'UPDATE {nome_tabela} SET updated_at = created_at WHERE updated_at IS NULL'
+        ))
+        _criar_indices(conexao, nome_tabela)
+
+
+@migracao(3, 'Tabela regras_preco (motor de precificação)')
+def _tabela_regras_preco(conexao):
+    db.metadata.tables['regras_preco'].create(conexao, checkfirst=True)
+
+
+@migracao(4, 'Restrição de exclusão de períodos sobrepostos por carro (somente PostgreSQL)')
+def _exclusao_periodos(conexao):
+    # No SQLite a reserva é serializada por BEGIN IMMEDIATE (reservas.py)
+    if conexao.dialect.name != 'postgresql':
+        return
+    existe = conexao.execute(text(
+        "SELECT 1 FROM pg_constraint WHERE conname = 'ex_locacoes_carro_periodo'"
+    )).first()
+    if existe:
+        return
+    conexao.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+    conexao.execute(text(
+        "ALTER TABLE locacoes ADD CONSTRAINT ex_locacoes_carro_periodo "
+        "EXCLUDE USING gist (carro_id WITH =, daterange(data_retirada, data_devolucao, '[]') WITH &&) "
+        "WHERE (status = 'ativa')"
+    ))
+
+
+@migracao(5, 'Nome normalizado de clientes (chave de busca) e índice de locações por cliente')
+def _nome_normalizado_clientes(conexao):
+    from clientes import normalizar_nome
+
+    if 'nome_normalizado' not in _colunas(conexao, 'clientes'):
+        conexao.execute(text('ALTER TABLE clientes ADD COLUMN nome_normalizado VARCHAR(100)'))
+
+    # Normalização (acentos, caixa) feita em Python, em lotes
+    clientes = db.metadata.tables['clientes']
+    pendentes = conexao.execute(
+        select(clientes.c.id, clientes.c.nome).where(clientes.c.nome_normalizado.is_(None))
+    ).all()
+    for inicio in range(0, len(pendentes), 10000):
+        conexao.execute(
+            update(clientes).where(clientes.c.id == bindparam('cliente_id'))
+            .values(nome_normalizado=bindparam('normalizado')),
+            [{'cliente_id': cliente_id, 'normalizado': normalizar_nome(nome)}
+             for cliente_id, nome in pendentes[inicio:inicio + 10000]]
+        )
+    _criar_indices(conexao, 'clientes')
+    _criar_indices(conexao, 'locacoes')
+
+
+@migracao(6, 'Tabela encerramentos_automaticos (registro do encerramento de locações vencidas)')
+def _tabela_encerramentos(conexao):
+    db.metadata.tables['encerramentos_automaticos'].create(conexao, checkfirst=True)
+
+
+@migracao(7, 'Tabela locacoes_arquivo (locações encerradas arquivadas)')
+def _tabela_locacoes_arquivo(conexao):
+    db.metadata.tables['locacoes_arquivo'].create(conexao, checkfirst=True)
+    _criar_indices(conexao, 'locacoes_arquivo')
+
+
+@migracao(8, 'Estatísticas do planejador (ANALYZE) para a escolha estável dos índices')
+def _estatisticas_planejador(conexao):
+    atualizar_estatisticas(conexao)
+
+
+@migracao(9, 'Resumo mensal calculado a partir das locações e gastos existentes')
+def _popular_resumo_mensal(conexao):
+    # O dashboard lê receitas e despesas só do resumo; bancos anteriores a ele
+    # mostrariam zero até um `reconstruir-resumo` manual
+    from resumo_mensal import reconstruir_resumo
+
+    db.metadata.tables['resumo_mensal'].create(conexao, checkfirst=True)
+    reconstruir_resumo(conexao=conexao)
+
+
+@migracao(10, 'Histórico ordenado por (data_retirada, id): índices sem created_at')
+def _indices_historico_sem_created_at(conexao):
+    # created_at aceita NULL; a chave do cursor do histórico passou a ser só
+    # colunas obrigatórias, e os índices acompanham a nova ordenação
+    for nome_tabela, nome_indice in (('locacoes', 'ix_locacoes_historico'),
+                                     ('locacoes_arquivo', 'ix_locacoes_arquivo_historico')):
+        conexao.execute(text(f'DROP INDEX IF EXISTS {nome_indice}'))
+        indice = next(i for i in db.metadata.tables[nome_tabela].indexes if i.name == nome_indice)
+        indice.create(conexao)
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+def travar_esquema(conexao):
+    """
+    Obtém a trava do bootstrap até o fim da transação corrente.
+
+    Deve ser a primeira instrução da transação: no SQLite, BEGIN IMMEDIATE
+    falha se a conexão já tiver iniciado uma transação comum.
+    """
+    if conexao.dialect.name == 'sqlite':
+        conexao.exec_driver_sql('BEGIN IMMEDIATE')
+    elif conexao.dialect.name == 'postgresql':
+        conexao.execute(text('SELECT pg_advisory_xact_lock(:chave)'), {'chave': CHAVE_TRAVA_ESQUEMA})
+
+
+@contextmanager
+def transacao_travada(engine=None, espera=ESPERA_TRAVA_ESQUEMA):
+    """
+    Transação com a trava do bootstrap, confirmada ao sair do bloco.
+
+    No SQLite, enquanto outro processo segura a trava (uma migração longa, por
+    exemplo), a tentativa é repetida até `espera` segundos.
+    """
+    engine = engine or db.engine
+    limite = time.monotonic() + espera
+    while True:
+        conexao = engine.connect()
+        try:
+            travar_esquema(conexao)
+            break
+        except OperationalError as erro:
+            conexao.close()
+            if 'database is locked' not in str(erro.orig).lower() or time.monotonic() >= limite:
+                raise
+            time.sleep(0.5)
+
+    try:
+        yield conexao
+        conexao.commit()
+    finally:
+        conexao.close()
+
+
+def criar_tabelas(engine=None):
+    """Cria as tabelas ausentes (db.create_all) sob a trava do bootstrap."""
+    with transacao_travada(engine) as conexao:
+        db.metadata.create_all(conexao)
+
+
+def versoes_aplicadas(conexao):
+    """Retorna o conjunto de versões já registradas no banco."""
+    tabela_versao.create(conexao, checkfirst=True)
+    return set(conexao.execute(select(tabela_versao.c.versao)).scalars())
+
+
+def aplicar_migracoes(engine=None):
+    """
+    Aplica, em ordem, as migrações ainda não registradas.
+
+    Cada migração roda na sua própria transação travada junto com o registro da
+    versão; a lista de versões é relida dentro dela, então um processo que
+    esperou a trava pula o que outro acabou de aplicar.
+
+    Returns:
+        list: Migrações aplicadas nesta execução
+    """
+    engine = engine or db.engine
+
+    # Leitura sem trava só para o caso comum (nada pendente) não serializar a subida
+    with engine.connect() as conexao:
+        if inspect(conexao).has_table(tabela_versao.name):
+            aplicadas = set(conexao.execute(select(tabela_versao.c.versao)).scalars())
+        else:
+            aplicadas = set()
+
+    executadas = []
+    for item in MIGRACOES:
+        if item.versao in aplicadas:
+            continue
+        with transacao_travada(engine) as conexao:
+            if item.versao in versoes_aplicadas(conexao):
+                continue
+            item.aplicar(conexao)
+            conexao.execute(insert(tabela_versao).values(
+                versao=item.versao,
+                descricao=item.descricao,
+                aplicada_em=datetime.utcnow()
+            ))
+        executadas.append(item)
+
+    return executadas
+
+
+def status_migracoes(engine=None):
+    """
+    Lista todas as migrações conhecidas e se já foram aplicadas.
+
+    Returns:
+        list: [(versao, descricao, aplicada: bool), ...]
+    """
+    engine = engine or db.engine
+    with engine.begin() as conexao:
+        aplicadas = versoes_aplicadas(conexao)
+    return [(item.versao, item.descricao, item.versao in aplicadas) for item in MIGRACOES]
+
+
+# ============================================================================
+# VERIFICAÇÃO DOS PLANOS DE EXECUÇÃO
+# ============================================================================
+
+def consultas_monitoradas(data_referencia=None):
+    """
+    Consultas dos caminhos quentes e o índice que cada uma deve usar.
+
+    Returns:
+        list: [(nome, statement, indice_esperado), ...]
+    """
+    from consultas import (
+        consulta_conflitos, consulta_carros_livres, consulta_proximas_devolucoes,
+        consulta_proximas_retiradas, consulta_historico, consulta_gastos_periodo, consulta_cliente_por_chave,
+        consulta_alteracoes, consulta_locacoes_vencidas
+    )
+    from models import Locacao, LocacaoArquivada
+    from frota import consulta_status_frota
+
+    hoje = data_referencia or date.today()
+    semana = hoje + timedelta(days=7)
+
+    return [
+        ('disponibilidade', consulta_conflitos(1, hoje, semana).limit(1).statement,
+         'ix_locacoes_carro_status_periodo'),
+        ('carros_livres', consulta_carros_livres(hoje, semana).statement,
+         'ix_locacoes_carro_status_periodo'),
+        ('status_frota', consulta_status_frota(hoje).statement,
+         'ix_locacoes_carro_status_periodo'),
+        ('proximas_devolucoes', consulta_proximas_devolucoes(hoje, semana).limit(10).statement,
+         'ix_locacoes_status_devolucao'),
+        ('proximas_retiradas', consulta_proximas_retiradas(hoje, semana).limit(10).statement,
+         'ix_locacoes_status_retirada'),
+        ('locacoes_vencidas', consulta_locacoes_vencidas(hoje).statement,
+         'ix_locacoes_status_devolucao'),
+        ('historico', consulta_historico().limit(50).statement,
+         'ix_locacoes_historico'),
+        ('historico_arquivo', consulta_historico(LocacaoArquivada).limit(50).statement,
+         'ix_locacoes_arquivo_historico'),
+        ('gastos_periodo', consulta_gastos_periodo(hoje - timedelta(days=180), hoje).statement,
+         'ix_gastos_data_gasto'),
+        ('cliente_por_chave', consulta_cliente_por_chave('cliente', '+5511999999999').limit(1).statement,
+         'ix_clientes_chave'),
+        ('alteracoes_locacoes',
+         consulta_alteracoes(Locacao, datetime.combine(hoje, datetime.min.time()), datetime.utcnow()),
+         'ix_locacoes_updated_at'),
+    ]
+
+
+def explicar(conexao, statement):
+    """Retorna o plano de execução da consulta como texto (EXPLAIN do banco)."""
+    sql = str(statement.compile(dialect=conexao.dialect, compile_kwargs={'literal_binds': True}))
+
+    if conexao.dialect.name == 'sqlite':
+        linhas = conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+        return '\n'.join(linha[-1] for linha in linhas)
+
+    if conexao.dialect.name == 'postgresql':
+        # Em tabelas pequenas o Postgres prefere seq scan; forçar o uso de
+        # índices mostra se eles são aplicáveis à consulta
+        conexao.execute(text('SET LOCAL enable_seqscan = off'))
+        linhas = conexao.exec_driver_sql(f'EXPLAIN {sql}').all()
+        return '\n'.join(linha[0] for linha in linhas)
+
+    linhas = conexao.exec_driver_sql(f'EXPLAIN {sql}').all()
+    return '\n'.join(' '.join(str(coluna) for coluna in linha) for linha in linhas)
+
+
+def verificar_planos(engine=None, data_referencia=None):
+    """
+    Confere se as consultas monitoradas usam os índices esperados.
+
+    Returns:
+        list: [{'consulta', 'indice', 'usa_indice', 'plano'}, ...]
+    """
+    engine = engine or db.engine
+    resultados = []
+
+    for nome, statement, indice in consultas_monitoradas(data_referencia):
+        with engine.begin() as conexao:
+            plano = explicar(conexao, statement)
+        resultados.append({
+            'consulta': nome,
+            'indice': indice,
+            'usa_indice': indice in plano,
+            'plano': plano
+        })
+
+    return resultados
+
+
+def indices_ausentes(engine=None):
+    """Índices declarados nos modelos que não existem no banco."""
+    engine = engine or db.engine
+    inspetor = inspect(engine)
+    ausentes = []
+    for nome_tabela in TABELAS_INDEXADAS:
+        existentes = {indice['name'] for indice in inspetor.get_indexes(nome_tabela)}
+        for indice in db.metadata.tables[nome_tabela].indexes:
+            if indice.name not in existentes:
+                ausentes.append(indice.name)
+    return ausentes
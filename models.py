@@ -11,6 +11,10 @@ db = SQLAlchemy()
 class Carro(db.Model):
     """Modelo para representar um veículo da frota."""
     __tablename__ = 'carros'
+    __table_args__ = (
+        # Exportação incremental (alterações desde uma marca)
+        db.Index('ix_carros_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     modelo = db.Column(db.String(50), nullable=False)
@@ -22,6 +26,7 @@ class Carro(db.Model):
     ativo = db.Column(db.Boolean, default=True)
     em_manutencao = db.Column(db.Boolean, default=False)  # Carros em manutenção não podem ser alugados
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relacionamentos
     locacoes = db.relationship('Locacao', backref='carro', lazy=True, cascade='all, delete-orphan')
@@ -48,11 +53,19 @@ class Carro(db.Model):
 class Cliente(db.Model):
     """Modelo para representar um cliente."""
     __tablename__ = 'clientes'
+    __table_args__ = (
+        db.Index('ix_clientes_nome', 'nome'),
+        # Identificação do cliente: nome normalizado + WhatsApp E.164 (clientes.py)
+        db.Index('ix_clientes_chave', 'nome_normalizado', 'whatsapp'),
+        db.Index('ix_clientes_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
+    nome_normalizado = db.Column(db.String(100), nullable=True)  # sem acentos/caixa; preenchido no flush
     whatsapp = db.Column(db.String(20), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relacionamento com locações
     locacoes = db.relationship('Locacao', backref='cliente', lazy=True)
@@ -69,22 +82,8 @@ class Cliente(db.Model):
         }
 
 
-class Locacao(db.Model):
-    """Modelo para representar uma locação."""
-    __tablename__ = 'locacoes'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    carro_id = db.Column(db.Integer, db.ForeignKey('carros.id'), nullable=False)
-    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
-    data_retirada = db.Column(db.Date, nullable=False)
-    data_devolucao = db.Column(db.Date, nullable=False)
-    valor_total = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), default='ativa')  # ativa, finalizada, cancelada
-    observacoes = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __repr__(self):
-        return f'<Locacao {self.id} - {self.carro.modelo}>'
+class DadosLocacao:
+    """Métodos comuns às locações da tabela principal e do arquivo."""
     
     def to_dict(self):
         """Converte o objeto para dicionário."""
@@ -107,9 +106,82 @@ class Locacao(db.Model):
         return 0
 
 
+class Locacao(DadosLocacao, db.Model):
+    """Modelo para representar uma locação."""
+    __tablename__ = 'locacoes'
+    __table_args__ = (
+        # Disponibilidade e status da frota: carro + status + período
+        db.Index('ix_locacoes_carro_status_periodo', 'carro_id', 'status', 'data_retirada', 'data_devolucao'),
+        # Dashboard: próximas retiradas e devoluções
+        db.Index('ix_locacoes_status_retirada', 'status', 'data_retirada'),
+        db.Index('ix_locacoes_status_devolucao', 'status', 'data_devolucao'),
+        # Histórico ordenado por data de retirada
+        db.Index('ix_locacoes_historico', 'data_retirada', 'id'),
+        # Exportação incremental (alterações desde uma marca)
+        db.Index('ix_locacoes_updated_at', 'updated_at'),
+        # Locações de um cliente (deduplicação de clientes)
+        db.Index('ix_locacoes_cliente', 'cliente_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    carro_id = db.Column(db.Integer, db.ForeignKey('carros.id'), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    data_retirada = db.Column(db.Date, nullable=False)
+    data_devolucao = db.Column(db.Date, nullable=False)
+    valor_total = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='ativa')  # ativa, finalizada, cancelada
+    observacoes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        # Não dispara consulta só para exibir o modelo do carro
+        if 'carro' in db.inspect(self).unloaded:
+            return f'<Locacao {self.id} - carro {self.carro_id}>'
+        return f'<Locacao {self.id} - {self.carro.modelo if self.carro else None}>'
+
+
+class LocacaoArquivada(DadosLocacao, db.Model):
+    """
+    Locação encerrada (finalizada ou cancelada) movida para o arquivo.
+    
+    Mesmas colunas e ids de Locacao, mais o momento do arquivamento (ver
+    arquivamento.py). Histórico, exportações e o resumo mensal leem as duas
+    tabelas; disponibilidade e dashboard só a tabela principal.
+    """
+    __tablename__ = 'locacoes_arquivo'
+    __table_args__ = (
+        db.Index('ix_locacoes_arquivo_historico', 'data_retirada', 'id'),
+        db.Index('ix_locacoes_arquivo_updated_at', 'updated_at'),
+        db.Index('ix_locacoes_arquivo_cliente', 'cliente_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    carro_id = db.Column(db.Integer, db.ForeignKey('carros.id'), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    data_retirada = db.Column(db.Date, nullable=False)
+    data_devolucao = db.Column(db.Date, nullable=False)
+    valor_total = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # finalizada, cancelada
+    observacoes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    arquivada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    carro = db.relationship('Carro', lazy=True)
+    cliente = db.relationship('Cliente', lazy=True)
+    
+    def __repr__(self):
+        return f'<LocacaoArquivada {self.id} - carro {self.carro_id}>'
+
+
 class Gasto(db.Model):
     """Modelo para representar gastos operacionais com veículos."""
     __tablename__ = 'gastos'
+    __table_args__ = (
+        db.Index('ix_gastos_data_gasto', 'data_gasto'),
+        db.Index('ix_gastos_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     carro_id = db.Column(db.Integer, db.ForeignKey('carros.id'), nullable=False)
@@ -118,6 +190,7 @@ class Gasto(db.Model):
     valor = db.Column(db.Float, nullable=False)
     data_gasto = db.Column(db.Date, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
         return f'<Gasto {self.tipo} - R$ {self.valor}>'
@@ -133,3 +206,108 @@ class Gasto(db.Model):
             'valor': self.valor,
             'data_gasto': self.data_gasto.strftime('%d/%m/%Y') if self.data_gasto else None
         }
+
+
+class RegraPreco(db.Model):
+    """
+    Regra de preço aplicada sobre a diária do carro (ver precificacao.py).
+    
+    Regras com `dias_minimos` são descontos por duração: vale a de maior
+    `dias_minimos` atendida pela locação. As demais valem por dia e se
+    acumulam (multiplicam) quando o dia atende a todas as condições
+    informadas: dias da semana, período e categoria do carro.
+    """
+    __tablename__ = 'regras_preco'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    multiplicador = db.Column(db.Float, nullable=False)  # 1.2 = +20%, 0.9 = -10%
+    categoria = db.Column(db.String(30), nullable=True)  # None = todas as categorias
+    dias_semana = db.Column(db.String(20), nullable=True)  # '5,6' = sábado e domingo (0 = segunda)
+    data_inicio = db.Column(db.Date, nullable=True)  # temporada (inclusive)
+    data_fim = db.Column(db.Date, nullable=True)
+    dias_minimos = db.Column(db.Integer, nullable=True)  # desconto por duração
+    ativo = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RegraPreco {self.nome} x{self.multiplicador}>'
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário."""
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'multiplicador': self.multiplicador,
+            'categoria': self.categoria,
+            'dias_semana': self.dias_semana,
+            'data_inicio': self.data_inicio.isoformat() if self.data_inicio else None,
+            'data_fim': self.data_fim.isoformat() if self.data_fim else None,
+            'dias_minimos': self.dias_minimos,
+            'ativo': self.ativo
+        }
+
+
+class EncerramentoAutomatico(db.Model):
+    """
+    Registro de uma execução do encerramento automático de locações vencidas.
+    
+    Guarda quais locações passaram de 'ativa' para 'finalizada' (ver
+    encerramento.py); execuções que não encerram nada não são registradas.
+    """
+    __tablename__ = 'encerramentos_automaticos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    executado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    data_limite = db.Column(db.Date, nullable=False)  # devolução anterior a esta data = vencida
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    locacao_ids = db.Column(db.Text, nullable=False, default='')  # '12,15,31'
+    origem = db.Column(db.String(20), nullable=False, default='cli')  # cli, agendador
+    
+    def __repr__(self):
+        return f'<EncerramentoAutomatico {self.executado_em} {self.quantidade}>'
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário."""
+        return {
+            'id': self.id,
+            'executado_em': self.executado_em.isoformat() if self.executado_em else None,
+            'data_limite': self.data_limite.isoformat() if self.data_limite else None,
+            'quantidade': self.quantidade,
+            'locacao_ids': [int(locacao_id) for locacao_id in self.locacao_ids.split(',') if locacao_id],
+            'origem': self.origem
+        }
+
+
+class ResumoMensal(db.Model):
+    """
+    Agregado mensal de receitas e despesas por categoria de carro e status.
+    
+    Mantido incrementalmente a cada escrita em Locacao/Gasto (ver resumo_mensal.py).
+    Linhas de despesa usam o status 'despesa'.
+    """
+    __tablename__ = 'resumo_mensal'
+    
+    mes = db.Column(db.String(7), primary_key=True)  # AAAA-MM
+    categoria = db.Column(db.String(30), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)  # ativa, finalizada, cancelada, despesa
+    receita = db.Column(db.Float, nullable=False, default=0.0)
+    despesas = db.Column(db.Float, nullable=False, default=0.0)
+    quantidade_locacoes = db.Column(db.Integer, nullable=False, default=0)
+    quantidade_gastos = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ResumoMensal {self.mes} {self.categoria} {self.status}>'
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário."""
+        return {
+            'mes': self.mes,
+            'categoria': self.categoria,
+            'status': self.status,
+            'receita': self.receita,
+            'despesas': self.despesas,
+            'quantidade_locacoes': self.quantidade_locacoes,
+            'quantidade_gastos': self.quantidade_gastos
+        }
@@ -0,0 +1,110 @@
+"""
+Orçamento de consultas SQL por rota, para detectar regressões N+1.
+
+Cada rota pode declarar quantas consultas pode executar por requisição com o
+decorador `@orcamento_consultas(n)`. Todas as instruções enviadas ao banco
+durante a requisição são contadas por um evento do SQLAlchemy; se a rota
+passar do orçamento, a requisição falha quando `ORCAMENTO_CONSULTAS_ESTRITO`
+estiver ativo (testes, `flask verificar-orcamentos`) ou gera um aviso no log
+em produção.
+
+Em respostas em streaming (exportações) as consultas acontecem enquanto o
+corpo é enviado, depois do `after_request`; nesse caso a verificação roda ao
+fim do último bloco.
+"""
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class OrcamentoConsultasExcedido(RuntimeError):
+    """Uma rota executou mais consultas SQL do que o orçamento declarado."""
+
+
+def orcamento_consultas(limite):
+    """Declara o número máximo de consultas SQL por requisição da rota."""
+    def decorar(funcao):
+        funcao.orcamento_consultas = limite
+        return funcao
+    return decorar
+
+
+class ContadorConsultas:
+    """
+    Conta as consultas executadas dentro de um bloco `with`.
+
+    Exemplo:
+        with ContadorConsultas() as contador:
+            exportar_json()
+        assert contador.total <= 5
+    """
+
+    _ativos = []
+
+    def __init__(self):
+        self.total = 0
+        self.instrucoes = []
+
+    def __enter__(self):
+        ContadorConsultas._ativos.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        ContadorConsultas._ativos.remove(self)
+        return False
+
+
+class ContagemRequisicao:
+    """Consultas da requisição atual (guardada em `g`, vale também durante o streaming)."""
+
+    def __init__(self):
+        self.total = 0
+        self.excedido = False
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _contar_consulta(conexao, cursor, instrucao, parametros, contexto, executemany):
+    for contador in ContadorConsultas._ativos:
+        contador.total += 1
+        contador.instrucoes.append(instrucao)
+    if has_app_context() and 'contagem_consultas' in g:
+        g.contagem_consultas.total += 1
+
+
+def registrar(app):
+    """Instala a verificação de orçamento ao fim de cada requisição."""
+    app.config.setdefault('ORCAMENTO_CONSULTAS_ESTRITO', app.testing)
+
+    def verificar(contagem, endpoint, limite):
+        if contagem.total > limite and not contagem.excedido:
+            contagem.excedido = True
+            mensagem = (
+                f"Rota {endpoint} executou {contagem.total} consultas SQL "
+                f"(orçamento: {limite})"
+            )
+            if app.config['ORCAMENTO_CONSULTAS_ESTRITO']:
+                raise OrcamentoConsultasExcedido(mensagem)
+            app.logger.warning(mensagem)
+
+    def corpo_verificado(corpo, contagem, endpoint, limite):
+        yield from corpo
+        verificar(contagem, endpoint, limite)
+
+    @app.before_request
+    def _zerar_contador():
+        g.contagem_consultas = ContagemRequisicao()
+
+    @app.after_request
+    def _verificar_orcamento(resposta):
+        funcao = app.view_functions.get(request.endpoint)
+        limite = getattr(funcao, 'orcamento_consultas', None)
+        contagem = g.get('contagem_consultas')
+        if limite is None or contagem is None:
+            return resposta
+
+        if resposta.is_streamed:
+            resposta.response = corpo_verificado(resposta.response, contagem, request.endpoint, limite)
+        else:
+            verificar(contagem, request.endpoint, limite)
+        return resposta
@@ -0,0 +1,351 @@
+"""
+Motor de precificação por regras, avaliado de forma vetorizada (NumPy).
+
+As regras ficam no banco (`RegraPreco`) e são compiladas em arrays junto com
+as diárias e categorias da frota. A matriz de preços carros × dias de um
+período sai de uma única avaliação vetorizada, sem laços em Python por carro
+ou por dia:
+
+    regras por dia      dia_vale (R × D)  = dia da semana ∈ regra  e  dia ∈ temporada
+                        vale_carro (C × R) = regra sem categoria ou da categoria do carro
+                        fator (C × D)      = exp(vale_carro @ (dia_vale · log multiplicador))
+
+    regras por duração  vale a de maior `dias_minimos` atendida pela locação
+                        (argmax por carro), aplicada sobre todos os dias
+
+Regras por dia se acumulam: um sábado de alta temporada com as regras
+"fim de semana x1.2" e "temporada x1.3" custa 1.56 diária. Sem regras, o
+valor é exatamente `dias * valor_diaria`, como antes.
+
+Uso:
+    flask --app app regras-preco
+    flask --app app adicionar-regra-preco "Fim de semana" 1.2 --dias-semana 5,6
+    flask --app app benchmark-precos --carros 1000 --dias 30
+"""
+
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import select
+from models import RegraPreco
+
+
+NOMES_DIAS_SEMANA = ('seg', 'ter', 'qua', 'qui', 'sex', 'sáb', 'dom')
+
+# Ordinal (date.toordinal) dos limites de temporada quando a regra não tem período
+_SEM_INICIO = 0
+_SEM_FIM = date.max.toordinal()
+
+
+def ler_dias_semana(texto):
+    """
+    Converte '5,6' (0 = segunda ... 6 = domingo) numa tupla ordenada de dias.
+
+    Raises:
+        ValueError: Se algum dia não estiver entre 0 e 6
+    """
+    if not texto:
+        return ()
+    dias = set()
+    for parte in str(texto).split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        dia = int(parte)
+        if not 0 <= dia <= 6:
+            raise ValueError(f"Dia da semana inválido: {parte} (use 0 = segunda ... 6 = domingo)")
+        dias.add(dia)
+    return tuple(sorted(dias))
+
+
+def validar_regra(regra):
+    """
+    Confere os campos de uma RegraPreco antes de gravar.
+
+    Raises:
+        ValueError: Com a mensagem do primeiro problema encontrado
+    """
+    if not regra.nome:
+        raise ValueError("Informe o nome da regra.")
+    if regra.multiplicador is None or regra.multiplicador <= 0:
+        raise ValueError("O multiplicador deve ser maior que zero.")
+    ler_dias_semana(regra.dias_semana)
+    if regra.data_inicio and regra.data_fim and regra.data_fim < regra.data_inicio:
+        raise ValueError("O fim da temporada não pode ser anterior ao início.")
+    if regra.dias_minimos is not None:
+        if regra.dias_minimos < 1:
+            raise ValueError("dias_minimos deve ser pelo menos 1.")
+        if regra.dias_semana or regra.data_inicio or regra.data_fim:
+            raise ValueError("Regras por duração (dias_minimos) não combinam com dias da semana ou temporada.")
+
+
+class MotorPrecos:
+    """
+    Frota e regras compiladas em arrays.
+
+    Instâncias são imutáveis depois de criadas: a tabela de tarifas troca o
+    motor inteiro quando diárias ou regras mudam.
+    """
+
+    def __init__(self, carros, regras=()):
+        """
+        Args:
+            carros: Iterável de (carro_id, valor_diaria, categoria)
+            regras: Iterável de regras ativas (linhas de `consulta_regras_ativas` ou
+                    objetos com os mesmos atributos)
+        """
+        carros = sorted(carros, key=lambda carro: carro[0])
+        categorias = {}
+        self.carro_ids = np.array([carro[0] for carro in carros], dtype=np.int64)
+        self.diarias = np.array([carro[1] or 0.0 for carro in carros], dtype=np.float64)
+        self.categorias = np.array(
+            [categorias.setdefault(carro[2], len(categorias)) for carro in carros], dtype=np.int64
+        )
+
+        por_dia = [regra for regra in regras if regra.dias_minimos is None]
+        por_duracao = sorted(
+            (regra for regra in regras if regra.dias_minimos is not None),
+            key=lambda regra: (regra.dias_minimos, regra.multiplicador)
+        )
+        self.total_regras = len(por_dia) + len(por_duracao)
+
+        # Categoria da regra: -1 = todas; -2 = categoria sem nenhum carro
+        def codigo(categoria):
+            return -1 if not categoria else categorias.get(categoria, -2)
+
+        # Regras por dia
+        self.dia_log_mult = np.log(np.array([regra.multiplicador for regra in por_dia], dtype=np.float64))
+        self.dia_categoria = np.array([codigo(regra.categoria) for regra in por_dia], dtype=np.int64)
+        self.dia_semana = np.ones((len(por_dia), 7), dtype=bool)
+        for posicao, regra in enumerate(por_dia):
+            dias = ler_dias_semana(regra.dias_semana)
+            if dias:
+                self.dia_semana[posicao] = False
+                self.dia_semana[posicao, list(dias)] = True
+        self.dia_inicio = np.array(
+            [regra.data_inicio.toordinal() if regra.data_inicio else _SEM_INICIO for regra in por_dia],
+            dtype=np.int64
+        )
+        self.dia_fim = np.array(
+            [regra.data_fim.toordinal() if regra.data_fim else _SEM_FIM for regra in por_dia],
+            dtype=np.int64
+        )
+        # C × R: regras por dia que valem para cada carro (pela categoria)
+        self.dia_vale_carro = self._vale_carro(self.dia_categoria)
+
+        # Regras por duração (ordenadas: o argmax pega a menor entre faixas iguais)
+        self.duracao_minimos = np.array([regra.dias_minimos for regra in por_duracao], dtype=np.int64)
+        self.duracao_mult = np.array([regra.multiplicador for regra in por_duracao], dtype=np.float64)
+        self.duracao_vale_carro = self._vale_carro(
+            np.array([codigo(regra.categoria) for regra in por_duracao], dtype=np.int64)
+        )
+
+    def _vale_carro(self, categorias_regras):
+        """Matriz booleana carros × regras: a regra vale para a categoria do carro."""
+        return (categorias_regras[None, :] == -1) | (self.categorias[:, None] == categorias_regras[None, :])
+
+    # --------------------------------------------------------------- avaliação
+
+    def posicoes(self, carro_ids):
+        """
+        Posições dos carros nos arrays do motor.
+
+        Returns:
+            (np.ndarray, np.ndarray): (posicoes, encontrado) — posições de carros
+            inexistentes são inválidas e vêm marcadas com encontrado=False
+        """
+        carro_ids = np.asarray(carro_ids, dtype=np.int64)
+        if len(self.carro_ids) == 0:
+            return np.zeros(len(carro_ids), dtype=np.int64), np.zeros(len(carro_ids), dtype=bool)
+        posicoes = np.minimum(np.searchsorted(self.carro_ids, carro_ids), len(self.carro_ids) - 1)
+        return posicoes, self.carro_ids[posicoes] == carro_ids
+
+    def _fatores(self, posicoes, data_retirada, data_devolucao):
+        """Fatores por dia (C × D) e por duração (C) dos carros nas posições informadas."""
+        dias = np.arange(data_retirada.toordinal(), data_devolucao.toordinal() + 1, dtype=np.int64)
+        dia_semana = (dias - 1) % 7  # date.fromordinal(1) é uma segunda-feira
+
+        if len(self.dia_log_mult):
+            dia_vale = (
+                self.dia_semana[:, dia_semana]
+                & (dias[None, :] >= self.dia_inicio[:, None])
+                & (dias[None, :] <= self.dia_fim[:, None])
+            )
+            log_fator = self.dia_vale_carro[posicoes].astype(np.float64) @ (dia_vale * self.dia_log_mult[:, None])
+            fator_dia = np.exp(log_fator)
+        else:
+            fator_dia = np.ones((len(posicoes), len(dias)), dtype=np.float64)
+
+        fator_duracao = np.ones(len(posicoes), dtype=np.float64)
+        if len(self.duracao_minimos):
+            atende = self.duracao_vale_carro[posicoes] & (self.duracao_minimos[None, :] <= len(dias))
+            melhor = np.argmax(np.where(atende, self.duracao_minimos[None, :], -1), axis=1)
+            fator_duracao = np.where(atende.any(axis=1), self.duracao_mult[melhor], 1.0)
+
+        return fator_dia, fator_duracao
+
+    def matriz(self, data_retirada, data_devolucao, carro_ids=None):
+        """
+        Matriz de diárias carros × dias do período (inclusive).
+
+        Args:
+            data_retirada: Primeiro dia
+            data_devolucao: Último dia (não anterior a data_retirada)
+            carro_ids: IDs dos carros (padrão: todos, na ordem de cadastro); IDs
+                       inexistentes geram linhas de zeros
+
+        Returns:
+            np.ndarray: Array float64 de forma (carros, dias)
+        """
+        if carro_ids is None:
+            carro_ids = self.carro_ids
+        posicoes, encontrado = self.posicoes(carro_ids)
+        if not len(self.carro_ids):
+            return np.zeros((len(posicoes), (data_devolucao - data_retirada).days + 1))
+        fator_dia, fator_duracao = self._fatores(posicoes, data_retirada, data_devolucao)
+        diarias = np.where(encontrado, self.diarias[posicoes] * fator_duracao, 0.0)
+        return diarias[:, None] * fator_dia
+
+    def totais(self, data_retirada, data_devolucao, posicoes):
+        """
+        Valores totais (não arredondados) dos carros nas posições informadas.
+
+        Sem regras, `diaria * fator_duracao * soma(fator_dia)` é exatamente
+        `diaria * dias`, o mesmo cálculo de `tarifas.valor_total`.
+        """
+        fator_dia, fator_duracao = self._fatores(posicoes, data_retirada, data_devolucao)
+        return self.diarias[posicoes] * fator_duracao * fator_dia.sum(axis=1)
+
+
+def consulta_regras_ativas():
+    """SELECT das colunas usadas pelo motor, só das regras ativas."""
+    return (
+        select(
+            RegraPreco.id, RegraPreco.nome, RegraPreco.multiplicador, RegraPreco.categoria,
+            RegraPreco.dias_semana, RegraPreco.data_inicio, RegraPreco.data_fim, RegraPreco.dias_minimos
+        )
+        .where(RegraPreco.ativo.is_(True))
+        .order_by(RegraPreco.id)
+    )
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+class _RegraSintetica:
+    """Regra em memória com os atributos de RegraPreco (para o benchmark)."""
+
+    def __init__(self, nome, multiplicador, categoria=None, dias_semana=None,
+                 data_inicio=None, data_fim=None, dias_minimos=None):
+        self.nome = nome
+        self.multiplicador = multiplicador
+        self.categoria = categoria
+        self.dias_semana = dias_semana
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.dias_minimos = dias_minimos
+
+
+def _matriz_referencia(carros, regras, data_retirada, data_devolucao):
+    """Mesma matriz de `MotorPrecos.matriz` com laços por carro e por dia (para comparação)."""
+    dias = (data_devolucao - data_retirada).days + 1
+    linhas = []
+    for _, valor_diaria, categoria in carros:
+        duracao = [
+            regra for regra in regras
+            if regra.dias_minimos is not None and regra.dias_minimos <= dias
+            and (not regra.categoria or regra.categoria == categoria)
+        ]
+        fator_duracao = 1.0
+        if duracao:
+            fator_duracao = min(duracao, key=lambda regra: (-regra.dias_minimos, regra.multiplicador)).multiplicador
+        linha = []
+        for deslocamento in range(dias):
+            dia = data_retirada + timedelta(days=deslocamento)
+            fator = 1.0
+            for regra in regras:
+                if regra.dias_minimos is not None:
+                    continue
+                if regra.categoria and regra.categoria != categoria:
+                    continue
+                if regra.dias_semana and dia.weekday() not in ler_dias_semana(regra.dias_semana):
+                    continue
+                if regra.data_inicio and dia < regra.data_inicio:
+                    continue
+                if regra.data_fim and dia > regra.data_fim:
+                    continue
+                fator *= regra.multiplicador
+            linha.append(valor_diaria * fator_duracao * fator)
+        linhas.append(linha)
+    return linhas
+
+
+def _percentil(amostras, percentil):
+    ordenadas = sorted(amostras)
+    posicao = min(len(ordenadas) - 1, max(0, round(percentil / 100 * len(ordenadas)) - 1))
+    return ordenadas[posicao]
+
+
+def benchmark(carros=1000, dias=30, repeticoes=50, semente=42):
+    """
+    Mede a latência da matriz de preços carros × dias com uma frota e regras sintéticas.
+
+    Compara a avaliação vetorizada com a implementação de referência em Python
+    puro (laços por carro e por dia) e confere que as duas dão o mesmo resultado.
+
+    Returns:
+        dict: Tamanho do problema, regras, p50/p95/máximo (ms) do motor, tempo
+              da referência (ms), aceleração e maior diferença entre as matrizes
+    """
+    aleatorio = random.Random(semente)
+    categorias = ('Econômico', 'Conforto', 'SUV', 'Premium')
+    frota = [
+        (carro_id, round(aleatorio.uniform(70, 400), 2), aleatorio.choice(categorias))
+        for carro_id in range(1, carros + 1)
+    ]
+    inicio = date.today()
+    fim = inicio + timedelta(days=dias - 1)
+    regras = [
+        _RegraSintetica('Fim de semana', 1.2, dias_semana='5,6'),
+        _RegraSintetica('Sexta SUV', 1.1, categoria='SUV', dias_semana='4'),
+        _RegraSintetica('Alta temporada', 1.3, data_inicio=inicio + timedelta(days=dias // 3),
+                        data_fim=inicio + timedelta(days=2 * dias // 3)),
+        _RegraSintetica('Premium feriado', 1.5, categoria='Premium',
+                        data_inicio=inicio + timedelta(days=dias // 2), data_fim=inicio + timedelta(days=dias // 2)),
+        _RegraSintetica('Semanal', 0.9, dias_minimos=7),
+        _RegraSintetica('Mensal', 0.8, dias_minimos=28),
+        _RegraSintetica('Mensal econômico', 0.75, categoria='Econômico', dias_minimos=28),
+    ]
+
+    inicio_compilacao = time.perf_counter()
+    motor = MotorPrecos(frota, regras)
+    compilacao_ms = (time.perf_counter() - inicio_compilacao) * 1000
+
+    amostras = []
+    for _ in range(repeticoes):
+        inicio_medicao = time.perf_counter()
+        matriz = motor.matriz(inicio, fim)
+        amostras.append((time.perf_counter() - inicio_medicao) * 1000)
+
+    inicio_referencia = time.perf_counter()
+    referencia = np.array(_matriz_referencia(frota, regras, inicio, fim))
+    referencia_ms = (time.perf_counter() - inicio_referencia) * 1000
+
+    p50 = statistics.median(amostras)
+    return {
+        'carros': carros,
+        'dias': dias,
+        'regras': len(regras),
+        'repeticoes': repeticoes,
+        'compilacao_ms': round(compilacao_ms, 3),
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(_percentil(amostras, 95), 3),
+        'max_ms': round(max(amostras), 3),
+        'referencia_ms': round(referencia_ms, 3),
+        'aceleracao': round(referencia_ms / p50, 1) if p50 else None,
+        'diferenca_maxima': float(np.abs(matriz - referencia).max()) if matriz.size else 0.0,
+    }
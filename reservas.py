@@ -0,0 +1,270 @@
+"""
+Reserva atômica de carros (criação de locações sem corrida entre workers).
+
+Verificar a disponibilidade e só depois gravar a locação deixa uma janela em
+que dois atendentes reservam o mesmo carro ao mesmo tempo. Aqui a checagem no
+banco e o INSERT acontecem na mesma transação, que começa travando:
+
+    SQLite      BEGIN IMMEDIATE: a transação já nasce com a trava de escrita do
+                banco, então a checagem enxerga todas as locações confirmadas e
+                nenhum outro processo grava até o commit
+    PostgreSQL  SELECT ... FOR UPDATE na linha do carro: reservas do mesmo
+                carro se enfileiram, as de carros diferentes seguem em paralelo.
+                A restrição de exclusão `ex_locacoes_carro_periodo` (migração 4)
+                garante o mesmo no próprio banco
+
+Quando a trava não é obtida a tempo (banco ocupado, deadlock, falha de
+serialização) a transação é desfeita e repetida com espera crescente. Uma
+sobreposição real com outra locação não é repetida: vira CarroIndisponivel.
+
+Uso:
+    flask --app app estresse-reservas --processos 16 --carros 2
+"""
+
+import os
+import random
+import tempfile
+import time
+import multiprocessing
+from datetime import date, timedelta
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from models import db, Carro, Cliente, Locacao
+from consultas import consulta_conflitos
+
+
+TENTATIVAS_RESERVA = 5
+ESPERA_INICIAL = 0.05  # segundos; dobra a cada nova tentativa
+
+# SQLSTATEs do PostgreSQL que indicam disputa por trava (vale repetir)
+_CODIGOS_TRANSITORIOS = {'40001', '40P01', '55P03'}
+# Violação da restrição de exclusão: sobreposição com outra locação ativa
+_CODIGO_EXCLUSAO = '23P01'
+
+
+class CarroIndisponivel(Exception):
+    """O carro não pode ser reservado no período (mensagem pronta para o usuário)."""
+
+
+def _codigo_sql(erro):
+    origem = getattr(erro, 'orig', None)
+    return getattr(origem, 'pgcode', None) or getattr(origem, 'sqlstate', None)
+
+
+def erro_transitorio(erro):
+    """True se o erro do banco for disputa por trava e a transação puder ser repetida."""
+    if _codigo_sql(erro) in _CODIGOS_TRANSITORIOS:
+        return True
+    mensagem = str(getattr(erro, 'orig', erro)).lower()
+    return 'database is locked' in mensagem or 'database table is locked' in mensagem
+
+
+def travar_carro(carro_id):
+    """
+    Abre a transação da reserva já com a trava e retorna o carro (ou None).
+
+    Deve ser a primeira instrução da transação: no SQLite, BEGIN IMMEDIATE
+    falha se outra escrita já tiver iniciado uma transação comum.
+    """
+    db.session.rollback()
+    conexao = db.session.connection()
+    if conexao.dialect.name == 'sqlite':
+        conexao.exec_driver_sql('BEGIN IMMEDIATE')
+    return db.session.execute(
+        select(Carro).where(Carro.id == carro_id).with_for_update()
+    ).scalar_one_or_none()
+
+
+def reservar(carro_id, data_retirada, data_devolucao, criar_locacao, tentativas=TENTATIVAS_RESERVA):
+    """
+    Verifica a disponibilidade e grava a locação numa única transação travada.
+
+    Args:
+        carro_id: ID do carro
+        data_retirada: Data de retirada
+        data_devolucao: Data de devolução
+        criar_locacao: Função chamada dentro da transação, depois da checagem,
+                       que adiciona a Locacao (e o cliente, se novo) à sessão e
+                       a retorna. Pode ser chamada de novo numa repetição
+        tentativas: Quantas vezes tentar quando a trava não é obtida
+
+    Returns:
+        (Locacao, int): Locação gravada e quantas tentativas foram necessárias
+
+    Raises:
+        CarroIndisponivel: Carro inexistente, em manutenção ou já alugado no período
+        DBAPIError: Trava não obtida depois de todas as tentativas
+    """
+    espera = ESPERA_INICIAL
+    for tentativa in range(1, tentativas + 1):
+        try:
+            carro = travar_carro(carro_id)
+            if carro is None:
+                raise CarroIndisponivel("Carro não encontrado.")
+            if carro.em_manutencao:
+                raise CarroIndisponivel(
+                    f"O carro {carro.modelo} - {carro.placa} está em manutenção e não pode ser alugado."
+                )
+            if consulta_conflitos(carro_id, data_retirada, data_devolucao).first():
+                raise CarroIndisponivel(f"O carro {carro.modelo} - {carro.placa} já está alugado neste período.")
+
+            locacao = criar_locacao()
+            db.session.commit()
+            return locacao, tentativa
+        except CarroIndisponivel:
+            db.session.rollback()
+            raise
+        except IntegrityError as erro:
+            db.session.rollback()
+            if _codigo_sql(erro) == _CODIGO_EXCLUSAO:
+                raise CarroIndisponivel(f"O carro {carro_id} já está alugado neste período.")
+            raise
+        except DBAPIError as erro:
+            db.session.rollback()
+            if not erro_transitorio(erro) or tentativa == tentativas:
+                raise
+            time.sleep(espera * random.uniform(0.5, 1.5))
+            espera *= 2
+
+
+# ============================================================================
+# TESTE DE ESTRESSE
+# ============================================================================
+
+PLACA_ESTRESSE = 'EST-{:04d}'
+CLIENTE_ESTRESSE = 'Teste de Estresse'
+
+
+def _inicializar_processo():
+    """Inicializador dos processos do estresse: importa o app e abre o contexto."""
+    from app import app
+    app.app_context().push()
+
+
+def _preparar_estresse(quantidade_carros):
+    """Cadastra os carros e o cliente do estresse (num banco descartável)."""
+    cliente = Cliente.query.filter_by(nome=CLIENTE_ESTRESSE).first()
+    if cliente is None:
+        cliente = Cliente(nome=CLIENTE_ESTRESSE, whatsapp='')
+        db.session.add(cliente)
+
+    carro_ids = []
+    for numero in range(1, quantidade_carros + 1):
+        placa = PLACA_ESTRESSE.format(numero)
+        carro = Carro.query.filter_by(placa=placa).first()
+        if carro is None:
+            carro = Carro(modelo='Estresse', placa=placa, cor='Branco', categoria='Econômico', valor_diaria=100.0)
+            db.session.add(carro)
+        carro_ids.append(carro)
+    db.session.commit()
+    return cliente.id, [carro.id for carro in carro_ids]
+
+
+def _reservar_sem_trava(carro_id, data_retirada, data_devolucao, criar_locacao):
+    """Checagem e INSERT em transações comuns (comportamento antigo, para comparação)."""
+    if consulta_conflitos(carro_id, data_retirada, data_devolucao).first():
+        db.session.rollback()
+        raise CarroIndisponivel("Carro já alugado neste período.")
+    locacao = criar_locacao()
+    db.session.commit()
+    return locacao, 1
+
+
+def _trabalhador_estresse(parametros):
+    """Um escritor: tenta `reservas` locações em carros e períodos sorteados."""
+    cliente_id, carro_ids, reservas, janela_dias, travar, semente, largada = parametros
+    aleatorio = random.Random(semente)
+    inicio = date.today() + timedelta(days=1)
+    resultado = {'criadas': 0, 'recusadas': 0, 'repeticoes': 0, 'erros': 0, 'latencias': []}
+
+    time.sleep(max(0.0, largada - time.time()))
+    for _ in range(reservas):
+        carro_id = aleatorio.choice(carro_ids)
+        data_retirada = inicio + timedelta(days=aleatorio.randrange(janela_dias))
+        data_devolucao = data_retirada + timedelta(days=aleatorio.randrange(4))
+
+        def criar_locacao():
+            locacao = Locacao(
+                carro_id=carro_id, cliente_id=cliente_id, data_retirada=data_retirada,
+                data_devolucao=data_devolucao, valor_total=100.0, status='ativa'
+            )
+            db.session.add(locacao)
+            return locacao
+
+        comeco = time.perf_counter()
+        try:
+            if travar:
+                _, tentativas = reservar(carro_id, data_retirada, data_devolucao, criar_locacao)
+            else:
+                _, tentativas = _reservar_sem_trava(carro_id, data_retirada, data_devolucao, criar_locacao)
+            resultado['criadas'] += 1
+            resultado['repeticoes'] += tentativas - 1
+        except CarroIndisponivel:
+            resultado['recusadas'] += 1
+        except DBAPIError:
+            db.session.rollback()
+            resultado['erros'] += 1
+        resultado['latencias'].append((time.perf_counter() - comeco) * 1000)
+    return resultado
+
+
+def contar_sobreposicoes(carro_ids):
+    """Pares de locações ativas do mesmo carro com períodos sobrepostos (deve ser zero)."""
+    return db.session.execute(text(
+        "SELECT COUNT(*) FROM locacoes a JOIN locacoes b "
+        "ON a.carro_id = b.carro_id AND a.id < b.id "
+        "AND a.data_retirada <= b.data_devolucao AND b.data_retirada <= a.data_devolucao "
+        "WHERE a.status = 'ativa' AND b.status = 'ativa' AND a.carro_id IN ({})".format(
+            ', '.join(str(int(carro_id)) for carro_id in carro_ids)
+        )
+    )).scalar()
+
+
+def estresse(processos=8, reservas_por_processo=50, carros=2, janela_dias=30, travar=True, banco=None):
+    """
+    Dispara reservas concorrentes de vários processos nos mesmos carros.
+
+    Cada processo importa o app como um worker do gunicorn faria. Por padrão
+    usa um banco SQLite temporário; `banco` aceita a URI de um banco
+    descartável (ex.: PostgreSQL de testes) — o teste grava locações nele.
+
+    Returns:
+        dict: Reservas criadas, recusadas, repetições, erros, sobreposições
+              encontradas no final (zero = nenhuma reserva dupla) e latências
+    """
+    pasta = tempfile.mkdtemp(prefix='locamil-estresse-')
+    os.environ['DATABASE_URI'] = banco or f"sqlite:///{os.path.join(pasta, 'estresse.db')}"
+    os.environ['CACHE_VERSAO_ARQUIVO'] = os.path.join(pasta, 'versao.db')
+    os.environ['SEED_DATABASE'] = 'False'
+    contexto = multiprocessing.get_context('spawn')
+
+    # Schema e carros criados por um único processo antes da largada
+    with contexto.Pool(1, initializer=_inicializar_processo) as preparo:
+        cliente_id, carro_ids = preparo.apply(_preparar_estresse, (carros,))
+
+    with contexto.Pool(processos, initializer=_inicializar_processo) as pool:
+        largada = time.time() + 1.0 + 0.2 * processos
+        parametros = [
+            (cliente_id, carro_ids, reservas_por_processo, janela_dias, travar, semente, largada)
+            for semente in range(processos)
+        ]
+        resultados = pool.map(_trabalhador_estresse, parametros)
+        segundos = time.time() - largada
+        sobreposicoes = pool.apply(contar_sobreposicoes, (carro_ids,))
+
+    latencias = sorted(latencia for resultado in resultados for latencia in resultado['latencias'])
+    total = {
+        chave: sum(resultado[chave] for resultado in resultados)
+        for chave in ('criadas', 'recusadas', 'repeticoes', 'erros')
+    }
+    return {
+        'banco': os.environ['DATABASE_URI'],
+        'processos': processos,
+        'carros': carros,
+        'tentativas': processos * reservas_por_processo,
+        **total,
+        'sobreposicoes': sobreposicoes,
+        'reservas_por_segundo': round((total['criadas'] + total['recusadas']) / segundos, 1) if segundos > 0 else None,
+        'p50_ms': round(latencias[len(latencias) // 2], 2) if latencias else None,
+        'p99_ms': round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))], 2) if latencias else None,
+    }
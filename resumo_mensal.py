@@ -0,0 +1,316 @@
+"""
+Manutenção incremental e leitura do resumo mensal (receitas x despesas).
+
+Cada flush que cria, altera ou remove uma Locacao ou um Gasto gera deltas que
+são aplicados na tabela `resumo_mensal` dentro da mesma transação. Assim o
+dashboard e os relatórios leem poucas linhas agregadas, independentemente do
+tamanho do histórico.
+"""
+
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import event, inspect, select, delete, insert
+from sqlalchemy.orm import Session
+from models import db, Carro, Locacao, LocacaoArquivada, Gasto, ResumoMensal
+
+
+STATUS_DESPESA = 'despesa'
+STATUS_FATURADOS = ('ativa', 'finalizada')
+
+MESES_PT = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+_CHAVE_DELTAS = 'resumo_mensal_deltas'
+
+
+def chave_mes(data):
+    """Retorna a chave AAAA-MM de uma data."""
+    return f"{data.year:04d}-{data.month:02d}"
+
+
+def meses_anteriores(data_referencia, quantidade):
+    """
+    Lista os últimos `quantidade` meses de calendário até a data de referência.
+
+    Returns:
+        list: [(ano, mes), ...] do mais antigo ao mais recente
+    """
+    meses = []
+    ano, mes = data_referencia.year, data_referencia.month
+    for _ in range(quantidade):
+        meses.append((ano, mes))
+        mes -= 1
+        if mes == 0:
+            ano, mes = ano - 1, 12
+    return list(reversed(meses))
+
+
+# ============================================================================
+# MANUTENÇÃO INCREMENTAL
+# ============================================================================
+
+def _valor_anterior(estado, atributo):
+    """Valor do atributo antes das alterações pendentes no objeto."""
+    historico = estado.attrs[atributo].history
+    if historico.deleted:
+        return historico.deleted[0]
+    return getattr(estado.obj(), atributo)
+
+
+def _contribuicao_locacao(carro_id, data_retirada, status, valor_total):
+    if carro_id is None or data_retirada is None:
+        return None
+    return (carro_id, chave_mes(data_retirada), status or 'ativa'), (valor_total or 0.0, 0.0, 1, 0)
+
+
+def _contribuicao_gasto(carro_id, data_gasto, valor):
+    if carro_id is None or data_gasto is None:
+        return None
+    return (carro_id, chave_mes(data_gasto), STATUS_DESPESA), (0.0, valor or 0.0, 0, 1)
+
+
+def _contribuicoes(obj, anterior=False):
+    """Retorna a contribuição de um objeto ao resumo (atual ou antes da alteração)."""
+    estado = inspect(obj)
+    ler = (lambda atributo: _valor_anterior(estado, atributo)) if anterior else \
+        (lambda atributo: getattr(obj, atributo))
+
+    if isinstance(obj, Locacao):
+        return _contribuicao_locacao(
+            ler('carro_id'), ler('data_retirada'), ler('status'), ler('valor_total')
+        )
+    return _contribuicao_gasto(ler('carro_id'), ler('data_gasto'), ler('valor'))
+
+
+def _acumular(deltas, contribuicao, sinal):
+    if contribuicao is None:
+        return
+    chave, valores = contribuicao
+    atual = deltas[chave]
+    deltas[chave] = tuple(a + sinal * v for a, v in zip(atual, valores))
+
+
+@event.listens_for(Session, 'before_flush')
+def _coletar_deltas(session, flush_context, instances):
+    """Calcula os deltas do resumo a partir dos objetos pendentes no flush."""
+    deltas = session.info.setdefault(_CHAVE_DELTAS, defaultdict(lambda: (0.0, 0.0, 0, 0)))
+
+    # Objetos novos são contabilizados em after_flush, quando as chaves
+    # estrangeiras definidas via relacionamento já foram sincronizadas
+    for obj in session.dirty:
+        if isinstance(obj, (Locacao, Gasto)) and session.is_modified(obj, include_collections=False):
+            _acumular(deltas, _contribuicoes(obj, anterior=True), -1)
+            _acumular(deltas, _contribuicoes(obj), +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, (Locacao, Gasto)):
+            _acumular(deltas, _contribuicoes(obj, anterior=True), -1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _aplicar_deltas(session, flush_context):
+    """Aplica os deltas coletados na mesma transação do flush."""
+    deltas = session.info.pop(_CHAVE_DELTAS, None)
+    if deltas is None:
+        deltas = defaultdict(lambda: (0.0, 0.0, 0, 0))
+
+    for obj in session.new:
+        if isinstance(obj, (Locacao, Gasto)):
+            _acumular(deltas, _contribuicoes(obj), +1)
+
+    deltas = {chave: valores for chave, valores in deltas.items() if any(valores)}
+    if not deltas:
+        return
+
+    conexao = session.connection()
+    carro_ids = {carro_id for carro_id, _, _ in deltas}
+    categorias = dict(conexao.execute(
+        select(Carro.id, Carro.categoria).where(Carro.id.in_(carro_ids))
+    ).all())
+
+    # Consolidar por (mês, categoria, status) antes de escrever
+    por_linha = defaultdict(lambda: (0.0, 0.0, 0, 0))
+    for (carro_id, mes, status), valores in deltas.items():
+        chave = (mes, categorias.get(carro_id) or 'Sem categoria', status)
+        _acumular(por_linha, (chave, valores), +1)
+
+    aplicar_no_resumo(conexao, por_linha)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_deltas(session):
+    session.info.pop(_CHAVE_DELTAS, None)
+
+
+def _insert_com_upsert(dialeto):
+    """Retorna a função insert com suporte a ON CONFLICT do dialeto, se houver."""
+    if dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+        return insert_dialeto
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+        return insert_dialeto
+    return None
+
+
+def aplicar_no_resumo(conexao, deltas):
+    """
+    Soma deltas às linhas do resumo, criando as linhas que não existirem.
+
+    Args:
+        conexao: Conexão SQLAlchemy (dentro da transação corrente)
+        deltas: {(mes, categoria, status): (receita, despesas, qtd_locacoes, qtd_gastos)}
+    """
+    tabela = ResumoMensal.__table__
+    insert_dialeto = _insert_com_upsert(conexao.dialect.name)
+
+    for (mes, categoria, status), (receita, despesas, qtd_locacoes, qtd_gastos) in deltas.items():
+        valores = {
+            'mes': mes,
+            'categoria': categoria,
+            'status': status,
+            'receita': receita,
+            'despesas': despesas,
+            'quantidade_locacoes': qtd_locacoes,
+            'quantidade_gastos': qtd_gastos
+        }
+        incrementos = {
+            'receita': tabela.c.receita + receita,
+            'despesas': tabela.c.despesas + despesas,
+            'quantidade_locacoes': tabela.c.quantidade_locacoes + qtd_locacoes,
+            'quantidade_gastos': tabela.c.quantidade_gastos + qtd_gastos
+        }
+
+        if insert_dialeto is not None:
+            comando = insert_dialeto(tabela).values(**valores)
+            comando = comando.on_conflict_do_update(
+                index_elements=['mes', 'categoria', 'status'],
+                set_=incrementos
+            )
+            conexao.execute(comando)
+            continue
+
+        # Demais bancos: UPDATE e, se nenhuma linha existir, INSERT
+        resultado = conexao.execute(
+            tabela.update()
+            .where(tabela.c.mes == mes, tabela.c.categoria == categoria, tabela.c.status == status)
+            .values(**incrementos)
+        )
+        if resultado.rowcount == 0:
+            conexao.execute(insert(tabela).values(**valores))
+
+
+# ============================================================================
+# RECONSTRUÇÃO (BACKFILL)
+# ============================================================================
+
+def reconstruir_resumo(tamanho_lote=5000, conexao=None):
+    """
+    Recalcula a tabela de resumo a partir de todas as locações (inclusive as
+    arquivadas) e gastos.
+
+    Usado para popular bancos existentes (migração 9) ou corrigir divergências
+    (por exemplo, após mudar a categoria de um carro). Os registros são lidos
+    em lotes e agregados em memória por (mês, categoria, status).
+
+    Args:
+        tamanho_lote: Linhas lidas por vez
+        conexao: Conexão numa transação aberta pelo chamador (padrão: a da
+                 sessão, confirmada ao final)
+
+    Returns:
+        int: Quantidade de linhas gravadas no resumo
+    """
+    confirmar = conexao is None
+    conexao = conexao or db.session.connection()
+    agregado = defaultdict(lambda: (0.0, 0.0, 0, 0))
+
+    # Locações da tabela principal e do arquivo (arquivamento.py)
+    for modelo in (Locacao, LocacaoArquivada):
+        consulta_locacoes = (
+            select(Carro.categoria, modelo.data_retirada, modelo.status, modelo.valor_total)
+            .join(Carro, Carro.id == modelo.carro_id)
+            .execution_options(yield_per=tamanho_lote)
+        )
+        for categoria, data_retirada, status, valor_total in conexao.execute(consulta_locacoes):
+            chave = (chave_mes(data_retirada), categoria, status or 'ativa')
+            _acumular(agregado, (chave, (valor_total or 0.0, 0.0, 1, 0)), +1)
+
+    consulta_gastos = (
+        select(Carro.categoria, Gasto.data_gasto, Gasto.valor)
+        .join(Carro, Carro.id == Gasto.carro_id)
+        .execution_options(yield_per=tamanho_lote)
+    )
+    for categoria, data_gasto, valor in conexao.execute(consulta_gastos):
+        chave = (chave_mes(data_gasto), categoria, STATUS_DESPESA)
+        _acumular(agregado, (chave, (0.0, valor or 0.0, 0, 1)), +1)
+
+    conexao.execute(delete(ResumoMensal.__table__))
+    if agregado:
+        conexao.execute(insert(ResumoMensal.__table__), [
+            {
+                'mes': mes,
+                'categoria': categoria,
+                'status': status,
+                'receita': receita,
+                'despesas': despesas,
+                'quantidade_locacoes': qtd_locacoes,
+                'quantidade_gastos': qtd_gastos
+            }
+            for (mes, categoria, status), (receita, despesas, qtd_locacoes, qtd_gastos) in agregado.items()
+        ])
+    if confirmar:
+        db.session.commit()
+
+    return len(agregado)
+
+
+# ============================================================================
+# LEITURA
+# ============================================================================
+
+def resumo_financeiro(data_referencia=None, quantidade_meses=6):
+    """
+    Lê do resumo o faturamento e as despesas dos últimos meses de calendário.
+
+    Returns:
+        dict: {
+            'labels': ['Jan', ...],
+            'faturamento_mensal': [float, ...],
+            'despesas_mensal': [float, ...],
+            'faturamento_total': float,
+            'despesas_total': float
+        }
+    """
+    data_referencia = data_referencia or date.today()
+    meses = meses_anteriores(data_referencia, quantidade_meses)
+    chaves = [f"{ano:04d}-{mes:02d}" for ano, mes in meses]
+
+    linhas = db.session.execute(
+        select(
+            ResumoMensal.mes,
+            ResumoMensal.status,
+            db.func.sum(ResumoMensal.receita),
+            db.func.sum(ResumoMensal.despesas)
+        )
+        .where(ResumoMensal.mes.in_(chaves))
+        .group_by(ResumoMensal.mes, ResumoMensal.status)
+    ).all()
+
+    faturamento = dict.fromkeys(chaves, 0.0)
+    despesas = dict.fromkeys(chaves, 0.0)
+    for mes, status, receita, despesa in linhas:
+        if status in STATUS_FATURADOS:
+            faturamento[mes] += receita or 0.0
+        elif status == STATUS_DESPESA:
+            despesas[mes] += despesa or 0.0
+
+    faturamento_mensal = [round(faturamento[chave], 2) for chave in chaves]
+    despesas_mensal = [round(despesas[chave], 2) for chave in chaves]
+
+    return {
+        'labels': [MESES_PT[mes - 1] for _, mes in meses],
+        'faturamento_mensal': faturamento_mensal,
+        'despesas_mensal': despesas_mensal,
+        'faturamento_total': round(sum(faturamento_mensal), 2),
+        'despesas_total': round(sum(despesas_mensal), 2)
+    }
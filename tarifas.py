@@ -0,0 +1,220 @@
+"""
+Tabela de tarifas em memória (diárias e regras de preço) e cotações em lote.
+
+A tabela é carregada com duas consultas e mantida pelos mesmos mecanismos do
+índice de disponibilidade: carros gravados por esta aplicação são atualizados
+no commit (eventos da sessão) e uma escrita de outro processo, sinalizada pela
+versão dos dados compartilhada, provoca a recarga. Alterar uma regra de preço
+também força a recarga.
+
+As cotações passam pelo motor de precificação (precificacao.py): os pedidos
+são agrupados por período e cada grupo é avaliado de uma vez, vetorizado.
+"""
+
+import threading
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import db, Carro, RegraPreco
+from cache_dashboard import versao_dados
+from precificacao import MotorPrecos, consulta_regras_ativas
+
+
+_CHAVE_PENDENTES = 'tarifas_pendentes'
+
+MAXIMO_ITENS_COTACAO = 5000
+# Dias de um período cotado (o motor avalia dia a dia: limita memória e CPU)
+MAXIMO_DIAS_PERIODO = 366
+
+
+def dias_locacao(data_retirada, data_devolucao):
+    """Dias cobrados: o dia da retirada e o da devolução contam."""
+    return (data_devolucao - data_retirada).days + 1
+
+
+def valor_total(valor_diaria, data_retirada, data_devolucao):
+    """Valor total da locação pela diária do carro, sem regras de preço."""
+    return round(dias_locacao(data_retirada, data_devolucao) * valor_diaria, 2)
+
+
+class TabelaTarifas:
+    """Diárias, categorias e regras de preço deste processo."""
+
+    def __init__(self, versao=None):
+        self.versao = versao or versao_dados
+        self.diarias = {}     # carro_id -> valor_diaria
+        self.categorias = {}  # carro_id -> categoria
+        self.ativos = []      # ids dos carros ativos, na ordem de cadastro
+        self.regras = []      # regras de preço ativas (linhas de consulta_regras_ativas)
+        self.motor = MotorPrecos(())
+        self.versao_carregada = None
+        self.recargas = 0
+        self.consultas = 0    # leituras (as que exigiram recarga contam também em recargas)
+        self.cotacoes = 0
+        self._lock = threading.RLock()
+        self.versao.ao_incrementar(self._ao_incrementar_versao)
+
+    def carregar(self):
+        """Recarrega diárias e regras de preço do banco (duas consultas)."""
+        versao = self.versao.atual()
+        linhas = db.session.execute(
+            select(Carro.id, Carro.valor_diaria, Carro.ativo, Carro.categoria).order_by(Carro.id)
+        ).all()
+        regras = db.session.execute(consulta_regras_ativas()).all()
+
+        with self._lock:
+            self.diarias = {carro_id: valor_diaria for carro_id, valor_diaria, _, _ in linhas}
+            self.categorias = {carro_id: categoria for carro_id, _, _, categoria in linhas}
+            self.ativos = [carro_id for carro_id, _, ativo, _ in linhas if ativo]
+            self.regras = regras
+            self._compilar()
+            self.versao_carregada = versao
+            self.recargas += 1
+
+    def _compilar(self):
+        self.motor = MotorPrecos(
+            ((carro_id, valor_diaria, self.categorias.get(carro_id))
+             for carro_id, valor_diaria in self.diarias.items()),
+            self.regras
+        )
+
+    def _garantir_atualizado(self):
+        self.consultas += 1
+        if self.versao_carregada is None or self.versao.atual() != self.versao_carregada:
+            self.carregar()
+
+    def _ao_incrementar_versao(self, anterior, nova):
+        # Escrita deste processo: já aplicada via eventos da sessão
+        with self._lock:
+            if self.versao_carregada == anterior:
+                self.versao_carregada = nova
+
+    def invalidar(self):
+        """Força a recarga na próxima cotação (ver `IndiceDisponibilidade.invalidar`)."""
+        with self._lock:
+            self.versao_carregada = None
+
+    def registrar_carro(self, carro_id, valor_diaria, ativo, categoria=None):
+        """Atualiza a diária de um carro criado ou editado e recompila o motor."""
+        with self._lock:
+            self.diarias[carro_id] = valor_diaria
+            self.categorias[carro_id] = categoria
+            if ativo and carro_id not in self.ativos:
+                self.ativos.append(carro_id)
+                self.ativos.sort()
+            elif not ativo and carro_id in self.ativos:
+                self.ativos.remove(carro_id)
+            self._compilar()
+
+    # --------------------------------------------------------------- consulta
+
+    def diaria(self, carro_id):
+        """Valor da diária do carro ou None se não existir."""
+        self._garantir_atualizado()
+        return self.diarias.get(carro_id)
+
+    def carros_ativos(self):
+        """IDs dos carros ativos."""
+        self._garantir_atualizado()
+        return list(self.ativos)
+
+    def _cotar_periodo(self, carro_ids, data_retirada, data_devolucao):
+        """Cotações de vários carros no mesmo período (uma avaliação do motor)."""
+        self.cotacoes += len(carro_ids)
+        if data_devolucao < data_retirada:
+            erro = 'A data de devolução não pode ser anterior à data de retirada.'
+            return [{'carro_id': carro_id, 'erro': erro} for carro_id in carro_ids]
+
+        motor = self.motor
+        posicoes, encontrado = motor.posicoes(carro_ids)
+        totais = motor.totais(data_retirada, data_devolucao, posicoes) if len(motor.carro_ids) else []
+        dias = dias_locacao(data_retirada, data_devolucao)
+        cotacoes = []
+        for posicao, carro_id in enumerate(carro_ids):
+            if not encontrado[posicao]:
+                cotacoes.append({'carro_id': carro_id, 'erro': 'Carro não encontrado.'})
+                continue
+            cotacoes.append({
+                'carro_id': carro_id,
+                'dias': dias,
+                'valor_diaria': self.diarias[carro_id],
+                'valor_total': round(float(totais[posicao]), 2)
+            })
+        return cotacoes
+
+    def cotar(self, carro_id, data_retirada, data_devolucao):
+        """
+        Cota uma locação sem acessar o banco.
+
+        Returns:
+            dict: {'carro_id', 'dias', 'valor_diaria', 'valor_total'} ou
+                  {'carro_id', 'erro'} se o carro não existir ou as datas forem inválidas
+        """
+        self._garantir_atualizado()
+        with self._lock:
+            return self._cotar_periodo([carro_id], data_retirada, data_devolucao)[0]
+
+    def cotar_lote(self, pedidos):
+        """
+        Cota vários pares (carro_id, data_retirada, data_devolucao) de uma vez.
+
+        Returns:
+            list: Uma cotação (ver `cotar`) por pedido, na mesma ordem
+        """
+        self._garantir_atualizado()
+        por_periodo = {}
+        for posicao, (carro_id, data_retirada, data_devolucao) in enumerate(pedidos):
+            por_periodo.setdefault((data_retirada, data_devolucao), []).append((posicao, carro_id))
+
+        cotacoes = [None] * len(pedidos)
+        with self._lock:
+            for (data_retirada, data_devolucao), itens in por_periodo.items():
+                carro_ids = [carro_id for _, carro_id in itens]
+                for (posicao, _), cotacao in zip(itens, self._cotar_periodo(carro_ids, data_retirada, data_devolucao)):
+                    cotacoes[posicao] = cotacao
+        return cotacoes
+
+    def matriz(self, data_retirada, data_devolucao, carro_ids=None):
+        """
+        Diárias carros × dias do período com as regras aplicadas (ver `MotorPrecos.matriz`).
+
+        Returns:
+            (list, np.ndarray): (carro_ids, matriz) — sem carro_ids, a frota ativa
+        """
+        self._garantir_atualizado()
+        with self._lock:
+            carro_ids = list(self.ativos) if carro_ids is None else list(carro_ids)
+            return carro_ids, self.motor.matriz(data_retirada, data_devolucao, carro_ids)
+
+
+tabela_tarifas = TabelaTarifas()
+
+
+# ============================================================================
+# SINCRONIZAÇÃO COM A SESSÃO
+# ============================================================================
+
+@event.listens_for(Session, 'after_flush')
+def _coletar_carros(session, flush_context):
+    """Guarda as diárias dos carros gravados para aplicar após o commit."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Carro) and obj not in session.deleted:
+            pendentes = session.info.setdefault(_CHAVE_PENDENTES, {})
+            pendentes[obj.id] = (obj.valor_diaria, obj.ativo, obj.categoria)
+        elif isinstance(obj, RegraPreco):
+            # Regras mudam raramente: recompila tudo na próxima cotação
+            session.info.setdefault(_CHAVE_PENDENTES, {})['regras'] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_carros(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None) or {}
+    if 'regras' in pendentes:
+        tabela_tarifas.invalidar()
+        return
+    for carro_id, (valor_diaria, ativo, categoria) in pendentes.items():
+        tabela_tarifas.registrar_carro(carro_id, valor_diaria, ativo, categoria)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_carros(session):
+    session.info.pop(_CHAVE_PENDENTES, None)